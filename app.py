@@ -3,20 +3,55 @@ import zipfile
 import io
 import json
 import math
-from collections import defaultdict
+from collections import defaultdict, OrderedDict, deque
 import uuid
 import copy
 import re
-from flask import Flask, request, render_template, redirect, url_for, send_file, session, flash, after_this_request
+import threading
+import marshal
+import hashlib
+import struct
+import shutil
+import time
+import logging
+import contextlib
+import itertools
+import mmap
+import zlib
+import gzip
+import bisect
+import tracemalloc
+import cProfile
+import pstats
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from flask import Flask, request, render_template, redirect, url_for, send_file, session, flash, jsonify, g, Response
+try:
+    import brotli  # optional; responses fall back to gzip without it
+except ImportError:
+    brotli = None
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
 
 # --- Deep unstringify/restringify helpers ------------------------------------
 
 def is_json_string(s):
-    return (
-        isinstance(s, str)
-        and ((s.strip().startswith("{") and s.strip().endswith("}"))
-                or (s.strip().startswith("[") and s.strip().endswith("]")))
-    )
+    if not isinstance(s, str) or len(s) < 2:
+        return False
+    first, last = s[0], s[-1]
+    # Only pay for strip() when there is surrounding whitespace
+    if first.isspace() or last.isspace():
+        s = s.strip()
+        if len(s) < 2:
+            return False
+        first, last = s[0], s[-1]
+    return (first == "{" and last == "}") or (first == "[" and last == "]")
 
 def deep_unstringify(obj):
     if isinstance(obj, dict):
@@ -35,6 +70,54 @@ def deep_unstringify(obj):
         return [deep_unstringify(x) for x in obj]
     return obj
 
+def decode_unstringified(text):
+    """Parse text and every JSON string nested in it in a single pass.
+
+    Returns (tree, plan) where tree matches deep_unstringify(json.loads(text)) and plan
+    matches compile_stringify_plan(json.loads(text)).
+    """
+    # Plans of decoded dicts by id(); every dict passes through the hook, so stale ids get reset
+    plans = {}
+
+    def plan_of(v):
+        if isinstance(v, dict):
+            return plans.get(id(v))
+        elif isinstance(v, list):
+            sub = None
+            for x in v:
+                if isinstance(x, (dict, list)):
+                    sub = merge_stringify_plans(sub, plan_of(x))
+            return {'items': sub} if sub is not None else None
+        return None
+
+    def hook(d):
+        fields = {}
+        parsed_strings = {}
+        for k, v in d.items():
+            if isinstance(v, str):
+                if is_json_string(v):
+                    try:
+                        parsed = decode(v)
+                    except ValueError:
+                        continue
+                    parsed_strings[k] = parsed
+                    fields[k] = (True, plan_of(parsed))
+            elif isinstance(v, (dict, list)):
+                sub = plan_of(v)
+                if sub is not None:
+                    fields[k] = (False, sub)
+        d.update(parsed_strings)
+        if fields:
+            plans[id(d)] = {'fields': fields}
+        else:
+            plans.pop(id(d), None)
+        return d
+
+    decoder = json.JSONDecoder(object_hook=hook)
+    decode = decoder.decode
+    tree = decode(text)
+    return tree, plan_of(tree)
+
 def deep_restringify(obj, template):
     # Recursively walk, stringify fields that were strings in template
     if isinstance(obj, dict) and isinstance(template, dict):
@@ -53,6 +136,94 @@ def deep_restringify(obj, template):
         return [deep_restringify(x, tpl_item) for x in obj]
     return obj
 
+def compile_stringify_plan(template):
+    """Compile the original (still stringified) document into a plan of where JSON strings were.
+
+    A plan node is None when nothing below it was stringified, otherwise a dict with
+    'fields' -> {key: (was_string, subplan)} and/or 'items' -> subplan shared by all list items.
+    """
+    if isinstance(template, dict):
+        fields = {}
+        for k, v in template.items():
+            if is_json_string(v):
+                try:
+                    fields[k] = (True, compile_stringify_plan(json.loads(v)))
+                except Exception:
+                    pass
+            else:
+                sub = compile_stringify_plan(v)
+                if sub is not None:
+                    fields[k] = (False, sub)
+        return {'fields': fields} if fields else None
+    elif isinstance(template, list):
+        sub = None
+        for x in template:
+            sub = merge_stringify_plans(sub, compile_stringify_plan(x))
+        return {'items': sub} if sub is not None else None
+    return None
+
+def merge_stringify_plans(a, b):
+    if a is None:
+        return b
+    if b is None or a is b or a == b:
+        return a
+    out = {}
+    if 'fields' in a or 'fields' in b:
+        fields = dict(a.get('fields', {}))
+        for k, (was_string, sub) in b.get('fields', {}).items():
+            if k in fields:
+                old_string, old_sub = fields[k]
+                fields[k] = (old_string or was_string, merge_stringify_plans(old_sub, sub))
+            else:
+                fields[k] = (was_string, sub)
+        out['fields'] = fields
+    if 'items' in a or 'items' in b:
+        out['items'] = merge_stringify_plans(a.get('items'), b.get('items'))
+    return out
+
+def apply_stringify_plan(obj, plan):
+    """Single-pass restringify driven by a compiled plan; subtrees without strings are reused as-is."""
+    if plan is None:
+        return obj
+    if isinstance(obj, dict) and 'fields' in plan:
+        fields = plan['fields']
+        out = {}
+        for k, v in obj.items():
+            entry = fields.get(k)
+            if entry is not None:
+                was_string, sub = entry
+                v = apply_stringify_plan(v, sub)
+                # Plans are merged across list items, so was_string only says the field held a
+                # stringified object or array somewhere; only those get serialized back
+                if was_string and isinstance(v, (dict, list)):
+                    v = json.dumps(v)
+            out[k] = v
+        return out
+    elif isinstance(obj, list) and 'items' in plan:
+        sub = plan['items']
+        return [apply_stringify_plan(x, sub) for x in obj]
+    return obj
+
+def replace_at_path(tree, path, value):
+    """Returns a copy of tree with the node at path replaced, sharing every untouched subtree."""
+    if not path:
+        return value
+    out = copy.copy(tree)
+    out[path[0]] = replace_at_path(tree[path[0]], path[1:], value)
+    return out
+
+def read_game_state(text):
+    """The GameState object of a GameStateSaveData.json text.
+
+    Only that one nested string gets decoded, not the rest of the document.
+    """
+    state = json.loads(text).get('Data', {}).get('GameState', {})
+    if isinstance(state, str):
+        state = json.loads(state)
+    return state if isinstance(state, dict) else {}
+
+DUPLICATE_EPS = 0.02
+
 def are_structures_duplicate(a, b):
     """Returns True if structures have the same TypeID and nearly the same Position."""
     if a.get("TypeID") != b.get("TypeID"):
@@ -61,10 +232,9 @@ def are_structures_duplicate(a, b):
     pos_b = b.get("Position")
     if not (isinstance(pos_a, dict) and isinstance(pos_b, dict)):
         return False
-    EPS = 0.02
     for axis in ("x", "y", "z"):
         try:
-            if abs(float(pos_a.get(axis, 0)) - float(pos_b.get(axis, 0))) > EPS:
+            if abs(float(pos_a.get(axis, 0)) - float(pos_b.get(axis, 0))) > DUPLICATE_EPS:
                 return False
         except Exception:
             return False
@@ -93,11 +263,12 @@ def extract_structures_from_any(base_json):
 
     data = unstringify(base_json)
     structure_candidates = []
+    info = data if isinstance(data, dict) else {}
     meta = {
-        "Name": data.get("Name"),
-        "Author": data.get("Author"),
-        "Description": data.get("Description"),
-        "NumberOfElements": data.get("NumberOfElements"),
+        "Name": info.get("Name"),
+        "Author": info.get("Author"),
+        "Description": info.get("Description"),
+        "NumberOfElements": info.get("NumberOfElements"),
     }
 
     # First: save format (Data -> Constructions -> Structures)
@@ -115,134 +286,2967 @@ def extract_structures_from_any(base_json):
         # Structures directly in root (rare)
         structures = data["Structures"]
 
-    # Now flatten
-    if isinstance(structures, list):
-        # Bucketed: list of lists (by TypeID) or flat (rare)
-        for bucket in structures:
-            if isinstance(bucket, list):
-                for s in bucket:
-                    if isinstance(s, dict):
-                        structure_candidates.append(s)
-            elif isinstance(bucket, dict):
-                structure_candidates.append(bucket)
-            # If fully empty (None), skip
-    elif isinstance(structures, dict):
-        structure_candidates.append(structures)
+    # Now flatten
+    if isinstance(structures, list):
+        structure_candidates, _ = flatten_structure_buckets(structures)
+    elif isinstance(structures, dict):
+        structure_candidates.append(structures)
+
+    # Fallback: if root structure is itself a list of dicts
+    elif isinstance(data, list):
+        for s in data:
+            if isinstance(s, dict):
+                structure_candidates.append(s)
+    elif isinstance(data, dict) and "TypeID" in data:
+        structure_candidates.append(data)
+
+    return structure_candidates, meta
+
+def flatten_structure_buckets(structures):
+    """Flatten a Structures list into (structures, sources).
+
+    sources[i] is (bucket index, index in bucket) of structures[i]; index is -1 for a
+    structure stored directly in place of a bucket.
+    """
+    flat = []
+    sources = []
+    # Bucketed: list of lists (by TypeID) or flat (rare)
+    for b, bucket in enumerate(structures):
+        if isinstance(bucket, list):
+            for j, s in enumerate(bucket):
+                if isinstance(s, dict):
+                    flat.append(s)
+                    sources.append((b, j))
+        elif isinstance(bucket, dict):
+            flat.append(bucket)
+            sources.append((b, -1))
+        # If fully empty (None), skip
+    return flat, sources
+
+def normalize_imported_structure(structure, keep_linked=True):
+    """Normalize imported structure while preserving relationships."""
+    s = copy.deepcopy(structure)
+    if not keep_linked:
+        if "LinkedStructures" in s:
+            original_length = len(s["LinkedStructures"])
+            s["LinkedStructures"] = [None] * original_length
+    if "Storages" not in s:
+        s["Storages"] = []
+    if "Scale" not in s:
+        s["Scale"] = {"x": 1.0, "y": 1.0, "z": 1.0}
+    return s
+
+def merge_imported_structures(cstructs, selected_structures):
+    """Append imported structures to the save's TypeID buckets (in place), remapping in-batch links."""
+    # --- Group selected imported structures by TypeID ---
+    import_groups = {}
+    for s in selected_structures:
+        tid = s.get("TypeID")
+        if tid is not None:
+            import_groups.setdefault(tid, []).append(s)
+
+    # --- For each TypeID bucket, append batch and remap LinkedStructures ---
+    for tid, structures in import_groups.items():
+        # Ensure bucket exists in save
+        while len(cstructs) <= tid:
+            cstructs.append(None)
+        if cstructs[tid] is None:
+            cstructs[tid] = []
+        elif not isinstance(cstructs[tid], list):
+            cstructs[tid] = []    
+        
+        existing_len = len(cstructs[tid])
+        import_count = len(structures)
+
+        # Map original import indices to their new location in the save's structures array
+        import_to_final_index = {i: existing_len + i for i in range(import_count)}
+        
+        remapped_structures = []
+        for i, s in enumerate(structures):
+            new_struct = normalize_imported_structure(s, keep_linked=True)
+            # Remap links within imported batch. Out-of-batch links = None
+            if "LinkedStructures" in new_struct and isinstance(new_struct["LinkedStructures"], list):
+                new_links = []
+                for link in new_struct["LinkedStructures"]:
+                    if link is None:
+                        new_links.append(None)
+                    elif isinstance(link, int) and 0 <= link < import_count:
+                        new_links.append(import_to_final_index[link])
+                    elif isinstance(link, dict):
+                        new_links.append(link)
+                    else:
+                        new_links.append(None)
+                new_struct["LinkedStructures"] = new_links
+            remapped_structures.append(new_struct)
+        
+        # Now add all newly-linked structures in batch
+        cstructs[tid].extend(remapped_structures)
+    return cstructs
+
+def drop_structures(structures, doomed):
+    """Copy of a Structures list without the structures at doomed {bucket: {index}} positions.
+
+    Index -1 marks a structure stored in place of its bucket. Untouched buckets are reused.
+    """
+    new_structure_list = list(structures)
+    for bucket, positions in doomed.items():
+        kept = [] if -1 in positions else [s for i, s in enumerate(structures[bucket]) if i not in positions]
+        new_structure_list[bucket] = kept or None
+    return new_structure_list
+
+def distance(pos1, pos2):
+    if not pos1 or not pos2:
+        return float('inf')
+    try:
+        return math.sqrt(
+            (float(pos1.get('x', 0)) - float(pos2.get('x', 0)))**2 +
+            (float(pos1.get('y', 0)) - float(pos2.get('y', 0)))**2 +
+            (float(pos1.get('z', 0)) - float(pos2.get('z', 0)))**2
+        )
+    except Exception:
+        return float('inf')
+
+def annotate_nearby(structures, threshold=0.25):
+    # Add a list of nearby indices to each structure
+    n = len(structures)
+    for i in range(n):
+        nearby = []
+        pos_i = structures[i].get('Position')
+        for j in range(n):
+            if i == j: continue
+            pos_j = structures[j].get('Position')
+            if distance(pos_i, pos_j) < threshold:
+                nearby.append(j)
+        structures[i]['nearby_indices'] = nearby
+    return structures
+
+def position_tuple(pos):
+    """Returns (x, y, z) as finite floats, or None if the position can't be compared."""
+    if not pos:
+        return None
+    try:
+        p = (float(pos.get('x', 0)), float(pos.get('y', 0)), float(pos.get('z', 0)))
+    except Exception:
+        return None
+    if not all(math.isfinite(c) for c in p):
+        return None
+    return p
+
+def _pack_positions(structures, type_codes):
+    """Returns (indices, type codes, Nx3 positions) for the structures that have a comparable position."""
+    indices, codes, points = [], [], []
+    for i, s in enumerate(structures):
+        if not isinstance(s, dict):
+            continue
+        p = position_tuple(s.get('Position'))
+        if p is None:
+            continue
+        try:
+            code = type_codes.setdefault(s.get('TypeID'), len(type_codes))
+        except TypeError:
+            continue
+        indices.append(i)
+        codes.append(code)
+        points.append(p)
+    return (np.array(indices, dtype=np.int64),
+            np.array(codes, dtype=np.int64),
+            np.array(points, dtype=np.float64).reshape(-1, 3))
+
+def _pack_cell_rows(rows):
+    """Folds integer cell rows into one int64 key per row when the ranges allow it (sorts much faster)."""
+    low = rows.min(axis=0)
+    spans = [int(v) for v in rows.max(axis=0) - low + 1]
+    if math.prod(spans) >= 2**62:
+        return rows
+    keys = np.zeros(len(rows), dtype=np.int64)
+    for column, span in enumerate(spans):
+        keys = keys * span + (rows[:, column] - low[column])
+    return keys
+
+def _pack_columns(type_ids, positions, type_codes):
+    """_pack_positions() for structures already held as TypeID and position columns (-1 / NaN when unset)."""
+    keep = (type_ids != -1) & np.isfinite(positions).all(axis=1)
+    indices = np.flatnonzero(keep)
+    present, inverse = np.unique(type_ids[keep], return_inverse=True)
+    codes = np.array([type_codes.setdefault(int(t), len(type_codes)) for t in present.tolist()], dtype=np.int64)
+    return indices, codes[inverse.reshape(-1)], np.asarray(positions[keep], dtype=np.float64).reshape(-1, 3)
+
+def find_duplicate_structures(existing, candidates, eps=DUPLICATE_EPS):
+    """Returns a list of flags, True where a candidate duplicates an existing structure.
+
+    Same semantics as are_structures_duplicate() (same TypeID, every axis within eps), but
+    positions are bucketed into eps-sized cells so each candidate is only compared against
+    existing structures in the 27 cells around it, all in bulk NumPy operations. existing
+    may also be a (type_ids, positions) pair of columns, as kept by the save index.
+    """
+    flags = [False] * len(candidates)
+    type_codes = {}
+    if isinstance(existing, tuple):
+        e_idx, e_codes, e_pts = _pack_columns(*existing, type_codes)
+    else:
+        e_idx, e_codes, e_pts = _pack_positions(existing, type_codes)
+    c_idx, c_codes, c_pts = _pack_positions(candidates, type_codes)
+    if not len(e_idx) or not len(c_idx):
+        return flags
+
+    # Cell rows are (TypeID code, cx, cy, cz); a match within eps is at most one cell away per axis
+    offsets = np.array([(dx, dy, dz) for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1)], dtype=np.int64)
+    e_rows = np.column_stack((e_codes, np.floor(e_pts / eps).astype(np.int64)))
+    c_cells = np.floor(c_pts / eps).astype(np.int64)
+    q_cells = (c_cells[:, None, :] + offsets[None, :, :]).reshape(-1, 3)
+    q_rows = np.column_stack((np.repeat(c_codes, len(offsets)), q_cells))
+
+    # Number every distinct cell, then index the existing structures by cell number
+    _, cell_ids = np.unique(_pack_cell_rows(np.vstack((e_rows, q_rows))), axis=0, return_inverse=True)
+    cell_ids = cell_ids.reshape(-1)
+    e_cell, q_cell = cell_ids[:len(e_rows)], cell_ids[len(e_rows):]
+    by_cell = np.argsort(e_cell, kind='stable')
+    counts = np.bincount(e_cell, minlength=int(cell_ids.max()) + 1)
+    starts = np.cumsum(counts) - counts
+
+    # Expand every (candidate, neighbour cell) query into its candidate/existing pairs
+    q_counts = counts[q_cell]
+    total = int(q_counts.sum())
+    if not total:
+        return flags
+    query = np.repeat(np.arange(len(q_cell)), q_counts)
+    within = np.arange(total) - np.repeat(np.cumsum(q_counts) - q_counts, q_counts)
+    other = by_cell[starts[q_cell][query] + within]
+    cand = query // len(offsets)
+
+    close = np.all(np.abs(e_pts[other] - c_pts[cand]) <= eps, axis=1)
+    for i in c_idx[np.unique(cand[close])]:
+        flags[i] = True
+    return flags
+
+def _is_vector(value, axes):
+    # Exact type checks keep bools out
+    for axis in axes:
+        if type(value.get(axis)) not in (float, int):
+            return False
+    return True
+
+def _transform_dicts(structures):
+    """(positions, top_count, rotations) of every Position {x,y,z} and Rotation {x,y,z,w} dict in structures.
+
+    The structures' own positions come first (top_count of them), then nested ones.
+    """
+    positions, nested, rotations, stack = [], [], [], []
+
+    def visit(node, found):
+        for key, value in node.items():
+            kind = type(value)
+            if kind is dict:
+                if key == 'Position' and _is_vector(value, 'xyz'):
+                    found.append(value)
+                elif key == 'Rotation' and _is_vector(value, 'xyzw'):
+                    rotations.append(value)
+                else:
+                    stack.append(value)
+            elif kind is list and value:
+                stack.append(value)
+
+    for s in structures:
+        visit(s, positions)
+    while stack:
+        node = stack.pop()
+        if type(node) is dict:
+            visit(node, nested)
+        else:
+            stack.extend([v for v in node if type(v) is dict or (type(v) is list and v)])
+    return positions + nested, len(positions), rotations
+
+def relocate_structures(structures, offset=(0.0, 0.0, 0.0), yaw_degrees=0.0, pivot=None, floor_y=None):
+    """Move structures (and every nested Position/Rotation in them) in place.
+
+    They are turned yaw_degrees about the vertical axis through pivot (x, z), which
+    defaults to the centre of their positions. With floor_y, the lowest structure is
+    then set to that height. Finally everything is shifted by offset (x, y, z).
+    """
+    positions, top_count, rotations = _transform_dicts(structures)
+    if not positions:
+        return structures
+    p = np.array([(d['x'], d['y'], d['z']) for d in positions], dtype=np.float64)
+    shift = np.array(offset, dtype=np.float64)
+
+    if yaw_degrees:
+        if pivot is None:
+            # Structures may only have nested positions; then those set the centre
+            top = p[:top_count] if top_count else p
+            lo, hi = top.min(axis=0), top.max(axis=0)
+            pivot = ((lo[0] + hi[0]) / 2, (lo[2] + hi[2]) / 2)
+        theta = math.radians(yaw_degrees)
+        cos_t, sin_t = math.cos(theta), math.sin(theta)
+        # Same convention as Unity's Quaternion.Euler(0, yaw, 0): +Z turns towards +X
+        x, z = p[:, 0] - pivot[0], p[:, 2] - pivot[1]
+        p[:, 0] = pivot[0] + x * cos_t + z * sin_t
+        p[:, 2] = pivot[1] - x * sin_t + z * cos_t
+        if rotations:
+            # Pre-multiply every quaternion by the yaw quaternion (0, s, 0, c)
+            q = np.array([(d['x'], d['y'], d['z'], d['w']) for d in rotations], dtype=np.float64)
+            s, c = math.sin(theta / 2), math.cos(theta / 2)
+            q = np.column_stack((c * q[:, 0] + s * q[:, 2], c * q[:, 1] + s * q[:, 3],
+                                 c * q[:, 2] - s * q[:, 0], c * q[:, 3] - s * q[:, 1]))
+            for d, (qx, qy, qz, qw) in zip(rotations, q.tolist()):
+                d['x'], d['y'], d['z'], d['w'] = qx, qy, qz, qw
+    if floor_y is not None and top_count:
+        shift[1] += floor_y - p[:top_count, 1].min()
+    p += shift
+
+    for d, (x, y, z) in zip(positions, p.tolist()):
+        d['x'], d['y'], d['z'] = x, y, z
+    return structures
+
+def structure_groups(structures, nearby_threshold=0.28):
+    """Annotate structures with group_id/group_label for clusters closer than nearby_threshold.
+
+    Positions are hashed into cubic cells of nearby_threshold size, so each structure
+    only gets compared against the 27 surrounding cells instead of every other structure.
+    """
+    n = len(structures)
+    parent = list(range(n))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    # Build the cell hash for “nearby”
+    cells = defaultdict(list)
+    positions = [None] * n
+    if nearby_threshold > 0:
+        for i, s in enumerate(structures):
+            p = position_tuple(s.get('Position'))
+            if p is None:
+                continue
+            positions[i] = p
+            cells[(math.floor(p[0] / nearby_threshold),
+                   math.floor(p[1] / nearby_threshold),
+                   math.floor(p[2] / nearby_threshold))].append(i)
+
+    # Union every pair closer than the threshold (each cell pair checked once)
+    offsets = [(dx, dy, dz) for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1)]
+    for (cx, cy, cz), members in cells.items():
+        for dx, dy, dz in offsets:
+            other = cells.get((cx + dx, cy + dy, cz + dz))
+            if other is None or (dx, dy, dz) < (0, 0, 0):
+                continue
+            same_cell = (dx, dy, dz) == (0, 0, 0)
+            for a_pos, i in enumerate(members):
+                pi = positions[i]
+                for j in (members[a_pos + 1:] if same_cell else other):
+                    pj = positions[j]
+                    if math.sqrt((pi[0] - pj[0])**2 + (pi[1] - pj[1])**2 + (pi[2] - pj[2])**2) < nearby_threshold:
+                        ri, rj = find(i), find(j)
+                        if ri != rj:
+                            parent[max(ri, rj)] = min(ri, rj)
+
+    # # Linked
+    # links = structures[i].get('LinkedStructures') or []
+    # for link in links:
+    #     if isinstance(link, int) and 0 <= link < n and link != i:
+    #         union(i, link)
+
+    # Number groups in order of their first member, like the old DFS did
+    group = [None] * n
+    root_to_group = {}
+    for i in range(n):
+        root = find(i)
+        if root not in root_to_group:
+            root_to_group[root] = len(root_to_group)
+        group[i] = root_to_group[root]
+    # Annotate each structure with the group id
+    for i, s in enumerate(structures):
+        s['group_id'] = group[i]
+        s['group_label'] = f"Structure Group {group[i] + 1}"
+    return structures
+
+def build_structure_listing(structures):
+    """Group summaries plus compact member rows for the paginated structure pickers.
+
+    Expects structures already annotated by structure_groups(). Member rows are
+    [index, TypeID, x, y, z, is_duplicate] so a page of them stays small.
+    """
+    groups = []
+    by_id = {}
+    for idx, s in enumerate(structures):
+        pos = s.get('Position')
+        if not isinstance(pos, dict):
+            pos = {}
+        group_id = s.get('group_id')
+        group = by_id.get(group_id)
+        if group is None:
+            group = {
+                'label': s.get('group_label', f"Group {group_id}"),
+                'first_pos': pos or None,
+                'count': 0,
+                'duplicates': 0,
+                'members': [],
+            }
+            by_id[group_id] = group
+            groups.append(group)
+        is_duplicate = bool(s.get('is_duplicate'))
+        group['count'] += 1
+        group['duplicates'] += is_duplicate
+        group['members'].append([idx, s.get('TypeID'), pos.get('x'), pos.get('y'), pos.get('z'), is_duplicate])
+    return {'count': len(structures), 'groups': groups}
+
+def listing_summaries(listing):
+    """The listing's groups without their member rows, for rendering the page."""
+    summaries = []
+    for group_id, group in enumerate(listing['groups']):
+        summary = {k: v for k, v in group.items() if k != 'members'}
+        summary['id'] = group_id
+        # Shown with two decimals; full precision would double the size of the embedded summaries
+        if summary.get('first_pos'):
+            summary['first_pos'] = {k: round(v, 2) if isinstance(v, float) else v
+                                    for k, v in summary['first_pos'].items()}
+        summaries.append(summary)
+    return summaries
+
+def parse_index_ranges(text, upper):
+    """Parse "0-5,9,12-20" into a set of ints, clipped to range(upper)."""
+    indices = set()
+    for part in (text or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        start, _, end = part.partition('-')
+        try:
+            start = int(start)
+            end = int(end) if end else start
+        except ValueError:
+            continue
+        indices.update(range(max(start, 0), min(end, upper - 1) + 1))
+    return indices
+
+def select_listing_indices(form, listing, legacy_field, skip_duplicates=False):
+    """Resolve a picker selection posted as compact ranges into sorted structure indices.
+
+    Whole groups arrive as select_groups, exceptions inside them as exclude_ranges and picks in
+    otherwise unselected groups as select_ranges. Plain per-item fields are still accepted.
+    """
+    groups = listing['groups']
+    count = listing['count']
+    selected = set()
+    for group_id in parse_index_ranges(form.get('select_groups'), len(groups)):
+        # Duplicates can't be ticked in the picker, so a whole-group pick leaves them out
+        selected.update(m[0] for m in groups[group_id]['members'] if not (skip_duplicates and m[5]))
+    selected -= parse_index_ranges(form.get('exclude_ranges'), count)
+    selected |= parse_index_ranges(form.get('select_ranges'), count)
+    selected.update(int(i) for i in form.getlist(legacy_field) if i.isdigit() and int(i) < count)
+    return sorted(selected)
+
+def parse_relocation(form):
+    """relocate_structures() arguments from the import placement fields, or None to import in place.
+
+    Raises ValueError when a field isn't a number.
+    """
+    def number(name, default=None):
+        text = (form.get(name) or '').strip()
+        if not text:
+            return default
+        value = float(text)
+        if not math.isfinite(value):
+            raise ValueError(name)
+        return value
+
+    offset = (number('move_x', 0.0), number('move_y', 0.0), number('move_z', 0.0))
+    yaw_degrees = number('rotate_degrees', 0.0) % 360
+    pivot_x, pivot_z = number('pivot_x'), number('pivot_z')
+    floor_y = number('floor_y')
+    if not any(offset) and not yaw_degrees and floor_y is None:
+        return None
+    # Both pivot coordinates or neither (the centre of the selection)
+    pivot = (pivot_x, pivot_z) if pivot_x is not None and pivot_z is not None else None
+    return {'offset': offset, 'yaw_degrees': yaw_degrees, 'pivot': pivot, 'floor_y': floor_y}
+
+# --- Columnar structure store ------------------------------------------------
+
+# Fixed-width row per structure; the structure's full JSON lives in the blob area
+STRUCTURE_ROW = np.dtype([
+    ('type_id', '<i8'),
+    ('position', '<f8', (3,)),
+    ('rotation', '<f8', (4,)),
+    ('flags', 'u1'),
+    ('source_bucket', '<i4'),
+    ('source_index', '<i4'),
+    ('blob_offset', '<u8'),
+    ('blob_length', '<u4'),
+])
+STORE_HEADER = struct.Struct('<8s5Q')
+STORE_MAGIC = b'SOTFSTR1'
+STORE_FLAG_DUPLICATE = 1
+# Picker annotations that live in columns (or listings) rather than in the blobs
+STORE_HELPER_KEYS = ('is_duplicate', 'group_id', 'group_label')
+
+def _axes(value, axes):
+    if not isinstance(value, dict):
+        return [math.nan] * len(axes)
+    out = []
+    for axis in axes:
+        try:
+            out.append(float(value.get(axis)))
+        except (TypeError, ValueError):
+            out.append(math.nan)
+    return out
+
+class StructureStore:
+    """Memory-mapped, columnar copy of a flattened structure list.
+
+    Layout: header, one STRUCTURE_ROW per structure, the structures' JSON blobs, then a
+    small JSON meta document. Reading a selection only touches its rows and blobs.
+    """
+
+    @staticmethod
+    def write(path, structures, sources=None, meta=None):
+        rows = np.zeros(len(structures), dtype=STRUCTURE_ROW)
+        blobs = []
+        offset = 0
+        for i, s in enumerate(structures):
+            tid = s.get('TypeID')
+            row = rows[i]
+            row['type_id'] = tid if isinstance(tid, int) and not isinstance(tid, bool) else -1
+            row['position'] = _axes(s.get('Position'), 'xyz')
+            row['rotation'] = _axes(s.get('Rotation'), 'xyzw')
+            row['flags'] = STORE_FLAG_DUPLICATE if s.get('is_duplicate') else 0
+            row['source_bucket'], row['source_index'] = sources[i] if sources else (-1, -1)
+            blob = json.dumps({k: v for k, v in s.items() if k not in STORE_HELPER_KEYS}).encode('utf-8')
+            row['blob_offset'] = offset
+            row['blob_length'] = len(blob)
+            blobs.append(blob)
+            offset += len(blob)
+
+        rows_offset = STORE_HEADER.size
+        blobs_offset = rows_offset + rows.nbytes
+        meta_bytes = json.dumps(meta or {}).encode('utf-8')
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(STORE_HEADER.pack(STORE_MAGIC, len(rows), rows_offset, blobs_offset,
+                                      blobs_offset + offset, len(meta_bytes)))
+            f.write(rows.tobytes())
+            f.writelines(blobs)
+            f.write(meta_bytes)
+        os.replace(tmp_path, path)
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, rows_offset, self._blobs_offset, meta_offset, meta_length = \
+            STORE_HEADER.unpack_from(self._mm)
+        if magic != STORE_MAGIC:
+            self._mm.close()
+            raise ValueError(f"{path} is not a structure store")
+        self.rows = np.frombuffer(self._mm, dtype=STRUCTURE_ROW, count=count, offset=rows_offset)
+        self.meta = json.loads(self._mm[meta_offset:meta_offset + meta_length])
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        # The row view must go before the map can be closed
+        self.rows = None
+        self._mm.close()
+
+    def get(self, index):
+        row = self.rows[index]
+        start = self._blobs_offset + int(row['blob_offset'])
+        return json.loads(self._mm[start:start + int(row['blob_length'])])
+
+    def get_many(self, indices):
+        return [self.get(i) for i in indices]
+
+    def is_duplicate(self):
+        return (self.rows['flags'] & STORE_FLAG_DUPLICATE).astype(bool)
+
+    def summaries(self, duplicates=None):
+        """Light stand-ins ({TypeID, Position, is_duplicate}) for grouping and listings, read from the columns only.
+
+        duplicates, if given, replaces the stored duplicate flags.
+        """
+        out = []
+        duplicates = self.is_duplicate() if duplicates is None else np.asarray(duplicates, dtype=bool)
+        for row, is_duplicate in zip(self.rows.tolist(), duplicates.tolist()):
+            tid, (x, y, z) = row[0], row[1]
+            s = {'TypeID': tid if tid >= 0 else None, 'is_duplicate': is_duplicate}
+            if not any(math.isnan(c) for c in (x, y, z)):
+                s['Position'] = {'x': x, 'y': y, 'z': z}
+            out.append(s)
+        return out
+
+# --- Structure map rendering -------------------------------------------------
+
+MAP_TILE_PX = 512
+MAP_MAX_ZOOM = 10
+# Tiles wider than this (in metres) are drawn as density cells instead of single structures
+MAP_DETAIL_SPAN = 250.0
+# ...and so are tiles that would still hold more structures than this
+MAP_DETAIL_MAX_MARKS = 20000
+MAP_CELL_PX = 8
+MAP_MARK_RADIUS = 3
+MAP_DUPLICATE_RGB = (160, 160, 160)
+
+def map_bounds(positions):
+    """Square {min_x, max_z, span} around the x/z of the positions that are set, with a small margin."""
+    xz = positions[:, [0, 2]]
+    xz = xz[~np.isnan(xz).any(axis=1)]
+    if not len(xz):
+        return {'min_x': -50.0, 'max_z': 50.0, 'span': 100.0}
+    lo, hi = xz.min(axis=0), xz.max(axis=0)
+    span = max(float((hi - lo).max()) * 1.05, 20.0)
+    center = (lo + hi) / 2
+    return {'min_x': float(center[0]) - span / 2, 'max_z': float(center[1]) + span / 2, 'span': span}
+
+def tile_window(bounds, zoom, tx, ty):
+    """(left x, top z, width in metres) of a map tile; tile 0/0/0 covers the whole bounds."""
+    size = bounds['span'] / (1 << zoom)
+    return bounds['min_x'] + tx * size, bounds['max_z'] - ty * size, size
+
+def group_colours(group_ids):
+    """A distinct, stable RGB colour per group id (golden-ratio hues), as a uint8 array."""
+    hue = (np.asarray(group_ids, dtype=np.float64) * 0.618033988749895) % 1.0
+    sat, val = 0.7, 0.85
+    sector = np.floor(hue * 6).astype(np.int64) % 6
+    frac = hue * 6 - np.floor(hue * 6)
+    p, q, t = val * (1 - sat), val * (1 - sat * frac), val * (1 - sat * (1 - frac))
+    v = np.full_like(hue, val)
+    p = np.full_like(hue, p)
+    rgb = np.choose(sector[:, None], [np.stack(c, axis=1) for c in
+                                      ((v, t, p), (q, v, p), (p, v, t), (p, q, v), (t, p, v), (v, p, q))])
+    return (rgb * 255).round().astype(np.uint8)
+
+def map_tile_marks(positions, group_ids, duplicates, bounds, zoom, tx, ty):
+    """What a tile shows: single structures when zoomed in far enough, density cells otherwise.
+
+    Returns {'detail', 'x', 'y', 'rgb', 'alpha'} with x/y in tile pixels (cell corners for
+    density cells) and alpha None for single structures.
+    """
+    left, top, size = tile_window(bounds, zoom, tx, ty)
+    scale = MAP_TILE_PX / size
+    px = (positions[:, 0] - left) * scale
+    py = (top - positions[:, 2]) * scale
+    margin = MAP_MARK_RADIUS + 1
+    # NaN positions fail every comparison and drop out here
+    inside = (px > -margin) & (px < MAP_TILE_PX + margin) & (py > -margin) & (py < MAP_TILE_PX + margin)
+    if size <= MAP_DETAIL_SPAN and np.count_nonzero(inside) <= MAP_DETAIL_MAX_MARKS:
+        rgb = group_colours(group_ids[inside])
+        rgb[duplicates[inside]] = MAP_DUPLICATE_RGB
+        return {'detail': True, 'x': px[inside], 'y': py[inside], 'rgb': rgb, 'alpha': None}
+
+    cells = MAP_TILE_PX // MAP_CELL_PX
+    inside &= (px >= 0) & (px < MAP_TILE_PX) & (py >= 0) & (py < MAP_TILE_PX)
+    cell = (py[inside] // MAP_CELL_PX).astype(np.int64) * cells + (px[inside] // MAP_CELL_PX).astype(np.int64)
+    groups = group_ids[inside].astype(np.int64)
+    # Colour each cell by the group holding most of its structures
+    stride = int(groups.max(initial=0)) + 2  # group ids start at -1 for structures without one
+    pairs, pair_counts = np.unique(cell * stride + groups + 1, return_counts=True)
+    pair_cells = pairs // stride
+    order = np.lexsort((-pair_counts, pair_cells))
+    occupied, first = np.unique(pair_cells[order], return_index=True)
+    dominant = pairs[order][first] % stride - 1
+    counts = np.bincount(cell, minlength=cells * cells)[occupied]
+    alpha = 0.35 + 0.65 * np.log1p(counts) / np.log1p(counts.max(initial=1))
+    return {'detail': False, 'x': (occupied % cells) * MAP_CELL_PX, 'y': (occupied // cells) * MAP_CELL_PX,
+            'rgb': group_colours(dominant), 'alpha': alpha}
+
+def encode_png(rgba):
+    """PNG bytes of an (height, width, 4) uint8 image."""
+    height, width = rgba.shape[:2]
+    raw = np.zeros((height, width * 4 + 1), dtype=np.uint8)  # filter byte 0 on every row
+    raw[:, 1:] = rgba.reshape(height, width * 4)
+
+    def chunk(tag, data):
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data))
+
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(raw.tobytes(), 6))
+            + chunk(b'IEND', b''))
+
+def render_map_png(marks):
+    image = np.zeros((MAP_TILE_PX, MAP_TILE_PX, 4), dtype=np.uint8)
+    if marks['detail']:
+        cx, cy = np.rint(marks['x']).astype(np.int64), np.rint(marks['y']).astype(np.int64)
+        r = MAP_MARK_RADIUS
+        for dy in range(-r, r + 1):
+            for dx in range(-r, r + 1):
+                if dx * dx + dy * dy > r * r:
+                    continue
+                x, y = cx + dx, cy + dy
+                ok = (x >= 0) & (x < MAP_TILE_PX) & (y >= 0) & (y < MAP_TILE_PX)
+                image[y[ok], x[ok], :3] = marks['rgb'][ok]
+                image[y[ok], x[ok], 3] = 255
+    else:
+        cells = MAP_TILE_PX // MAP_CELL_PX
+        grid = np.zeros((cells, cells, 4), dtype=np.uint8)
+        row, col = marks['y'] // MAP_CELL_PX, marks['x'] // MAP_CELL_PX
+        grid[row, col, :3] = marks['rgb']
+        grid[row, col, 3] = (marks['alpha'] * 255).round().astype(np.uint8)
+        image = grid.repeat(MAP_CELL_PX, axis=0).repeat(MAP_CELL_PX, axis=1)
+    return encode_png(image)
+
+def render_map_svg(marks):
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{MAP_TILE_PX}" height="{MAP_TILE_PX}" '
+             f'viewBox="0 0 {MAP_TILE_PX} {MAP_TILE_PX}">']
+    colours = ['#%02x%02x%02x' % tuple(c) for c in marks['rgb'].tolist()]
+    if marks['detail']:
+        for x, y, colour in zip(marks['x'].tolist(), marks['y'].tolist(), colours):
+            parts.append(f'<circle cx="{x:.1f}" cy="{y:.1f}" r="{MAP_MARK_RADIUS}" fill="{colour}"/>')
+    else:
+        for x, y, colour, alpha in zip(marks['x'].tolist(), marks['y'].tolist(), colours, marks['alpha'].tolist()):
+            parts.append(f'<rect x="{x}" y="{y}" width="{MAP_CELL_PX}" height="{MAP_CELL_PX}" '
+                         f'fill="{colour}" fill-opacity="{alpha:.2f}"/>')
+    parts.append('</svg>')
+    return '\n'.join(parts).encode('utf-8')
+
+def box_selection(positions, group_ids, selectable, x0, z0, x1, z1, flagged=None):
+    """Structures whose x/z fall inside the box, as whole groups plus the members of partly covered ones.
+
+    With a flagged mask (duplicates), those of the partly covered members are listed under 'flagged'.
+    """
+    x0, x1 = sorted((x0, x1))
+    z0, z1 = sorted((z0, z1))
+    hit = selectable & (positions[:, 0] >= x0) & (positions[:, 0] <= x1) \
+        & (positions[:, 2] >= z0) & (positions[:, 2] <= z1)
+    group_count = int(group_ids.max(initial=-1)) + 1
+    in_box = np.bincount(group_ids[hit], minlength=group_count)
+    available = np.bincount(group_ids[selectable], minlength=group_count)
+    whole = (in_box > 0) & (in_box == available)
+    partial = hit & ~whole[group_ids]
+    members = defaultdict(list)
+    for index, group_id in zip(np.flatnonzero(partial).tolist(), group_ids[partial].tolist()):
+        members[str(group_id)].append(index)
+    result = {'count': int(hit.sum()), 'whole_groups': np.flatnonzero(whole).tolist(), 'members': members}
+    if flagged is not None:
+        result['flagged'] = np.flatnonzero(partial & flagged).tolist()
+    return result
+
+# --- JSON Pointer / JSON Patch ----------------------------------------------
+
+class JsonPatchError(ValueError):
+    """A JSON Pointer that doesn't resolve or a JSON Patch operation that can't be applied."""
+
+def pointer_tokens(pointer):
+    """Split an RFC 6901 JSON Pointer into its unescaped reference tokens."""
+    if pointer == '':
+        return []
+    if not isinstance(pointer, str) or not pointer.startswith('/'):
+        raise JsonPatchError(f"Invalid JSON Pointer {pointer!r}")
+    return [t.replace('~1', '/').replace('~0', '~') for t in pointer[1:].split('/')]
+
+def _pointer_key(node, token, for_add=False):
+    """Returns the dict key or list index a token refers to in node."""
+    if isinstance(node, dict):
+        return token
+    if isinstance(node, list):
+        if for_add and token == '-':
+            return len(node)
+        if not token.isdigit() or (len(token) > 1 and token[0] == '0'):
+            raise JsonPatchError(f"Invalid array index {token!r}")
+        index = int(token)
+        if index > len(node) or (index == len(node) and not for_add):
+            raise JsonPatchError(f"Array index {index} is out of range")
+        return index
+    raise JsonPatchError(f"Cannot reference {token!r} inside a {type(node).__name__}")
+
+def resolve_pointer(tree, pointer):
+    node = tree
+    for token in pointer_tokens(pointer):
+        key = _pointer_key(node, token)
+        if isinstance(node, dict) and key not in node:
+            raise JsonPatchError(f"{pointer} does not exist")
+        node = node[key]
+    return node
+
+def apply_json_patch(tree, operations):
+    """Returns tree with RFC 6902 operations applied; tree itself is never modified.
+
+    Containers on the touched paths are copied once per call and then edited in place,
+    so every untouched subtree is shared with the original (e.g. cached) tree.
+    """
+    owned = {}  # id -> container created by this call, safe to modify in place
+
+    def writable(node):
+        if id(node) in owned:
+            return node
+        if isinstance(node, dict):
+            node = dict(node)
+        elif isinstance(node, list):
+            node = list(node)
+        else:
+            raise JsonPatchError("Path goes through a value that is not an object or array")
+        owned[id(node)] = node
+        return node
+
+    def edit(root, tokens, fn):
+        root = writable(root)
+        node = root
+        for token in tokens[:-1]:
+            key = _pointer_key(node, token)
+            if isinstance(node, dict) and key not in node:
+                raise JsonPatchError(f"Parent of {'/' + '/'.join(tokens)} does not exist")
+            node[key] = writable(node[key])
+            node = node[key]
+        fn(node, tokens[-1])
+        return root
+
+    def add(root, tokens, value):
+        if not tokens:
+            return value
+        def do_add(parent, token):
+            key = _pointer_key(parent, token, for_add=True)
+            if isinstance(parent, list):
+                parent.insert(key, value)
+            else:
+                parent[key] = value
+        return edit(root, tokens, do_add)
+
+    def remove(root, tokens):
+        if not tokens:
+            raise JsonPatchError("Cannot remove the whole document")
+        def do_remove(parent, token):
+            key = _pointer_key(parent, token)
+            if isinstance(parent, dict) and key not in parent:
+                raise JsonPatchError(f"{'/' + '/'.join(tokens)} does not exist")
+            del parent[key]
+        return edit(root, tokens, do_remove)
+
+    def replace(root, tokens, value):
+        if not tokens:
+            return value
+        def do_replace(parent, token):
+            key = _pointer_key(parent, token)
+            if isinstance(parent, dict) and key not in parent:
+                raise JsonPatchError(f"{'/' + '/'.join(tokens)} does not exist")
+            parent[key] = value
+        return edit(root, tokens, do_replace)
+
+    for op in operations:
+        if not isinstance(op, dict) or not isinstance(op.get('path'), str):
+            raise JsonPatchError(f"Malformed patch operation {op!r}")
+        name = op.get('op')
+        tokens = pointer_tokens(op['path'])
+        if name in ('add', 'replace', 'test') and 'value' not in op:
+            raise JsonPatchError(f"'{name}' needs a value")
+        if name in ('move', 'copy') and not isinstance(op.get('from'), str):
+            raise JsonPatchError(f"'{name}' needs a from pointer")
+
+        if name == 'add':
+            tree = add(tree, tokens, op['value'])
+        elif name == 'remove':
+            tree = remove(tree, tokens)
+        elif name == 'replace':
+            tree = replace(tree, tokens, op['value'])
+        elif name == 'move':
+            from_tokens = pointer_tokens(op['from'])
+            if tokens[:len(from_tokens)] == from_tokens and len(tokens) > len(from_tokens):
+                raise JsonPatchError("Cannot move a value into one of its children")
+            value = resolve_pointer(tree, op['from'])
+            tree = add(remove(tree, from_tokens), tokens, value)
+        elif name == 'copy':
+            # A real copy, so later operations can't edit both places at once
+            value = marshal.loads(marshal.dumps(resolve_pointer(tree, op['from'])))
+            tree = add(tree, tokens, value)
+        elif name == 'test':
+            if resolve_pointer(tree, op['path']) != op['value']:
+                raise JsonPatchError(f"Test failed at {op['path']}")
+        else:
+            raise JsonPatchError(f"Unknown patch operation {name!r}")
+    return tree
+
+# --- Save ZIP rewriting ------------------------------------------------------
+
+ZIP_LOCAL_HEADER = struct.Struct('<4s5H3L2H')
+ZIP_LOCAL_HEADER_SIGNATURE = b'PK\x03\x04'
+ZIP_DATA_DESCRIPTOR_SIGNATURE = b'PK\x07\x08'
+
+def _raw_member_length(src_f, info):
+    """Returns the byte length of a member's local header, data and descriptor, or None if unsupported."""
+    src_f.seek(info.header_offset)
+    header = src_f.read(ZIP_LOCAL_HEADER.size)
+    if len(header) != ZIP_LOCAL_HEADER.size:
+        return None
+    fields = ZIP_LOCAL_HEADER.unpack(header)
+    if fields[0] != ZIP_LOCAL_HEADER_SIGNATURE:
+        return None
+    length = ZIP_LOCAL_HEADER.size + fields[9] + fields[10] + info.compress_size
+    if info.flag_bits & 0x08:
+        # Data descriptor follows the data, with or without its optional signature
+        if info.file_size > 0xFFFFFFFF or info.compress_size > 0xFFFFFFFF:
+            return None
+        src_f.seek(info.header_offset + length)
+        length += 16 if src_f.read(4) == ZIP_DATA_DESCRIPTOR_SIGNATURE else 12
+    return length
+
+def _copy_raw_member(src_f, info, new_zip):
+    """Append a member's compressed bytes to new_zip without inflating them."""
+    length = _raw_member_length(src_f, info)
+    if length is None:
+        return False
+    new_info = copy.copy(info)
+    new_info.header_offset = new_zip.fp.tell()
+    src_f.seek(info.header_offset)
+    remaining = length
+    while remaining:
+        chunk = src_f.read(min(remaining, 1024 * 1024))
+        if not chunk:
+            raise zipfile.BadZipFile(f"Truncated member {info.filename}")
+        new_zip.fp.write(chunk)
+        remaining -= len(chunk)
+    new_zip.filelist.append(new_info)
+    new_zip.NameToInfo[new_info.filename] = new_info
+    new_zip.start_dir = new_zip.fp.tell()
+    return True
+
+# zlib level for members that get re-encoded: lower is faster, higher is smaller
+ZIP_DEFLATE_LEVEL = min(max(int(os.environ.get('SOTFSE_ZIP_LEVEL') or 6), 0), 9)
+# Threads deflating members (and chunks of large members) at once; zlib releases the GIL
+ZIP_DEFLATE_THREADS = max(int(os.environ.get('SOTFSE_ZIP_THREADS') or min(os.cpu_count() or 1, 8)), 1)
+ZIP_DEFLATE_CHUNK = 1024 * 1024
+# Each chunk is primed with the 32 KB before it, so splitting barely costs compression ratio
+ZIP_DEFLATE_WINDOW = 32 * 1024
+
+_deflate_pools = {}
+_deflate_pools_lock = threading.Lock()
+
+def deflate_pool(threads):
+    """The shared deflate thread pool of that size in this process (gunicorn workers fork)."""
+    key = (os.getpid(), threads)
+    with _deflate_pools_lock:
+        pool = _deflate_pools.get(key)
+        if pool is None:
+            pool = _deflate_pools[key] = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='deflate')
+        return pool
+
+def _deflate_chunk(data, start, end, level):
+    """Raw deflate of data[start:end] that can be concatenated with its neighbours' output, pigz-style."""
+    view = memoryview(data)
+    if start:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15,
+                                      zdict=view[max(start - ZIP_DEFLATE_WINDOW, 0):start])
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    out = compressor.compress(view[start:end])
+    # A sync flush ends the chunk on a byte boundary without marking the stream's last block
+    return out + compressor.flush(zlib.Z_FINISH if end >= len(data) else zlib.Z_SYNC_FLUSH)
+
+def submit_deflate(pool, data, level):
+    """Start deflating data on the pool; returns (chunk futures, CRC future)."""
+    chunks = [pool.submit(_deflate_chunk, data, start, min(start + ZIP_DEFLATE_CHUNK, len(data)), level)
+              for start in range(0, max(len(data), 1), ZIP_DEFLATE_CHUNK)]
+    return chunks, pool.submit(zlib.crc32, data)
+
+def _write_deflated_member(new_zip, info, size, chunks, crc):
+    """Append a member deflated by submit_deflate() to new_zip."""
+    compressed = [f.result() for f in chunks]
+    # Sizes and CRC go in the local header, so no data descriptor follows
+    info.flag_bits &= ~0x08
+    info.compress_type = zipfile.ZIP_DEFLATED
+    info.file_size = size
+    info.compress_size = sum(len(c) for c in compressed)
+    info.CRC = crc.result()
+    info.header_offset = new_zip.fp.tell()
+    new_zip.fp.write(info.FileHeader())
+    new_zip.fp.writelines(compressed)
+    new_zip.filelist.append(info)
+    new_zip.NameToInfo[info.filename] = info
+    new_zip.start_dir = new_zip.fp.tell()
+
+def rebuild_save_zip(src_path, dst, replacements, level=None, threads=None):
+    """Write a copy of the save ZIP at src_path to dst (path or file) with some members replaced.
+
+    replacements maps member names to their new str/bytes content. Every other member is
+    copied as raw compressed bytes, so only the replaced members (and any member that can't
+    be copied raw) get encoded. Those are deflated on a pool of threads (ZIP_DEFLATE_THREADS
+    unless given), large ones split into ZIP_DEFLATE_CHUNK pieces.
+    """
+    level = ZIP_DEFLATE_LEVEL if level is None else level
+    threads = threads or ZIP_DEFLATE_THREADS
+    pool = deflate_pool(threads)
+    with open(src_path, 'rb') as src_f, \
+         zipfile.ZipFile(src_f) as old_zip, \
+         zipfile.ZipFile(dst, 'w') as new_zip:
+        # Work out what each member needs and start every deflate before writing anything
+        plan = []
+        for item in old_zip.infolist():
+            if item.filename in replacements:
+                data = replacements[item.filename]
+                data = data.encode('utf-8') if isinstance(data, str) else data
+            elif _raw_member_length(src_f, item) is not None:
+                plan.append((item, None, None))
+                continue
+            else:
+                data = old_zip.read(item.filename)
+            pending = submit_deflate(pool, data, level) if item.compress_type == zipfile.ZIP_DEFLATED else None
+            plan.append((item, data, pending))
+
+        for item, data, pending in plan:
+            if data is None:
+                _copy_raw_member(src_f, item, new_zip)
+                continue
+            if item.filename in replacements:
+                new_item = zipfile.ZipInfo(item.filename, date_time=time.localtime()[:6])
+                new_item.compress_type = item.compress_type
+                new_item.external_attr = item.external_attr
+            else:
+                new_item = copy.copy(item)
+            if pending:
+                _write_deflated_member(new_zip, new_item, len(data), *pending)
+            else:
+                new_zip.writestr(new_item, data)
+
+# --- Byte-splicing member writer --------------------------------------------
+
+STRUCTURES_PATH = ('Data', 'Constructions', 'Structures')
+
+_span_decoder = json.JSONDecoder()
+_JSON_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+def uppercase_exponents(text):
+    """SOTF writes float exponents as 1.5E-05, Python as 1.5e-05."""
+    return re.sub(r'(\d+\.\d+)e(-?\d+)', r'\1E\2', text)
+
+def _object_member_span(text, start, key):
+    """Returns the (start, end) span of key's value in the JSON object at text[start:]."""
+    pos = _JSON_WHITESPACE.match(text, start).end()
+    if text[pos:pos + 1] != '{':
+        raise ValueError("Not a JSON object")
+    pos = _JSON_WHITESPACE.match(text, pos + 1).end()
+    span = None
+    while text[pos:pos + 1] != '}':
+        if text[pos:pos + 1] != '"':
+            raise ValueError("Expected a member name")
+        name, pos = json.decoder.scanstring(text, pos + 1)
+        pos = _JSON_WHITESPACE.match(text, pos).end()
+        if text[pos:pos + 1] != ':':
+            raise ValueError("Expected ':'")
+        value_start = _JSON_WHITESPACE.match(text, pos + 1).end()
+        _, value_end = _span_decoder.raw_decode(text, value_start)
+        if name == key:
+            # Keep scanning: like json.loads, the last duplicate key wins
+            span = (value_start, value_end)
+        pos = _JSON_WHITESPACE.match(text, value_end).end()
+        if text[pos:pos + 1] == ',':
+            pos = _JSON_WHITESPACE.match(text, pos + 1).end()
+        elif text[pos:pos + 1] != '}':
+            raise ValueError("Expected ',' or '}'")
+    if span is None:
+        raise KeyError(key)
+    return span
+
+def _array_item_spans(text, start):
+    """Returns the (start, end) spans of every item of the JSON array at text[start]."""
+    spans = []
+    pos = _JSON_WHITESPACE.match(text, start + 1).end()
+    if text[pos:pos + 1] == ']':
+        return spans
+    while True:
+        _, end = _span_decoder.raw_decode(text, pos)
+        spans.append((pos, end))
+        pos = _JSON_WHITESPACE.match(text, end).end()
+        if text[pos:pos + 1] == ']':
+            return spans
+        if text[pos:pos + 1] != ',':
+            raise ValueError("Expected ',' or ']'")
+        pos = _JSON_WHITESPACE.match(text, pos + 1).end()
+
+def locate_splice_span(text, path, plan):
+    """Find the node at path (a tuple of object keys) in the original member text.
+
+    Returns {'layers': [(start, end, ensure_ascii)] of the string literals holding each
+    stringified layer on the way, 'span': (start, end) of the node in the innermost layer,
+    'items': its item spans if it is an array, 'was_string', 'plan': the node's subplan,
+    'ensure_ascii'}. Raises ValueError when a layer isn't escaped the way json.dumps would
+    escape it, as re-escaping it would then change bytes outside the node.
+    """
+    layers = []
+    start, end = 0, len(text)
+    was_string = False
+    for depth, key in enumerate(path):
+        fields = plan.get('fields', {}) if plan else {}
+        was_string, plan = fields.get(key, (False, None))
+        start, end = _object_member_span(text, start, key)
+        if was_string and depth < len(path) - 1:
+            literal = text[start:end]
+            inner = json.loads(literal)
+            for ensure_ascii in (True, False):
+                if json.dumps(inner, ensure_ascii=ensure_ascii) == literal:
+                    break
+            else:
+                raise ValueError(f"Stringified field {key!r} uses non-standard escaping")
+            layers.append((start, end, ensure_ascii))
+            text, start, end = inner, 0, len(inner)
+    items = _array_item_spans(text, start) if text[start] == '[' and not was_string else None
+    return {'layers': layers, 'span': (start, end), 'items': items, 'was_string': was_string,
+            'plan': plan, 'ensure_ascii': text.isascii()}
+
+def splice_node(text, location, value, old_value=None, postprocess=None):
+    """Returns text with the node found by locate_splice_span() replaced by value.
+
+    When the node is an array and old_value is its original content, only the items that
+    differ are re-serialized. Every byte outside the rewritten spans is kept as it was.
+    """
+    # New text follows the style of the node's own layer for non-ASCII characters
+    ensure_ascii = location['ensure_ascii']
+    # Per-item stage times add up here and get recorded once
+    costs = {'restringify': 0.0, 'json_dumps': 0.0, 'float_format': 0.0}
+    clock = time.perf_counter
+
+    def encode(v, plan):
+        t0 = clock()
+        v = apply_stringify_plan(v, plan)
+        t1 = clock()
+        fragment = json.dumps(v, separators=(',', ':'), ensure_ascii=ensure_ascii)
+        t2 = clock()
+        costs['restringify'] += t1 - t0
+        costs['json_dumps'] += t2 - t1
+        if postprocess:
+            fragment = postprocess(fragment)
+            costs['float_format'] += clock() - t2
+        return fragment
+
+    texts = [text]
+    with timed('json_loads'):
+        for start, end, _ in location['layers']:
+            texts.append(json.loads(texts[-1][start:end]))
+    inner = texts[-1]
+
+    start, end = location['span']
+    items = location['items']
+    plan = location['plan']
+    if items is not None and isinstance(value, list) and isinstance(old_value, list) \
+            and len(old_value) == len(items):
+        item_plan = plan.get('items') if plan else None
+        kept = min(len(value), len(items))
+        edits = [(items[i][0], items[i][1], encode(value[i], item_plan))
+                 for i in range(kept) if value[i] != old_value[i]]
+        if len(value) > kept:
+            added = ','.join(encode(v, item_plan) for v in value[kept:])
+            edits.append((items[-1][1], items[-1][1], ',' + added) if items else (start + 1, end - 1, added))
+        elif len(items) > kept:
+            edits.append((items[kept - 1][1], items[-1][1], '') if kept else (start + 1, end - 1, ''))
+    else:
+        fragment = encode(value, plan)
+        if location['was_string'] and isinstance(value, (dict, list)):
+            fragment = json.dumps(fragment, ensure_ascii=ensure_ascii)
+        edits = [(start, end, fragment)]
+
+    pieces = []
+    pos = 0
+    for edit_start, edit_end, fragment in edits:
+        pieces.append(inner[pos:edit_start])
+        pieces.append(fragment)
+        pos = edit_end
+    pieces.append(inner[pos:])
+    inner = ''.join(pieces)
+
+    # Escape the edited layer back into each enclosing string literal
+    for (start, end, layer_ascii), parent in zip(reversed(location['layers']), reversed(texts[:-1])):
+        t0 = clock()
+        inner = parent[:start] + json.dumps(inner, ensure_ascii=layer_ascii) + parent[end:]
+        costs['json_dumps'] += clock() - t0
+    for stage, seconds in costs.items():
+        if seconds:
+            record_stage(stage, seconds)
+    return inner
+
+# --- Paged file reading ------------------------------------------------------
+
+# Debug and diagnostic dumps can be tens of MB, so the viewer reads them a page at a time
+FILE_PAGE_BYTES = 64 * 1024
+# How far past a page boundary to look for a line break or comma to cut at
+FILE_CUT_LOOKAHEAD = 4096
+# Nesting state is remembered every this many bytes, so a jump only rescans up to one step
+JSON_CHECKPOINT_BYTES = 1024 * 1024
+FILE_SEARCH_CHUNK = 1024 * 1024
+
+_CLEAN_CUT = re.compile(rb'[\n,]')
+# The closing quote is optional, so a string left open at the end of a chunk still matches
+# once instead of failing and being retried from every escaped quote inside it
+_JSON_STRING_BYTES = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"?', re.S)
+_JSON_ESCAPE_BYTES = re.compile(rb'\\.', re.S)
+_JSON_STRING_REST_BYTES = re.compile(rb'[^"\\]*(?:\\.[^"\\]*)*"', re.S)
+_PRETTY_TOKEN = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"?|[{}\[\],:]|[^\s"{}\[\],:]+', re.S)
+_PRETTY_STRING_REST = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*"?', re.S)
+
+def _char_boundary(data, i):
+    """First index at or after i that doesn't split a UTF-8 character or an escape."""
+    while i < len(data) and ((data[i] & 0xC0) == 0x80 or (i > 0 and data[i - 1] == 0x5C)):
+        i += 1
+    return i
+
+def file_cut_after(f, pos, size):
+    """A page boundary at or shortly after pos: just past a line break or comma if there is one."""
+    if pos <= 0 or pos >= size:
+        return min(max(pos, 0), size)
+    f.seek(pos - 1)
+    window = f.read(FILE_CUT_LOOKAHEAD + 1)
+    m = _CLEAN_CUT.search(window)
+    if m:
+        return pos - 1 + m.end()
+    # One long line: cut anywhere that keeps characters and escapes whole
+    return min(pos - 1 + _char_boundary(window, 1), size)
+
+def file_cut_before(f, pos, size):
+    """A page boundary at or shortly before pos, so a jump to pos shows its line from the start."""
+    if pos <= 0 or pos >= size:
+        return min(max(pos, 0), size)
+    start = max(pos - FILE_CUT_LOOKAHEAD, 0)
+    f.seek(start)
+    window = f.read(pos - start + 1)
+    cut = max(window.rfind(b'\n', 0, pos - start), window.rfind(b',', 0, pos - start))
+    if cut >= 0:
+        return start + cut + 1
+    return start + _char_boundary(window, 0) if start else 0
+
+def read_file_page(path, offset=0, before=None, around=None, page_bytes=FILE_PAGE_BYTES):
+    """(start, end, size, data) of one page of a file, read without loading the rest of it.
+
+    Pages run forward from offset, end at before when paging backwards, or start just
+    before around when jumping to a search hit.
+    """
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        if before is not None:
+            end = min(max(before, 0), size)
+            start = file_cut_after(f, max(end - page_bytes, 0), size) if end > page_bytes else 0
+            start = min(start, end)
+        else:
+            start = file_cut_before(f, around, size) if around is not None else min(max(offset, 0), size)
+            end = file_cut_after(f, start + page_bytes, size)
+        f.seek(start)
+        data = f.read(end - start)
+    return start, end, size, data
+
+def scan_json_state(data, depth=0, in_string=False):
+    """(nesting depth, inside a string) after the JSON bytes data, given the state before it.
+
+    data must not end in the middle of an escape; strings are skipped by the regex engine
+    in one linear pass and only brackets outside them are counted.
+    """
+    if in_string:
+        m = _JSON_STRING_REST_BYTES.match(data)
+        if m is None:
+            return depth, True
+        data = data[m.end():]
+    # Escapes only occur inside strings, so without them an odd number of quotes means the
+    # last string continues past data
+    in_string = _JSON_ESCAPE_BYTES.sub(b'', data).count(b'"') % 2 == 1
+    data = _JSON_STRING_BYTES.sub(b'', data)
+    depth += data.count(b'[') + data.count(b'{') - data.count(b']') - data.count(b'}')
+    return depth, in_string
+
+def json_cut_is_clean(f, start):
+    """Whether a page starting at start begins a new line of pretty output: at the start of the
+    file, after a line break, or after a comma or opening bracket."""
+    if start <= 0:
+        return True
+    f.seek(max(start - 64, 0))
+    before = f.read(start - max(start - 64, 0))
+    if before.endswith(b'\n'):
+        return True
+    before = before.rstrip()
+    return not before or before[-1:] in (b',', b'[', b'{')
+
+def json_state_at(f, offset, checkpoints):
+    """JSON nesting state at offset of an open file, extending checkpoints as it scans.
+
+    checkpoints is a sorted list of (offset, depth, in_string), starting with (0, 0, False).
+    """
+    i = bisect.bisect_right([c[0] for c in checkpoints], offset) - 1
+    pos, depth, in_string = checkpoints[i]
+    f.seek(pos)
+    while pos < offset:
+        chunk = f.read(min(JSON_CHECKPOINT_BYTES, offset - pos))
+        if not chunk:
+            break
+        # Never stop right after a backslash; its escaped character is in the next chunk
+        while chunk.endswith(b'\\') and pos + len(chunk) < offset:
+            chunk += f.read(1)
+        depth, in_string = scan_json_state(chunk, depth, in_string)
+        pos += len(chunk)
+        if len(chunk) >= JSON_CHECKPOINT_BYTES and pos > checkpoints[-1][0]:
+            checkpoints.append((pos, depth, in_string))
+    return depth, in_string
+
+def pretty_json_page(text, depth=0, in_string=False, indent=2, fresh_line=True):
+    """Re-indents one page of a JSON document, starting at the given nesting state.
+
+    Pages that start just after a comma or opening bracket (fresh_line) join up with the
+    previous page's output on a newline; others continue the previous page's last line, so
+    the pages read like one pretty-printed document.
+    """
+    out = []
+    pos = 0
+    if in_string:
+        m = _PRETTY_STRING_REST.match(text)
+        out.append(m.group())
+        pos = m.end()
+
+    def line_break():
+        # No newline before a fresh line's first token; the pages are joined with one
+        return ('\n' if out or not fresh_line else '') + ' ' * (max(depth, 0) * indent)
+
+    pending = fresh_line and not in_string  # a line break is owed before the next token
+    prev = None
+    for m in _PRETTY_TOKEN.finditer(text, pos):
+        token = m.group()
+        if token in ('}', ']'):
+            depth -= 1
+            # Empty containers stay on one line
+            if prev not in ('{', '['):
+                out.append(line_break())
+            out.append(token)
+            pending = False
+        else:
+            if pending:
+                out.append(line_break())
+                pending = False
+            out.append(': ' if token == ':' else token)
+            if token in ('{', '[', ','):
+                depth += token != ','
+                pending = True
+        prev = token
+    return ''.join(out)
+
+def search_file(path, needle, offset=0, max_hits=100, max_bytes=256 * 1024 * 1024):
+    """Byte offsets of needle (ASCII case-insensitive) from offset, read a chunk at a time.
+
+    Returns (hits, resume offset); the resume offset is None once the end of the file was
+    reached, otherwise the search stopped at max_hits or after max_bytes.
+    """
+    needle = needle.lower()
+    hits = []
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        pos, tail = offset, b''
+        while pos - offset < max_bytes:
+            chunk = f.read(FILE_SEARCH_CHUNK)
+            if not chunk:
+                return hits, None
+            # Keep the end of the previous chunk so matches across the boundary are found
+            window = (tail + chunk).lower()
+            base = pos - len(tail)
+            i = window.find(needle)
+            while i >= 0:
+                hits.append(base + i)
+                if len(hits) >= max_hits:
+                    return hits, base + i + 1
+                i = window.find(needle, i + 1)
+            tail = window[-(len(needle) - 1):] if len(needle) > 1 else b''
+            pos += len(chunk)
+    return hits, pos
+
+# --- File locks --------------------------------------------------------------
+
+# Fallback for platforms with neither flock nor msvcrt: only this process's threads are serialised
+_thread_file_locks = defaultdict(threading.Lock)
+_thread_file_locks_guard = threading.Lock()
+
+@contextlib.contextmanager
+def file_lock(path, blocking=True):
+    """Hold an exclusive lock on path, shared by every thread and worker process using it.
+
+    flock on Unix and msvcrt.locking on Windows; path is created if it doesn't exist.
+    Yields whether the lock was taken, which is only ever False when blocking is False
+    and someone else holds it.
+    """
+    if fcntl is None and msvcrt is None:
+        with _thread_file_locks_guard:
+            lock = _thread_file_locks[os.path.abspath(path)]
+        if not lock.acquire(blocking):
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            lock.release()
+        return
+    with open(path, "w") as f:
+        try:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            elif not blocking:
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                # LK_LOCK gives up after ten one-second retries
+                while True:
+                    try:
+                        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        pass
+        except OSError:
+            if blocking:
+                raise
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+# --- End helpers -------------------------------------------------------------
+
+app = Flask(__name__)
+# Load the secret key from an environment variable for security
+app.secret_key = os.environ.get('SOTFSE_SECRET_KEY')
+if not app.secret_key:
+    raise ValueError("No SOTFSE_SECRET_KEY set for Flask application")
+
+# Add these lines to increase limits
+app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB limit
+
+UPLOAD_DIR = 'uploads'
+os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+# --- Metrics -----------------------------------------------------------------
+
+# Request/stage timings exposed at /metrics (SOTFSE_METRICS=0 turns them off)
+METRICS_ENABLED = os.environ.get('SOTFSE_METRICS', '1').lower() not in ('0', 'false', 'no')
+# Also record each request's peak traced Python memory; tracemalloc slows everything down
+METRICS_TRACEMALLOC = os.environ.get('SOTFSE_METRICS_TRACEMALLOC', '').lower() in ('1', 'true', 'yes')
+# Every worker writes its totals here and /metrics adds them up
+METRICS_DIR = os.path.join(UPLOAD_DIR, 'metrics')
+# Totals of workers that have exited, folded into one snapshot
+RETIRED_METRICS_SNAPSHOT = 'retired.json'
+# Where processes can't be probed (Windows), snapshots untouched this long are dropped instead
+METRICS_SNAPSHOT_MAX_AGE_SECONDS = 7 * 24 * 3600
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+MEMORY_BUCKETS = tuple(2 ** n * 1024 * 1024 for n in range(0, 13, 2))  # 1 MB .. 4 GB
+# name -> (type, help, histogram buckets)
+METRIC_TYPES = {
+    'sotfse_requests_total': ('counter', "HTTP requests by endpoint and status.", None),
+    'sotfse_request_seconds': ('histogram', "HTTP request duration.", SECONDS_BUCKETS),
+    'sotfse_request_bytes_total': ('counter', "Request body bytes received.", None),
+    'sotfse_response_bytes_total': ('counter', "Response body bytes sent.", None),
+    'sotfse_request_peak_memory_bytes': ('histogram', "Peak traced Python memory per request or job.", MEMORY_BUCKETS),
+    'sotfse_jobs_total': ('counter', "Background jobs by kind and outcome.", None),
+    'sotfse_job_seconds': ('histogram', "Background job duration.", SECONDS_BUCKETS),
+    'sotfse_stage_seconds': ('histogram', "Time spent in each save pipeline stage, by route or job.", SECONDS_BUCKETS),
+    'sotfse_structures_total': ('counter', "Structures listed, imported and deleted.", None),
+    'sotfse_upload_dedupe_total': ('counter', "Uploads identical to a file that was already stored.", None),
+    'sotfse_response_cache_total': ('counter', "Cached responses by outcome (not_modified, hit, miss).", None),
+    'sotfse_artifact_sweeps_total': ('counter', "Upload artifact sweeps run.", None),
+    'sotfse_artifacts_removed_total': ('counter', "Upload artifacts removed by the sweeper.", None),
+    'sotfse_artifact_bytes_reclaimed_total': ('counter', "Bytes of upload artifacts removed by the sweeper.", None),
+}
+
+def pid_alive(pid):
+    """Whether process pid is running; None where that can't be checked."""
+    if os.name == 'nt':
+        return None  # os.kill would terminate it
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True  # Running, under another user
+    return True
+
+def _snapshot(counters, histograms):
+    return {
+        'counters': [[name, labels, value] for (name, labels), value in counters.items()],
+        'histograms': [[name, labels] + hist for (name, labels), hist in histograms.items()],
+    }
+
+def _add_snapshot(counters, histograms, snapshot):
+    for metric, labels, value in snapshot.get('counters', []):
+        key = (metric, tuple(map(tuple, labels)))
+        counters[key] = counters.get(key, 0) + value
+    for metric, labels, counts, total, count in snapshot.get('histograms', []):
+        buckets = METRIC_TYPES.get(metric, (None, None, None))[2]
+        if buckets is None or len(counts) != len(buckets) + 1:
+            continue  # Written with another bucket layout
+        key = (metric, tuple(map(tuple, labels)))
+        hist = histograms.setdefault(key, [[0] * len(counts), 0.0, 0])
+        hist[0] = [a + b for a, b in zip(hist[0], counts)]
+        hist[1] += total
+        hist[2] += count
+
+def _read_snapshot(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+class MetricsRegistry:
+    """Counters and histograms of one worker, snapshotted to a file in a shared directory.
+
+    Snapshots hold running totals, so /metrics in any worker can sum every file it finds.
+    Snapshots of workers that have exited are folded into one retired snapshot, so the
+    directory doesn't grow with every worker restart and the totals never go down.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._pid = None
+        self._counters = {}
+        self._histograms = {}
+        self._dirty = False
+
+    def _check_fork(self):
+        # A registry inherited through fork (gunicorn --preload) starts over in the child
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._path = os.path.join(self.directory, f"{self._pid}-{uuid.uuid4().hex[:8]}.json")
+            self._counters = {}
+            self._histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._check_fork()
+            self._counters[key] = self._counters.get(key, 0) + value
+            self._dirty = True
+
+    def observe(self, name, value, **labels):
+        buckets = METRIC_TYPES[name][2]
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._check_fork()
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = [[0] * (len(buckets) + 1), 0.0, 0]
+            hist[0][bisect.bisect_left(buckets, value)] += 1
+            hist[1] += value
+            hist[2] += 1
+            self._dirty = True
+
+    def flush(self):
+        """Write this worker's snapshot if anything changed since the last one."""
+        with self._lock:
+            if not self._dirty:
+                return
+            self._check_fork()
+            snapshot = _snapshot(self._counters, self._histograms)
+            self._dirty = False
+            path = self._path
+        # Request and job threads flush independently; the newest snapshot has to land last
+        with self._write_lock:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                tmp_path = f"{path}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(snapshot, f)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                app.logger.warning("Could not write metrics snapshot: %s", e)
+
+    def retire_exited(self):
+        """Fold the snapshots of exited workers into the retired snapshot; call under the directory lock."""
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        counters, histograms = {}, {}
+        retired = []
+        now = time.time()
+        for name in names:
+            pid, _, rest = name.partition('-')
+            if not pid.isdigit() or not rest.endswith(('.json', '.json.tmp')) or int(pid) == os.getpid():
+                continue
+            path = os.path.join(self.directory, name)
+            alive = pid_alive(int(pid))
+            if alive is None:
+                try:
+                    if now - os.stat(path).st_mtime > METRICS_SNAPSHOT_MAX_AGE_SECONDS:
+                        os.remove(path)
+                except OSError:
+                    pass
+                continue
+            if alive:
+                continue
+            snapshot = _read_snapshot(path) if name.endswith('.json') else None
+            if snapshot is not None:
+                _add_snapshot(counters, histograms, snapshot)
+            retired.append(path)
+        if not retired:
+            return
+        retired_path = os.path.join(self.directory, RETIRED_METRICS_SNAPSHOT)
+        _add_snapshot(counters, histograms, _read_snapshot(retired_path) or {})
+        tmp_path = f"{retired_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(_snapshot(counters, histograms), f)
+        os.replace(tmp_path, retired_path)
+        for path in retired:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def collect(self):
+        """Sum the snapshots of every worker: ({key: value}, {key: [counts, sum, count]})."""
+        counters = {}
+        histograms = {}
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # Retiring and reading must not interleave, or a folded snapshot would be counted twice
+            with file_lock(os.path.join(self.directory, '.lock')):
+                self.retire_exited()
+                names = [n for n in os.listdir(self.directory) if n.endswith('.json')]
+                for name in names:
+                    snapshot = _read_snapshot(os.path.join(self.directory, name))
+                    if snapshot is not None:
+                        _add_snapshot(counters, histograms, snapshot)
+        except OSError as e:
+            app.logger.warning("Could not read metrics snapshots: %s", e)
+        return counters, histograms
+
+    def render(self):
+        """All workers' metrics in the Prometheus text exposition format."""
+        counters, histograms = self.collect()
+
+        def label_text(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ''
+            escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+            return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+        lines = []
+        for metric, (kind, help_text, buckets) in METRIC_TYPES.items():
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} {kind}")
+            if kind == 'counter':
+                for (name, labels), value in sorted(counters.items()):
+                    if name == metric:
+                        lines.append(f"{metric}{label_text(labels)} {value}")
+                continue
+            for (name, labels), (counts, total, count) in sorted(histograms.items()):
+                if name != metric:
+                    continue
+                for le, cumulative in zip(list(buckets) + ['+Inf'], itertools.accumulate(counts)):
+                    lines.append(f"{metric}_bucket{label_text(labels, [('le', le)])} {cumulative}")
+                lines.append(f"{metric}_sum{label_text(labels)} {total}")
+                lines.append(f"{metric}_count{label_text(labels)} {count}")
+        return '\n'.join(lines) + '\n'
+
+metrics = MetricsRegistry(METRICS_DIR)
+# The route or job the current thread works for; stage timings are labelled with it
+_metrics_route = threading.local()
+if METRICS_ENABLED and METRICS_TRACEMALLOC:
+    tracemalloc.start()
+
+def record_stage(stage, seconds):
+    if METRICS_ENABLED:
+        metrics.observe('sotfse_stage_seconds', seconds, stage=stage,
+                        route=getattr(_metrics_route, 'name', None) or 'none')
+
+@contextlib.contextmanager
+def timed(stage):
+    """Time the enclosed block as one save pipeline stage."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+def count_structures(operation, count):
+    if METRICS_ENABLED and count:
+        metrics.inc('sotfse_structures_total', count, operation=operation)
+
+# --- Request profiler --------------------------------------------------------
+
+# Requests sent with ?profile=1 or "X-SOTFSE-Profile: 1" run under cProfile and tracemalloc
+# (SOTFSE_PROFILING=0 ignores them)
+PROFILING_ENABLED = os.environ.get('SOTFSE_PROFILING', '1').lower() not in ('0', 'false', 'no')
+PROFILE_TOP_N = 30
+PROFILE_TRACEBACK_FRAMES = 10
+
+def session_diag_dir(uid):
+    return os.path.join(UPLOAD_DIR, f"diag_{uid}")
+
+class RequestProfiler:
+    """Profiles one request or job and writes profile_<label>.prof/.txt into a diag_ directory."""
+
+    # tracemalloc is process-wide, so each worker profiles one thing at a time
+    _busy = threading.Lock()
+
+    def __init__(self, label):
+        self.label = f"{time.strftime('%Y%m%d-%H%M%S')}_{label}"
+
+    def start(self, wait=0):
+        """Returns False (and profiles nothing) if another profile is still running after wait seconds."""
+        acquired = self._busy.acquire(timeout=wait) if wait else self._busy.acquire(blocking=False)
+        if not acquired:
+            app.logger.warning("Skipping profile of %s: another one is running", self.label)
+            return False
+        self._own_tracing = not tracemalloc.is_tracing()
+        if self._own_tracing:
+            tracemalloc.start(PROFILE_TRACEBACK_FRAMES)
+        else:
+            tracemalloc.reset_peak()
+        self._before = tracemalloc.take_snapshot()
+        self._started = time.perf_counter()
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+        return True
+
+    def stop(self, directory):
+        """Write the profile and its text summary to directory (None discards them); returns the summary's path."""
+        self._profile.disable()
+        elapsed = time.perf_counter() - self._started
+        try:
+            peak = tracemalloc.get_traced_memory()[1]
+            ignore = [tracemalloc.Filter(False, tracemalloc.__file__),
+                      tracemalloc.Filter(False, '<frozen importlib._bootstrap*>')]
+            growth = tracemalloc.take_snapshot().filter_traces(ignore).compare_to(
+                self._before.filter_traces(ignore), 'lineno')
+        finally:
+            if self._own_tracing:
+                tracemalloc.stop()
+            self._busy.release()
+        if directory is None:
+            return None
+
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, f"profile_{self.label}")
+        self._profile.dump_stats(f"{base}.prof")
+        out = io.StringIO()
+        out.write(f"Profile of {self.label}\n")
+        out.write(f"Wall time: {elapsed:.3f} s\n")
+        out.write(f"Peak traced memory: {peak / 1024 / 1024:.1f} MB\n\n")
+        for order, title in (('cumulative', "cumulative time"), ('tottime', "own time")):
+            out.write(f"Top {PROFILE_TOP_N} functions by {title}\n")
+            pstats.Stats(self._profile, stream=out).strip_dirs().sort_stats(order).print_stats(PROFILE_TOP_N)
+        out.write(f"Top {PROFILE_TOP_N} allocation sites (memory still held at the end, compared to the start)\n")
+        for stat in growth[:PROFILE_TOP_N]:
+            out.write(f"{stat}\n")
+        with open(f"{base}.txt", "w", encoding="utf-8") as f:
+            f.write(out.getvalue())
+        return f"{base}.txt"
+
+def profile_requested():
+    return PROFILING_ENABLED and '1' in (request.args.get('profile'), request.headers.get('X-SOTFSE-Profile'))
+
+# --- Parsed save cache -------------------------------------------------------
+
+# Memory budget for parsed save members kept per worker (in MB)
+SAVE_CACHE_MAX_BYTES = int(os.environ.get('SOTFSE_CACHE_MB') or 256) * 1024 * 1024
+# Optional on-disk tier so other gunicorn workers can skip the parse as well
+SAVE_CACHE_DISK = os.environ.get('SOTFSE_CACHE_DISK', '').lower() in ('1', 'true', 'yes')
+SAVE_CACHE_DIR = os.path.join(UPLOAD_DIR, 'cache')
+# Parsed Python trees take several times the space of their JSON text
+PARSED_SIZE_FACTOR = 6
+
+class ParsedSaveCache:
+    """LRU of unstringified save members keyed by (upload path, member name, member CRC)."""
+
+    def __init__(self, max_bytes, disk_dir=None):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def _disk_path(self, key):
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.disk_dir, f"{digest}.marshal")
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry[0]
+        if self.disk_dir:
+            try:
+                with open(self._disk_path(key), 'rb') as f:
+                    tree, cost = marshal.load(f)
+            except (OSError, EOFError, ValueError, TypeError):
+                return default
+            self._remember(key, tree, cost)
+            return tree
+        return default
+
+    def put(self, key, tree, cost):
+        self._remember(key, tree, cost)
+        if self.disk_dir:
+            path = self._disk_path(key)
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            try:
+                with open(tmp_path, 'wb') as f:
+                    marshal.dump((tree, cost), f)
+                os.replace(tmp_path, path)
+            except (OSError, ValueError) as e:
+                app.logger.warning("Could not write parsed save cache file: %s", e)
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+    def _remember(self, key, tree, cost):
+        if cost > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= old[1]
+            self._entries[key] = (tree, cost)
+            self._size += cost
+            # Evict least recently used members until we fit the budget again
+            while self._size > self.max_bytes and self._entries:
+                _, (_, old_cost) = self._entries.popitem(last=False)
+                self._size -= old_cost
+
+save_cache = ParsedSaveCache(SAVE_CACHE_MAX_BYTES, SAVE_CACHE_DIR if SAVE_CACHE_DISK else None)
+
+_MISSING = object()
+
+def _cached_member(zip_filename, fname, uid, kind, ref=None):
+    ref = ref or member_ref(zip_filename, fname, uid)
+    token, size, _ = ref
+    # Uploads are content-addressed, so sessions working on the same save share the parse
+    key = (zip_filename, fname, token)
+    # A plan may legitimately be None, so misses are told apart with a sentinel
+    value = save_cache.get(key + (kind,), _MISSING)
+    if value is _MISSING:
+        # One decode gives us both the unstringified tree and its stringify plan
+        text = read_member_text(zip_filename, fname, ref)
+        # json.loads and the unstringify pass are one decoder pass here
+        with timed('unstringify'):
+            tree, plan = decode_unstringified(text)
+        # Plans only hold key names, so they are tiny next to the parsed tree
+        save_cache.put(key + ('plan',), plan, 64 * 1024)
+        save_cache.put(key + ('tree',), tree, size * PARSED_SIZE_FACTOR)
+        value = tree if kind == 'tree' else plan
+    return value
+
+def load_save_member(zip_filename, fname, uid=None, mutable=False, ref=None):
+    """Returns the unstringified tree of a member in the session's working copy, parsing it only once.
+
+    The cached tree is shared between requests, so callers that modify the result
+    must ask for a mutable copy.
+    """
+    tree = _cached_member(zip_filename, fname, uid, 'tree', ref)
+    if mutable:
+        # marshal round-trips plain JSON trees much faster than copy.deepcopy
+        with timed('copy'):
+            tree = marshal.loads(marshal.dumps(tree))
+    return tree
+
+def load_stringify_plan(zip_filename, fname, uid=None, ref=None):
+    """Returns the compiled stringify plan of a member in the working copy, compiling it only once."""
+    return _cached_member(zip_filename, fname, uid, 'plan', ref)
+
+def serialize_member_with(zip_filename, fname, path, value, uid=None, postprocess=None):
+    """Returns the member's text with the node at path replaced by value.
+
+    The replacement is spliced into the original text (array items only where they changed),
+    so export cost follows the size of the change and untouched data, float literals
+    included, stays byte-identical. Members whose layout can't be spliced are
+    re-serialized in full instead.
+    """
+    # Pin the member version, so text, tree and plan all describe the same content
+    ref = member_ref(zip_filename, fname, uid)
+    text = read_member_text(zip_filename, fname, ref)
+    plan = load_stringify_plan(zip_filename, fname, uid=uid, ref=ref)
+    key = (zip_filename, fname, ref[0], 'splice') + tuple(path)
+    location = save_cache.get(key)
+    if location is None:
+        try:
+            location = locate_splice_span(text, path, plan)
+        except (ValueError, KeyError) as e:
+            app.logger.warning("Falling back to a full re-serialize of %s: %s", fname, e)
+            location = False
+        save_cache.put(key, location, 64 * 1024)
+    tree = load_save_member(zip_filename, fname, uid=uid, ref=ref)
+    return rewrite_member_text(text, tree, plan, path, value, location, postprocess)
+
+def rewrite_member_text(text, tree, plan, path, value, location, postprocess=None):
+    """text (parsed as tree/plan) with the node at path replaced by value.
+
+    Splices at location (from locate_splice_span()) when there is one, otherwise
+    re-serializes the whole member.
+    """
+    if location:
+        old_value = tree
+        for name in path:
+            old_value = old_value[name]
+        return splice_node(text, location, value, old_value, postprocess)
+
+    tree = replace_at_path(tree, path, value)
+    with timed('restringify'):
+        tree = apply_stringify_plan(tree, plan)
+    with timed('json_dumps'):
+        text = json.dumps(tree, separators=(',', ':'))
+    if postprocess:
+        with timed('float_format'):
+            text = postprocess(text)
+    return text
+
+# --- Working copy ------------------------------------------------------------
+
+# The uploaded ZIP is never modified. Tools commit the members they change as blobs in
+# uploads/workspace_<uid>/, each version maps member names to blob digests, and the
+# ZIP is only rebuilt when the user downloads the save.
+WORKSPACE_HISTORY_LIMIT = int(os.environ.get('SOTFSE_HISTORY_LIMIT') or 20)
+
+def workspace_dir(uid):
+    return os.path.join(UPLOAD_DIR, f"workspace_{uid}")
+
+def _blob_path(uid, digest):
+    return os.path.join(workspace_dir(uid), f"{digest}.blob")
+
+def read_history(uid):
+    """Returns {'head': index, 'versions': [{label, time, members}]}; version 0 is the upload."""
+    try:
+        with open(os.path.join(workspace_dir(uid), "history.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'head': 0, 'versions': [{'label': "Uploaded save", 'time': None, 'members': {}}]}
+
+def _write_history(uid, history):
+    path = os.path.join(workspace_dir(uid), "history.json")
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(history, f)
+    os.replace(tmp_path, path)
+
+@contextlib.contextmanager
+def _workspace_lock(uid, name, blocking=True):
+    # Jobs and undo requests of one session may land on different gunicorn workers
+    os.makedirs(workspace_dir(uid), exist_ok=True)
+    with file_lock(os.path.join(workspace_dir(uid), name), blocking) as acquired:
+        yield acquired
+
+def _history_lock(uid):
+    return _workspace_lock(uid, "history.lock")
+
+def _jobs_lock(uid, blocking=True):
+    """Held while one of the session's jobs runs, so its jobs run one after another."""
+    return _workspace_lock(uid, "jobs.lock", blocking)
+
+class WorkingCopyChanged(ValueError):
+    """A member a job was started on changed in the working copy before the job committed."""
+
+def current_members(uid):
+    """Member name -> blob digest for every member the current version has modified."""
+    history = read_history(uid)
+    return history['versions'][history['head']]['members']
+
+def member_digests(uid, fnames):
+    """The current blob digest (None for the uploaded version) of each member, as a job's base."""
+    members = current_members(uid) if uid else {}
+    return {fname: members.get(fname) for fname in fnames}
+
+def member_ref(zip_filename, fname, uid):
+    """Identifies the current content of a member as (cache token, size, blob path or None)."""
+    digest = current_members(uid).get(fname) if uid else None
+    if digest:
+        path = _blob_path(uid, digest)
+        return (('blob', digest), os.path.getsize(path), path)
+    with zipfile.ZipFile(zip_filename) as zf:
+        info = zf.getinfo(fname)
+    return (info.CRC, info.file_size, None)
+
+def read_member_text(zip_filename, fname, ref):
+    if ref[2]:
+        with timed('workspace_read'), open(ref[2], 'rb') as f:
+            return f.read().decode('utf-8')
+    with timed('zip_inflate'), zipfile.ZipFile(zip_filename) as zf:
+        return zf.read(fname).decode('utf-8')
+
+def commit_version(uid, label, texts, base=None):
+    """Record a new version with the members in texts (name -> str) replaced; returns its index.
+
+    base (from member_digests() when the job was submitted) is checked against the head
+    first: if another job or an undo changed one of those members since, nothing is
+    committed and WorkingCopyChanged is raised, instead of silently dropping that change.
+    Versions after the current head (undone ones) are dropped, and so are blobs that no
+    remaining version uses.
+    """
+    with timed('workspace_write'), _history_lock(uid):
+        history = read_history(uid)
+        versions = history['versions'][:history['head'] + 1]
+        changed = [fname for fname, digest in (base or {}).items()
+                   if versions[-1]['members'].get(fname) != digest]
+        if changed:
+            raise WorkingCopyChanged(
+                f"{', '.join(os.path.basename(f) for f in changed)} changed while this job was waiting "
+                "(another change or an undo). Nothing was saved; please redo this change.")
+
+        digests = {}
+        for fname, text in texts.items():
+            data = text.encode('utf-8')
+            digest = hashlib.sha1(data).hexdigest()
+            path = _blob_path(uid, digest)
+            if not os.path.exists(path):
+                tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            digests[fname] = digest
+
+        members = dict(versions[-1]['members'], **digests)
+        versions.append({'label': label, 'time': time.time(), 'members': members})
+        if len(versions) > WORKSPACE_HISTORY_LIMIT + 1:
+            # Always keep the upload itself as the oldest version
+            versions = versions[:1] + versions[-WORKSPACE_HISTORY_LIMIT:]
+        history = {'head': len(versions) - 1, 'versions': versions}
+        _write_history(uid, history)
+
+        used = {digest for v in versions for digest in v['members'].values()}
+        for name in os.listdir(workspace_dir(uid)):
+            if name.endswith('.blob') and name[:-len('.blob')] not in used:
+                os.remove(os.path.join(workspace_dir(uid), name))
+    return history['head']
+
+def move_head(uid, step):
+    """Undo (step=-1) or redo (step=1); returns the new version or None if there is none."""
+    with _history_lock(uid):
+        history = read_history(uid)
+        head = history['head'] + step
+        if not 0 <= head < len(history['versions']):
+            return None
+        history['head'] = head
+        _write_history(uid, history)
+    return history['versions'][head]
+
+def build_working_zip(zip_filename, uid, dst):
+    """Write the session's current version as a complete save ZIP to dst."""
+    replacements = {}
+    for fname, digest in current_members(uid).items():
+        with open(_blob_path(uid, digest), 'rb') as f:
+            replacements[fname] = f.read()
+    with timed('zip_write'):
+        rebuild_save_zip(zip_filename, dst, replacements)
+
+# --- Save index --------------------------------------------------------------
+
+# Built once at upload so the tool pages don't have to reparse the save for summaries
+SAVE_INDEX_VERSION = 1
+# Per-structure columns kept next to the JSON summary, in flatten_structure_buckets() order
+INDEX_ROW = np.dtype([
+    ('type_id', '<i8'),
+    ('position', '<f8', (3,)),
+    ('group_id', '<i4'),
+])
+
+def save_index_path(zip_filename, ext='json'):
+    # The index hangs off the content-addressed upload, so a repeat upload finds it ready
+    return os.path.join(os.path.dirname(zip_filename), f"index.{ext}")
+
+def build_save_index(zip_filename, uid):
+    """Index a freshly uploaded save in one pass and write it next to the upload.
+
+    The JSON summary holds each member's name, size and CRC, the game stats, structure counts
+    per TypeID, the group summary and the position bounds; the structure columns go to a .npy
+    file. Parsing the constructions member here also leaves it in the parsed save cache.
+    """
+    with zipfile.ZipFile(zip_filename) as zf:
+        infos = [i for i in zf.infolist() if not i.is_dir()]
+        game_stats = {}
+        game_state_info = next((i for i in infos if i.filename.lower().endswith('gamestatesavedata.json')), None)
+        if game_state_info:
+            try:
+                with timed('zip_inflate'):
+                    raw_game_state = zf.read(game_state_info).decode('utf-8')
+                with timed('json_loads'):
+                    state = read_game_state(raw_game_state)
+                game_stats['Days'] = state.get('GameDays')
+                game_stats['Hours'] = state.get('GameHours')
+                game_stats['Type'] = state.get('GameType')
+                game_stats['Crash Site'] = str(state.get('CrashSite', 'N/A')).title()
+            except Exception as e:
+                app.logger.warning("Could not parse %s: %s", game_state_info.filename, e)
+
+    index = {
+        'version': SAVE_INDEX_VERSION,
+        'members': [{'name': i.filename, 'size': i.file_size, 'compressed_size': i.compress_size, 'crc': i.CRC}
+                    for i in infos],
+        'game_stats': game_stats,
+        'constructions': None,
+    }
+    constructions_info = next((i for i in infos if 'constructions' in i.filename.lower()
+                               and i.filename.endswith('.json')), None)
+    if constructions_info:
+        try:
+            tree = load_save_member(zip_filename, constructions_info.filename, uid=uid)
+            flat, _ = flatten_structure_buckets(tree['Data']['Constructions']['Structures'])
+        except Exception as e:
+            app.logger.warning("Could not index %s: %s", constructions_info.filename, e)
+        else:
+            with timed('group'):
+                grouped = structure_groups([dict(s) for s in flat], nearby_threshold=5.00)
+            rows = np.zeros(len(grouped), dtype=INDEX_ROW)
+            for i, s in enumerate(grouped):
+                tid = s.get('TypeID')
+                rows[i] = (tid if isinstance(tid, int) and not isinstance(tid, bool) else -1,
+                           _axes(s.get('Position'), 'xyz'), s['group_id'])
+            tmp_path = f"{save_index_path(zip_filename, 'npy')}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, 'wb') as f:
+                np.save(f, rows, allow_pickle=False)
+            os.replace(tmp_path, save_index_path(zip_filename, 'npy'))
+
+            type_ids, type_counts = np.unique(rows['type_id'], return_counts=True)
+            positions = rows['position'][np.isfinite(rows['position']).all(axis=1)]
+            groups = listing_summaries(build_structure_listing(grouped))
+            index['constructions'] = {
+                'member': constructions_info.filename,
+                'crc': constructions_info.CRC,
+                'count': len(grouped),
+                'type_counts': {str(t): c for t, c in zip(type_ids.tolist(), type_counts.tolist())},
+                'groups': [{k: g[k] for k in ('label', 'count', 'first_pos')} for g in groups],
+                'bounds': {'min': positions.min(axis=0).tolist(), 'max': positions.max(axis=0).tolist()}
+                          if len(positions) else None,
+            }
+
+    tmp_path = f"{save_index_path(zip_filename)}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, separators=(',', ':'))
+    os.replace(tmp_path, save_index_path(zip_filename))
+    return index
+
+def read_save_index(zip_filename):
+    """The upload's index summary, or None when it hasn't been built (or has an old layout)."""
+    if not zip_filename:
+        return None
+    path = save_index_path(zip_filename)
+    try:
+        key = ('index', path, os.stat(path).st_mtime_ns)
+    except OSError:
+        return None
+    index = save_cache.get(key)
+    if index is None:
+        with open(path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        save_cache.put(key, index, os.path.getsize(path) * PARSED_SIZE_FACTOR)
+    return index if index.get('version') == SAVE_INDEX_VERSION else None
+
+def indexed_structure_columns(zip_filename, fname, ref):
+    """The index's per-structure columns while they still describe the member's current content, else None."""
+    index = read_save_index(zip_filename)
+    info = index and index.get('constructions')
+    if not info or info['member'] != fname or info['crc'] != ref[0]:
+        return None
+    try:
+        return np.load(save_index_path(zip_filename, 'npy'), allow_pickle=False)
+    except (OSError, ValueError):
+        return None
+
+# --- Export helpers ----------------------------------------------------------
+
+# Log the peak RSS of every save export (SOTFSE_LOG_EXPORT_RSS=1)
+LOG_EXPORT_RSS = os.environ.get('SOTFSE_LOG_EXPORT_RSS', '').lower() in ('1', 'true', 'yes')
+if LOG_EXPORT_RSS:
+    app.logger.setLevel(logging.INFO)
+
+def new_download_path():
+    return os.path.join(UPLOAD_DIR, f"download_{uuid.uuid4()}.zip")
+
+class TempDownload(io.BufferedReader):
+    """A temp file being downloaded, removed as soon as the server closes it after sending."""
+
+    def __init__(self, path):
+        super().__init__(io.FileIO(path, 'rb'))
+        self.path = path
+
+    def close(self):
+        if self.closed:
+            return
+        super().close()
+        # Only now, since an open file can't be removed on Windows
+        try:
+            os.remove(self.path)
+        except OSError as error:
+            app.logger.error("Error removing or cleaning up file: %s", error)
+
+def send_and_remove(path, download_name, mimetype='application/zip'):
+    """send_file a temp file from disk and delete it once it has been sent.
+
+    send_file responses are passed straight to the server, which closes the file when it is
+    done with it; that is when TempDownload removes it. A download that is never sent is
+    left for the artifact sweep.
+    """
+    size = os.path.getsize(path)
+    response = send_file(TempDownload(path), mimetype=mimetype, as_attachment=True, download_name=download_name)
+    response.content_length = size
+    return response
+
+def reset_peak_rss():
+    """Reset the kernel's peak RSS counter (VmHWM) for this process; Linux only."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+def peak_rss_bytes():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource  # Unix only
+    except ImportError:
+        return 0
+    # Lifetime peak of the worker (kB on Linux)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+@contextlib.contextmanager
+def export_rss_logging(label):
+    """Log the peak RSS reached while an export runs."""
+    if not LOG_EXPORT_RSS:
+        yield
+        return
+    per_export = reset_peak_rss()
+    try:
+        yield
+    finally:
+        app.logger.info(
+            "Export %s peak RSS %.1f MB%s", label, peak_rss_bytes() / 1024 / 1024,
+            "" if per_export else " (worker lifetime peak)"
+        )
+
+# --- Background jobs ---------------------------------------------------------
+
+# Heavy save operations run on this pool so the request worker is freed right away
+JOB_WORKERS = int(os.environ.get('SOTFSE_JOB_WORKERS') or 2)
+job_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix='save-job')
+JOB_STAGES = ('parse', 'merge', 'serialize', 'save')
+# Seconds before retrying a job whose session has a job running in another worker process
+JOB_RETRY_SECONDS = 0.5
+# Jobs waiting for an earlier job of their session in this process, by session
+_session_jobs = {}
+_session_jobs_lock = threading.Lock()
+
+def _job_status_path(job_id):
+    return os.path.join(UPLOAD_DIR, f"job_{job_id}.json")
+
+def _write_job_status(job_id, status):
+    # Status lives on disk so any gunicorn worker can answer the progress polls
+    path = _job_status_path(job_id)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(status, f)
+    os.replace(tmp_path, path)
+
+def read_job_status(job_id):
+    try:
+        uuid.UUID(job_id)
+        with open(_job_status_path(job_id), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (ValueError, OSError):
+        return None
+
+def submit_job(kind, fn, *args):
+    """Run fn(progress, *args) on the job pool and return the job id.
+
+    fn reports its stage through progress(stage), commits its changes to the session's
+    working copy and returns a dict with messages (a list of [category, text] pairs to
+    show the user).
+    """
+    job_id = str(uuid.uuid4())
+    owner = session.get('uid')
+    # A profiled request profiles the job it starts as well
+    profile_dir = session_diag_dir(session['uid']) if profile_requested() and session.get('uid') else None
+    status = {
+        'id': job_id,
+        'kind': kind,
+        'owner': owner,
+        'state': 'queued',
+        'stage': None,
+        'messages': [],
+        'updated': time.time(),
+    }
+    _write_job_status(job_id, status)
+
+    def progress(stage):
+        status.update(state='running', stage=stage, updated=time.time())
+        _write_job_status(job_id, status)
+
+    def run():
+        _metrics_route.name = f"job:{kind}"
+        started = metrics_start()
+        profiler = RequestProfiler(f"job-{kind}") if profile_dir else None
+        # The submitting request's own profile is still finishing
+        profiling = profiler is not None and profiler.start(wait=30)
+        try:
+            with export_rss_logging(kind):
+                result = fn(progress, *args)
+        except Exception as e:
+            app.logger.exception("Job %s (%s) failed", job_id, kind)
+            status.update(state='error', error=str(e))
+        else:
+            status.update(result, state='done', stage=None)
+        finally:
+            if profiling:
+                profiler.stop(profile_dir)
+        status['updated'] = time.time()
+        _write_job_status(job_id, status)
+        if METRICS_ENABLED:
+            metrics.inc('sotfse_jobs_total', kind=kind, state=status['state'])
+            metrics_finish(started, 'sotfse_job_seconds', kind=kind)
+
+    _schedule_job(owner, run)
+    return job_id
+
+def _schedule_job(owner, job):
+    """Run job on the pool once the session's earlier jobs are done.
+
+    A waiting job stays 'queued' without holding a pool thread, so one session's queue
+    can't stall everyone else's jobs.
+    """
+    if not owner:
+        job_executor.submit(job)
+        return
+    with _session_jobs_lock:
+        pending = _session_jobs.get(owner)
+        if pending is not None:
+            pending.append(job)
+            return
+        _session_jobs[owner] = deque()
+    job_executor.submit(_run_session_job, owner, job)
+
+def _run_session_job(owner, job):
+    busy = False
+    try:
+        # The session's jobs may also be started by other gunicorn workers
+        with _jobs_lock(owner, blocking=False) as acquired:
+            busy = not acquired
+            if acquired:
+                job()
+    except Exception:
+        app.logger.exception("Job of session %s could not run", owner)
+    if busy:
+        retry = threading.Timer(JOB_RETRY_SECONDS, job_executor.submit, (_run_session_job, owner, job))
+        retry.daemon = True
+        retry.start()
+        return
+    with _session_jobs_lock:
+        pending = _session_jobs[owner]
+        job = pending.popleft() if pending else None
+        if job is None:
+            del _session_jobs[owner]
+    if job is not None:
+        job_executor.submit(_run_session_job, owner, job)
+
+def owned_job(job_id):
+    """Returns the job status if it belongs to the current upload session."""
+    status = read_job_status(job_id)
+    if status is None or status.get('owner') != session.get('uid'):
+        return None
+    return status
+
+# --- Content-addressed uploads -----------------------------------------------
+
+OBJECTS_DIR = os.path.join(UPLOAD_DIR, 'objects')
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+class ContentStore:
+    """Uploaded saves and base files, stored once per SHA-256 of their content.
+
+    objects/<digest>/ holds the upload under a fixed name next to whatever was derived
+    from it (the save index, a base file's extracted structures), plus one refs/<owner>
+    file per session using it. The directory is removed when the last reference is
+    released, or by the artifact sweep once no session has touched it within the TTL.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.lock_path = os.path.join(root, '.lock')
+
+    def object_dir(self, digest):
+        return os.path.join(self.root, digest)
+
+    def ref_path(self, digest, owner):
+        return os.path.join(self.object_dir(digest), 'refs', owner)
+
+    @contextlib.contextmanager
+    def _locked(self):
+        # Acquire and release may race on different gunicorn workers
+        os.makedirs(self.root, exist_ok=True)
+        with file_lock(self.lock_path):
+            yield
+
+    def ingest(self, stream, name, owner):
+        """Store a stream as objects/<digest>/<name>, hashing it on the way, and reference it for owner.
+
+        Returns (digest, path); an identical earlier upload is kept and the new copy dropped.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = os.path.join(self.root, f"incoming-{uuid.uuid4().hex}.tmp")
+        sha = hashlib.sha256()
+        with timed('upload_hash'), open(tmp_path, 'wb') as f:
+            for chunk in iter(lambda: stream.read(UPLOAD_CHUNK_BYTES), b''):
+                sha.update(chunk)
+                f.write(chunk)
+        digest = sha.hexdigest()
+        path = os.path.join(self.object_dir(digest), name)
+        with self._locked():
+            os.makedirs(os.path.dirname(self.ref_path(digest, owner)), exist_ok=True)
+            if os.path.exists(path):
+                os.remove(tmp_path)
+                if METRICS_ENABLED:
+                    metrics.inc('sotfse_upload_dedupe_total', kind=name.partition('.')[0])
+            else:
+                os.replace(tmp_path, path)
+            with open(self.ref_path(digest, owner), 'w'):
+                pass
+        return digest, path
+
+    def live_refs(self, digest, since):
+        """How many of digest's references were touched (by a session using it) after since."""
+        refs_dir = os.path.dirname(self.ref_path(digest, '_'))
+        try:
+            names = os.listdir(refs_dir)
+        except OSError:
+            return 0
+        live = 0
+        for name in names:
+            try:
+                live += os.stat(os.path.join(refs_dir, name)).st_mtime > since
+            except OSError:
+                pass
+        return live
+
+    def refcount(self, digest):
+        try:
+            return len(os.listdir(os.path.dirname(self.ref_path(digest, '_'))))
+        except OSError:
+            return 0
+
+    def release(self, digest, owner):
+        """Drop owner's reference; the object and everything derived from it go with the last one."""
+        with self._locked():
+            try:
+                os.remove(self.ref_path(digest, owner))
+            except OSError:
+                pass
+            if self.refcount(digest) == 0:
+                shutil.rmtree(self.object_dir(digest), ignore_errors=True)
+
+content_store = ContentStore(OBJECTS_DIR)
+
+# --- Upload artifact cleanup -------------------------------------------------
+
+# Artifacts unused for this long are removed
+ARTIFACT_TTL_SECONDS = float(os.environ.get('SOTFSE_ARTIFACT_TTL_HOURS') or 24) * 3600
+# Total size the uploads directory may grow to before least recently used artifacts are evicted
+ARTIFACT_QUOTA_BYTES = int(os.environ.get('SOTFSE_UPLOADS_QUOTA_MB') or 4096) * 1024 * 1024
+ARTIFACT_SWEEP_SECONDS = int(os.environ.get('SOTFSE_SWEEP_INTERVAL') or 600)
+# Artifacts used this recently are never evicted, so running sessions and jobs keep their files
+ARTIFACT_MIN_AGE_SECONDS = 300
+
+class ArtifactManager:
+    """Tracks the files each session leaves in the uploads directory and sweeps old ones.
+
+    Every top-level entry in uploads/ (and every file in uploads/cache/ and object in
+    uploads/objects/) is one artifact, except the kept ones (metrics snapshots); its mtime
+    is its last use, refreshed by touch() whenever a session works with it. Objects are
+    removed under the content store's lock, and kept if a reference was touched meanwhile.
+    """
+
+    def __init__(self, roots, ttl, quota, min_age, keep=(), content_store=None):
+        self.roots = roots
+        self.keep = keep
+        self.content_store = content_store
+        self.ttl = ttl
+        self.quota = quota
+        self.min_age = min_age
+        self._lock = threading.Lock()
+        self._sweeper = None
+
+    def touch(self, *paths):
+        for path in paths:
+            if path:
+                try:
+                    os.utime(path)
+                except OSError:
+                    pass
+
+    def _measure(self, path):
+        """Returns (size, last_used) of a file or a directory tree."""
+        st = os.stat(path)
+        if not os.path.isdir(path):
+            return st.st_size, st.st_mtime
+        size, last_used = 0, st.st_mtime
+        for dirpath, _, filenames in os.walk(path):
+            for name in filenames:
+                try:
+                    fst = os.stat(os.path.join(dirpath, name))
+                except OSError:
+                    continue
+                size += fst.st_size
+                last_used = max(last_used, fst.st_mtime)
+        return size, last_used
+
+    def scan(self):
+        artifacts = []
+        for root in self.roots:
+            try:
+                names = os.listdir(root)
+            except OSError:
+                continue
+            for name in names:
+                path = os.path.join(root, name)
+                if path in self.roots or path in self.keep:
+                    continue
+                try:
+                    size, last_used = self._measure(path)
+                except OSError:
+                    continue
+                artifacts.append((last_used, size, path))
+        return artifacts
+
+    def _remove(self, path, idle_since):
+        """Remove an artifact last used before idle_since; False if it's gone or back in use."""
+        store = self.content_store
+        if store is not None and os.path.dirname(path) == store.root and os.path.isdir(path):
+            # An upload being ingested or a session picking the object up again holds the store lock
+            with store._locked():
+                if store.live_refs(os.path.basename(path), idle_since):
+                    return False
+                return self._delete(path)
+        return self._delete(path)
+
+    def _delete(self, path):
+        try:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+            return True
+        except OSError as e:
+            # Another worker may have swept it first
+            if os.path.exists(path):
+                app.logger.warning("Could not remove upload artifact %s: %s", path, e)
+            return False
+
+    def sweep(self, now=None):
+        """Remove expired artifacts, then evict least recently used ones until under quota."""
+        now = time.time() if now is None else now
+        with self._lock:
+            artifacts = sorted(self.scan())
+            total = sum(size for _, size, _ in artifacts)
+            removed = reclaimed = 0
+            for last_used, size, path in artifacts:
+                age = now - last_used
+                expired = age > self.ttl
+                over_quota = total > self.quota and age > self.min_age
+                if not (expired or over_quota):
+                    continue
+                if self._remove(path, now - (self.min_age if over_quota else self.ttl)):
+                    removed += 1
+                    reclaimed += size
+                total -= size
+        if METRICS_ENABLED:
+            metrics.inc('sotfse_artifact_sweeps_total')
+            metrics.inc('sotfse_artifacts_removed_total', removed)
+            metrics.inc('sotfse_artifact_bytes_reclaimed_total', reclaimed)
+            # The sweeper thread may run long after the last request flushed
+            metrics.flush()
+        if removed:
+            app.logger.info("Swept %d upload artifacts, reclaimed %.1f MB", removed, reclaimed / 1024 / 1024)
+        return removed, reclaimed
+
+    def start_sweeper(self, interval):
+        """Sweep once now and then every interval seconds on a daemon thread."""
+        if self._sweeper is not None:
+            return
+
+        def loop():
+            while True:
+                try:
+                    self.sweep()
+                except Exception:
+                    app.logger.exception("Upload artifact sweep failed")
+                time.sleep(interval)
+
+        self._sweeper = threading.Thread(target=loop, name='artifact-sweeper', daemon=True)
+        self._sweeper.start()
+
+artifact_manager = ArtifactManager(
+    [UPLOAD_DIR, SAVE_CACHE_DIR, OBJECTS_DIR], ARTIFACT_TTL_SECONDS, ARTIFACT_QUOTA_BYTES, ARTIFACT_MIN_AGE_SECONDS,
+    keep=[METRICS_DIR, content_store.lock_path], content_store=content_store
+)
+if ARTIFACT_SWEEP_SECONDS > 0:
+    artifact_manager.start_sweeper(ARTIFACT_SWEEP_SECONDS)
+
+def session_artifacts():
+    """Paths of every temp artifact the current session is working with."""
+    paths = [session.get('zip_filename')]
+    if session.get('uid'):
+        paths.append(workspace_dir(session['uid']))
+        paths.append(session_diag_dir(session['uid']))
+        paths.append(response_cache_dir(session['uid']))
+    if session.get('save_digest') and session.get('uid'):
+        paths.append(content_store.ref_path(session['save_digest'], session['uid']))
+    if session.get('edit_session_id'):
+        paths.append(os.path.join(UPLOAD_DIR, f"edit_{session['edit_session_id']}"))
+    if session.get('base_temp_id'):
+        base_temp_id = session['base_temp_id']
+        paths.append(base_duplicates_path(base_temp_id))
+        if session.get('base_digest'):
+            paths.append(content_store.ref_path(session['base_digest'], base_temp_id))
+        paths.append(os.path.join(UPLOAD_DIR, f"diag_{base_temp_id}"))
+    if session.get('manage_id'):
+        paths.append(os.path.join(UPLOAD_DIR, f"manage_{session['manage_id']}_structs.bin"))
+    paths.extend(listing_path(kind) for kind in ('import', 'manage'))
+    return [p for p in paths if p]
+
+# --- Conditional and compressed responses ------------------------------------
+
+# Smaller bodies aren't worth a compressed copy on disk
+COMPRESS_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# Content-Encoding -> file suffix of the cached variant (and of its ETag)
+RESPONSE_ENCODINGS = {'br': '.br', 'gzip': '.gz', None: ''}
+
+def response_cache_dir(uid):
+    return os.path.join(UPLOAD_DIR, f"responses_{uid}")
+
+def response_etag(*parts):
+    """ETag of a response built from parts (upload hash, member token, transform, ...)."""
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()[:24]
+
+def negotiate_encoding(size):
+    if size < COMPRESS_MIN_BYTES:
+        return None
+    if brotli is not None and request.accept_encodings['br']:
+        return 'br'
+    if request.accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+def _compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, GZIP_LEVEL, mtime=0)
+
+def _write_atomic(path, data):
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+def cached_response(etag_parts, build, mimetype, download_name=None):
+    """Serve build()'s bytes with an ETag, answering If-None-Match with 304.
+
+    The body and each compressed variant are written to the session's response cache the
+    first time they're asked for, so a repeat view is one file read and build() only runs
+    when the content changed. Pages with pending flash messages are built fresh every time.
+    """
+    uid = session.get('uid')
+    if session.get('_flashes') or not uid:
+        return Response(build(), mimetype=mimetype)
+
+    etag = response_etag(*etag_parts)
+    if any(request.if_none_match.contains(etag + suffix) for suffix in RESPONSE_ENCODINGS.values()):
+        if METRICS_ENABLED:
+            metrics.inc('sotfse_response_cache_total', outcome='not_modified')
+        response = Response(status=304)
+        response.set_etag(etag)
+        response.vary.add('Accept-Encoding')
+        return response
+
+    cache_dir = response_cache_dir(uid)
+    identity_path = os.path.join(cache_dir, etag)
+    try:
+        with open(identity_path, 'rb') as f:
+            body = f.read()
+        outcome = 'hit'
+    except OSError:
+        body = build()
+        os.makedirs(cache_dir, exist_ok=True)
+        _write_atomic(identity_path, body)
+        outcome = 'miss'
+
+    encoding = negotiate_encoding(len(body))
+    if encoding:
+        variant_path = identity_path + RESPONSE_ENCODINGS[encoding]
+        try:
+            with open(variant_path, 'rb') as f:
+                body = f.read()
+        except OSError:
+            with timed('compress'):
+                body = _compress(body, encoding)
+            _write_atomic(variant_path, body)
+    if METRICS_ENABLED:
+        metrics.inc('sotfse_response_cache_total', outcome=outcome)
+
+    response = Response(body, mimetype=mimetype)
+    response.set_etag(etag + RESPONSE_ENCODINGS[encoding])
+    response.vary.add('Accept-Encoding')
+    # Always revalidate; an unchanged page then costs a 304
+    response.headers['Cache-Control'] = 'private, no-cache'
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    if download_name:
+        response.headers['Content-Disposition'] = f'attachment; filename="{download_name}"'
+    return response
+
+# --- Structure listings ------------------------------------------------------
+
+LISTING_PAGE_SIZE = 200
+
+def base_structs_path(base_digest):
+    """Structures extracted from a community base file, shared by every session importing it."""
+    return os.path.join(content_store.object_dir(base_digest), 'structs.bin')
+
+def base_meta_path(base_digest):
+    return os.path.join(content_store.object_dir(base_digest), 'meta.json')
+
+def base_duplicates_path(base_temp_id):
+    """Which of the base's structures already exist in the session's save, for one import."""
+    return os.path.join(UPLOAD_DIR, f"{base_temp_id}_dupes.npy")
+
+def load_base_duplicates(base_temp_id, count):
+    try:
+        return np.load(base_duplicates_path(base_temp_id), allow_pickle=False)
+    except (OSError, ValueError):
+        return np.zeros(count, dtype=bool)
+
+def listing_path(kind):
+    """Path of the session's group listing for the import or manage picker, if any."""
+    if kind == 'import' and session.get('base_temp_id'):
+        return os.path.join(UPLOAD_DIR, f"{session['base_temp_id']}_listing.json")
+    if kind == 'manage' and session.get('manage_id'):
+        return os.path.join(UPLOAD_DIR, f"manage_{session['manage_id']}_listing.json")
+    return None
+
+def write_listing(path, listing):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(listing, f, separators=(',', ':'))
+
+def load_listing(kind):
+    path = listing_path(kind)
+    if not path or not os.path.exists(path):
+        return None
+    st = os.stat(path)
+    # Listings are written once under a fresh id; their mtime only tracks the sweeper's last use
+    key = ('listing', path, st.st_size)
+    listing = save_cache.get(key)
+    if listing is None:
+        with open(path, "r", encoding="utf-8") as f:
+            listing = json.load(f)
+        save_cache.put(key, listing, st.st_size * PARSED_SIZE_FACTOR)
+    return listing
+
+# --- Structure map -----------------------------------------------------------
+
+def load_structure_map(kind):
+    """Positions, group ids and selectable flags of the session's import/manage structures, or None.
+
+    Comes with a cache key naming the save member (or base file) the structures were read
+    from, so tiles can be shared across page visits until that content changes.
+    """
+    listing = load_listing(kind) if kind in ('import', 'manage') else None
+    if listing is None:
+        return None
+    if kind == 'import':
+        if not session.get('base_digest'):
+            return None
+        structs_path = base_structs_path(session['base_digest'])
+    else:
+        structs_path = os.path.join(UPLOAD_DIR, f"manage_{session['manage_id']}_structs.bin")
+    if not os.path.exists(structs_path):
+        return None
+    with StructureStore(structs_path) as store:
+        positions = np.array(store.rows['position'])
+        duplicates = store.is_duplicate()
+        source = store.meta.get('source')
+    if kind == 'import':
+        duplicates = load_base_duplicates(session['base_temp_id'], len(positions))
+        # The duplicate overlay depends on the save the base is compared against
+        save_fname = next((f for f in session.get('json_files', []) if 'construction' in f.lower()), None)
+        save_ref = None
+        if save_fname and os.path.isfile(session.get('zip_filename') or ''):
+            save_ref = member_ref(session['zip_filename'], save_fname, session.get('uid'))[0]
+        key = ('map', 'import', session['base_temp_id'], session.get('zip_filename'), save_fname,
+               json.dumps(save_ref))
+    else:
+        key = ('map', session.get('zip_filename'), session.get('manage_fname'),
+               json.dumps(source))
+
+    # Group ids live in the listing; they are kept as bytes so the disk cache tier can hold them
+    groups_key = key + ('groups', listing['count'])
+    group_bytes = save_cache.get(groups_key)
+    if group_bytes is None:
+        group_ids = np.full(listing['count'], -1, dtype=np.int32)
+        for group_id, group in enumerate(listing['groups']):
+            group_ids[[m[0] for m in group['members']]] = group_id
+        group_bytes = group_ids.tobytes()
+        save_cache.put(groups_key, group_bytes, len(group_bytes))
+    group_ids = np.frombuffer(group_bytes, dtype=np.int32)
+
+    selectable = group_ids >= 0
+    if kind == 'import':
+        # Duplicates can't be imported in place, so the map only selects them when asked to
+        selectable &= ~duplicates
+    return {'key': key, 'positions': positions, 'group_ids': group_ids, 'duplicates': duplicates,
+            'selectable': selectable, 'bounds': map_bounds(positions)}
+
+# --- Raw editor sessions -----------------------------------------------------
+
+EDITOR_PAGE_SIZE = 200
+EDITOR_PREVIEW_CHARS = 200
+# The same safe limit the full-document textarea used to enforce
+EDITOR_NODE_MAX_BYTES = int(1.5 * 1024 * 1024)
+
+def edit_patches_path(edit_session_id):
+    return os.path.join(UPLOAD_DIR, f"edit_{edit_session_id}", "patches.json")
+
+def load_edit_patches(edit_session_id):
+    """Returns the JSON Patch documents applied in an edit session, oldest first."""
+    try:
+        with open(edit_patches_path(edit_session_id), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+def edit_patches_lock(edit_session_id):
+    """Held while a PATCH checks the revision and appends, so concurrent edits can't drop each other."""
+    path = edit_patches_path(edit_session_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return file_lock(f"{path}.lock")
+
+def save_edit_patches(edit_session_id, patches):
+    path = edit_patches_path(edit_session_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(patches, f)
+    os.replace(tmp_path, path)
 
-    # Fallback: if root structure is itself a list of dicts
-    elif isinstance(data, list):
-        for s in data:
-            if isinstance(s, dict):
-                structure_candidates.append(s)
-    elif isinstance(data, dict) and "TypeID" in data:
-        structure_candidates.append(data)
+def edited_tree(zip_filename, fname, uid, patches):
+    """The cached member tree with an edit session's patches replayed on top of it."""
+    tree = load_save_member(zip_filename, fname, uid=uid)
+    with timed('json_patch'):
+        return apply_json_patch(tree, [op for patch in patches for op in patch])
 
-    return structure_candidates, meta
+def json_type_name(value):
+    if isinstance(value, dict):
+        return 'object'
+    if isinstance(value, list):
+        return 'array'
+    if isinstance(value, str):
+        return 'string'
+    if isinstance(value, bool):
+        return 'boolean'
+    if value is None:
+        return 'null'
+    return 'number'
 
-def normalize_imported_structure(structure, keep_linked=True):
-    """Normalize imported structure while preserving relationships."""
-    s = copy.deepcopy(structure)
-    if not keep_linked:
-        if "LinkedStructures" in s:
-            original_length = len(s["LinkedStructures"])
-            s["LinkedStructures"] = [None] * original_length
-    if "Storages" not in s:
-        s["Storages"] = []
-    if "Scale" not in s:
-        s["Scale"] = {"x": 1.0, "y": 1.0, "z": 1.0}
-    return s
+def _plan_fields(plan):
+    return plan.get('fields', {}) if plan else {}
 
-def distance(pos1, pos2):
-    if not pos1 or not pos2:
-        return float('inf')
-    try:
-        return math.sqrt(
-            (float(pos1.get('x', 0)) - float(pos2.get('x', 0)))**2 +
-            (float(pos1.get('y', 0)) - float(pos2.get('y', 0)))**2 +
-            (float(pos1.get('z', 0)) - float(pos2.get('z', 0)))**2
-        )
-    except Exception:
-        return float('inf')
+def plan_at_pointer(plan, tokens):
+    """Returns (was_string, subplan) for the node at tokens; (False, None) once off the plan."""
+    was_string = False
+    for token in tokens:
+        if not plan:
+            return False, None
+        if token in _plan_fields(plan):
+            was_string, plan = plan['fields'][token]
+        else:
+            was_string, plan = False, plan.get('items')
+    return was_string, plan
 
-def annotate_nearby(structures, threshold=0.25):
-    # Add a list of nearby indices to each structure
-    n = len(structures)
-    for i in range(n):
-        nearby = []
-        pos_i = structures[i].get('Position')
-        for j in range(n):
-            if i == j: continue
-            pos_j = structures[j].get('Position')
-            if distance(pos_i, pos_j) < threshold:
-                nearby.append(j)
-        structures[i]['nearby_indices'] = nearby
-    return structures
+def describe_json_node(node, plan, offset=0, limit=EDITOR_PAGE_SIZE):
+    """A summary of node with one page of its children, for the lazily expanding editor tree."""
+    out = {'type': json_type_name(node)}
+    if not isinstance(node, (dict, list)):
+        out['value'] = node
+        return out
+    out['size'] = len(node)
+    out['offset'] = offset
+    items = node.items() if isinstance(node, dict) else enumerate(node)
+    children = []
+    for key, value in itertools.islice(items, offset, offset + limit):
+        child = {'key': key, 'type': json_type_name(value)}
+        if isinstance(value, (dict, list)):
+            child['size'] = len(value)
+        elif isinstance(value, str) and len(value) > EDITOR_PREVIEW_CHARS:
+            child['preview'] = value[:EDITOR_PREVIEW_CHARS]
+            child['length'] = len(value)
+        else:
+            child['value'] = value
+        if isinstance(node, dict) and isinstance(value, (dict, list)) \
+                and _plan_fields(plan).get(key, (False, None))[0]:
+            child['stringified'] = True
+        children.append(child)
+    out['children'] = children
+    return out
 
-def structure_groups(structures, nearby_threshold=0.28):
-    import math
-    def distance(pos1, pos2):
-        if not pos1 or not pos2:
-            return float('inf')
-        try:
-            return math.sqrt(
-                (float(pos1.get('x', 0)) - float(pos2.get('x', 0)))**2 +
-                (float(pos1.get('y', 0)) - float(pos2.get('y', 0)))**2 +
-                (float(pos1.get('z', 0)) - float(pos2.get('z', 0)))**2
-            )
-        except Exception:
-            return float('inf')
-    n = len(structures)
-    adj = [[] for _ in range(n)]
-    # Build adjacency graph for “nearby” and “linked”
-    for i in range(n):
-        # Nearby
-        pi = structures[i].get('Position')
-        for j in range(i+1, n):
-            pj = structures[j].get('Position')
-            if distance(pi, pj) < nearby_threshold:
-                adj[i].append(j)
-                adj[j].append(i)
-        # # Linked
-        # links = structures[i].get('LinkedStructures') or []
-        # for link in links:
-        #     if isinstance(link, int) and 0 <= link < n and link != i:
-        #         adj[i].append(link)
-        #         adj[link].append(i)
-    # Find connected components (DFS)
-    group = [None] * n
-    group_counter = 0
-    for i in range(n):
-        if group[i] is not None:
-            continue
-        # Start a new group
-        stack = [i]
-        group[i] = group_counter
-        while stack:
-            node = stack.pop()
-            for neighbor in adj[node]:
-                if group[neighbor] is None:
-                    group[neighbor] = group_counter
-                    stack.append(neighbor)
-        group_counter += 1
-    # Annotate each structure with the group id
-    for i, s in enumerate(structures):
-        s['group_id'] = group[i]
-        s['group_label'] = f"Structure Group {group[i] + 1}"
-    return structures
+@app.before_request
+def touch_session_artifacts():
+    # Keep the artifacts of active sessions at the young end of the LRU
+    if request.endpoint != 'static':
+        artifact_manager.touch(*session_artifacts())
 
-# --- End helpers -------------------------------------------------------------
+def metrics_start():
+    if METRICS_ENABLED and METRICS_TRACEMALLOC:
+        # Process-wide, so overlapping requests and jobs share one peak
+        tracemalloc.reset_peak()
+    return time.perf_counter()
 
-app = Flask(__name__)
-# Load the secret key from an environment variable for security
-app.secret_key = os.environ.get('SOTFSE_SECRET_KEY')
-if not app.secret_key:
-    raise ValueError("No SOTFSE_SECRET_KEY set for Flask application")
+def metrics_finish(started, histogram, **labels):
+    """Record the duration (and traced peak memory) of a request or job and snapshot the totals."""
+    metrics.observe(histogram, time.perf_counter() - started, **labels)
+    if METRICS_TRACEMALLOC:
+        metrics.observe('sotfse_request_peak_memory_bytes', tracemalloc.get_traced_memory()[1],
+                        route=_metrics_route.name)
+    metrics.flush()
 
-# Add these lines to increase limits
-app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB limit
+@app.before_request
+def start_request_metrics():
+    _metrics_route.name = request.endpoint
+    if METRICS_ENABLED and request.endpoint not in (None, 'static', 'prometheus_metrics'):
+        g.metrics_started = metrics_start()
 
-UPLOAD_DIR = 'uploads'
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop('metrics_started', None)
+    if started is not None:
+        endpoint = request.endpoint
+        metrics.inc('sotfse_requests_total', endpoint=endpoint, method=request.method,
+                    status=response.status_code)
+        metrics.inc('sotfse_request_bytes_total', request.content_length or 0, endpoint=endpoint)
+        # Streamed responses have no length up front
+        metrics.inc('sotfse_response_bytes_total', response.content_length or 0, endpoint=endpoint)
+        metrics_finish(started, 'sotfse_request_seconds', endpoint=endpoint)
+    return response
+
+@app.before_request
+def start_request_profile():
+    if request.endpoint not in (None, 'static') and profile_requested():
+        profiler = RequestProfiler(request.endpoint)
+        if profiler.start():
+            g.profiler = profiler
+
+@app.after_request
+def finish_request_profile(response):
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        # Looked up now, so an upload's profile lands in the session it just created
+        uid = session.get('uid')
+        summary = profiler.stop(session_diag_dir(uid) if uid else None)
+        if summary:
+            response.headers['X-SOTFSE-Profile'] = os.path.relpath(summary, UPLOAD_DIR)
+    return response
 
 @app.context_processor
 def inject_session_data():
@@ -266,12 +3270,10 @@ def upload():
     if not file or not file.filename.endswith('.zip'):
         return "Please upload your SaveData.zip!", 400
 
-    # Save zip to a temp file
+    # Identical saves are stored once; each upload still gets its own working copy
     uid = str(uuid.uuid4())
-    save_path = os.path.join(UPLOAD_DIR, f'{uid}.zip')
-    file.save(save_path)
+    save_digest, save_path = content_store.ingest(file.stream, 'save.zip', uid)
 
-    game_stats = {}
     with zipfile.ZipFile(save_path) as zf:
         json_files = [f for f in zf.namelist() if f.endswith('.json')]
         
@@ -283,33 +3285,25 @@ def upload():
             if parent_folder:
                 display_name = f"{parent_folder}/{file.filename}"
 
-        # Find and parse GameStateSaveData.json for stats
-        for f in json_files:
-            if 'gamestatesavedata.json' in f.lower():
-                try:
-                    raw_game_state = zf.read(f).decode('utf-8')
-                    game_state_data = json.loads(raw_game_state)
-                    
-                    # --- FIX: Unstringify the data before accessing it ---
-                    unstringified_data = deep_unstringify(game_state_data)
-                    state = unstringified_data.get("Data", {}).get("GameState", {})
-                    
-                    game_stats['Days'] = state.get('GameDays')
-                    game_stats['Hours'] = state.get('GameHours')
-                    game_stats['Type'] = state.get('GameType')
-                    game_stats['Crash Site'] = state.get('CrashSite', 'N/A').title()
-
-                except Exception as e:
-                    print(f"Could not parse GameStateSaveData.json: {e}")
-                break
+    # One pass over the save for the stats badges and every tool page's summaries,
+    # unless the same save was uploaded before
+    index = read_save_index(save_path)
+    if index is None:
+        with timed('index'):
+            index = build_save_index(save_path, uid)
+    game_stats = index['game_stats']
+
+    if session.get('save_digest') and session.get('uid'):
+        content_store.release(session['save_digest'], session['uid'])
 
     session['zip_filename'] = save_path
+    session['save_digest'] = save_digest
     session['json_files'] = json_files
     session['uid'] = uid
     session['original_filename'] = display_name
     session['game_stats'] = game_stats
     
-    return render_template('options.html', files=json_files)
+    return render_template('options.html', files=json_files, history=read_history(uid), index=index)
 
 @app.route('/edit/<path:fname>', methods=['GET', 'POST'])
 def edit_json(fname):
@@ -318,51 +3312,52 @@ def edit_json(fname):
         flash("Could not find uploaded ZIP—please start again!")
         return redirect(url_for('index'))
 
-    # This GET part for displaying the editor remains the same.
     if request.method == 'GET':
-        with zipfile.ZipFile(zip_filename) as zf:
-            raw_json = zf.read(fname).decode('utf-8')
+        # Keep pending changes when the editor of the same file is reopened
+        edit_session_id = session.get('edit_session_id')
+        if not edit_session_id or session.get('edit_fname') != fname:
+            edit_session_id = str(uuid.uuid4())
+            session['edit_session_id'] = edit_session_id
+            session['edit_fname'] = fname
+        revision = len(load_edit_patches(edit_session_id))
+        uid = session.get('uid')
+
+        def build():
+            # Parses (or reuses) the cached tree; the page itself only loads subtrees on demand
+            load_save_member(zip_filename, fname, uid=uid, ref=ref)
+            return render_template('editor.html', fname=fname, edit_session_id=edit_session_id,
+                                   revision=revision).encode('utf-8')
+
         try:
-            json_data = json.loads(raw_json)
+            ref = member_ref(zip_filename, fname, uid)
+            # A revalidated page is answered with 304 without parsing the member
+            return cached_response(
+                ('edit_json', session.get('save_digest') or zip_filename, fname, ref[0], edit_session_id, revision),
+                build, 'text/html'
+            )
         except Exception as e:
             flash(f"Could not parse JSON: {e}")
             return redirect(url_for('index'))
 
-        edit_session_id = str(uuid.uuid4())
-        edit_dir = os.path.join(UPLOAD_DIR, f"edit_{edit_session_id}")
-        os.makedirs(edit_dir, exist_ok=True)
-        
-        template_path = os.path.join(edit_dir, "template.json")
-        with open(template_path, "w", encoding="utf-8") as f:
-            f.write(raw_json)
-
-        editable_data = deep_unstringify(json_data)
-        
-        # This part remains for displaying the content in the textarea.
-        raw_json_for_textarea = json.dumps(editable_data, indent=2)
-
-        session['edit_session_id'] = edit_session_id
-        session['edit_fname'] = fname
-        
-        return render_template(
-            'editor.html',
-            fname=fname,
-            raw_json=raw_json_for_textarea,
-            edit_session_id=edit_session_id
-        )
-
-    # --- THIS IS THE MODIFIED POST LOGIC ---
     edit_session_id = session.get('edit_session_id')
     if not edit_session_id:
         flash("Edit session expired. Please start over.")
         return redirect(url_for('filelist'))
 
-    edit_dir = os.path.join(UPLOAD_DIR, f"edit_{edit_session_id}")
-    template_path = os.path.join(edit_dir, "template.json")
+    if 'discard_changes' in request.form:
+        if os.path.exists(edit_patches_path(edit_session_id)):
+            os.remove(edit_patches_path(edit_session_id))
+        flash("Your pending changes were discarded.", "info")
+        return redirect(url_for('edit_json', fname=fname))
 
-    if not os.path.exists(template_path):
-        flash("Edit session files not found. Please start over.")
-        return redirect(url_for('filelist'))
+    if 'apply_patches' in request.form:
+        patches = load_edit_patches(edit_session_id) if session.get('edit_fname') == fname else []
+        if not patches:
+            flash("There are no changes to save yet.", "warning")
+            return redirect(url_for('edit_json', fname=fname))
+        job_id = submit_job('edit', _edit_patches_job, zip_filename, session.get('uid'), fname,
+                            patches, edit_session_id, member_digests(session.get('uid'), [fname]))
+        return redirect(url_for('job_status', job_id=job_id))
 
     # Get the edited data from either the file upload or the textarea
     if 'upload_mode' in request.form:
@@ -378,67 +3373,149 @@ def edit_json(fname):
     else:
         edited = request.form.get('jtext')
 
-    # Perform the CPU-intensive processing
+    # Hand the CPU-intensive processing to the job pool and let the user watch its progress
+    job_id = submit_job('edit', _edit_job, zip_filename, session.get('uid'), fname, edited,
+                        member_digests(session.get('uid'), [fname]))
+    return redirect(url_for('job_status', job_id=job_id))
+
+def _edit_job(progress, zip_filename, uid, fname, edited, base):
+    progress('parse')
     try:
         editable_data = json.loads(edited)
-        with open(template_path, "r", encoding="utf-8") as f:
-            raw_template = f.read()
-        json_template = json.loads(raw_template)
-        final_data = deep_restringify(editable_data, json_template)
+    except ValueError as e:
+        raise ValueError(f"Invalid JSON: {e}")
+    return _write_edited_member(progress, zip_filename, uid, fname, editable_data, base)
+
+def _edit_patches_job(progress, zip_filename, uid, fname, patches, edit_session_id, base):
+    progress('parse')
+    editable_data = edited_tree(zip_filename, fname, uid, patches)
+    result = _write_edited_member(progress, zip_filename, uid, fname, editable_data, base)
+    # The committed patches are part of the working copy now; keep any made since
+    save_edit_patches(edit_session_id, load_edit_patches(edit_session_id)[len(patches):])
+    return result
+
+def _write_edited_member(progress, zip_filename, uid, fname, editable_data, base):
+    plan = load_stringify_plan(zip_filename, fname, uid=uid)
+
+    progress('serialize')
+    with timed('restringify'):
+        final_data = apply_stringify_plan(editable_data, plan)
+    with timed('json_dumps'):
         final_json_str = json.dumps(final_data, separators=(',', ':'))
-    except Exception as e:
-        return f"<b>Invalid JSON:</b> {e}", 500
 
-    # --- THE NEW WORKFLOW: SAVE TO DISK, THEN REDIRECT ---
-    
-    # 1. Get the original zip path from the session.
-    original_zip_path = session.get('zip_filename')
-    
-    # 2. Create a unique filename for the new downloadable zip.
-    download_id = str(uuid.uuid4())
-    new_zip_path = os.path.join(UPLOAD_DIR, f"download_{download_id}.zip")
+    progress('save')
+    commit_version(uid, f"Edited {os.path.basename(fname)}", {fname: final_json_str}, base=base)
+    return {'messages': []}
 
-    # 3. Create the new zip file on the server's disk.
-    with zipfile.ZipFile(original_zip_path, 'r') as old_zip, \
-         zipfile.ZipFile(new_zip_path, 'w') as new_zip:
-        for item in old_zip.infolist():
-            if item.filename == fname:
-                new_zip.writestr(fname, final_json_str)
-            else:
-                new_zip.writestr(item, old_zip.read(item.filename))
-    
-    # 4. Save the path to this new file in the session so the next route can find it.
-    session['downloadable_zip_path'] = new_zip_path
-    
-    # 5. Immediately redirect the user. This ends the POST request instantly and frees the worker.
-    return redirect(url_for('download_zip'))
+@app.route('/api/edit/<path:fname>', methods=['GET', 'PATCH'])
+def edit_api(fname):
+    """JSON Pointer reads (GET) and RFC 6902 JSON Patch edits (PATCH) of the file being edited."""
+    zip_filename = session.get('zip_filename')
+    edit_session_id = session.get('edit_session_id')
+    if not zip_filename or not os.path.isfile(zip_filename) or not edit_session_id \
+            or session.get('edit_fname') != fname:
+        return jsonify({'error': "Edit session expired. Please start over."}), 404
+    uid = session.get('uid')
+    patches = load_edit_patches(edit_session_id)
+
+    if request.method == 'PATCH':
+        patch = request.get_json(force=True, silent=True)
+        if not isinstance(patch, list):
+            return jsonify({'error': "Expected a JSON Patch array."}), 400
+        expected = request.headers.get('If-Match', '').strip('"')
+        if not expected:
+            return jsonify({'error': "Missing If-Match revision.", 'revision': len(patches)}), 428
+        with edit_patches_lock(edit_session_id):
+            patches = load_edit_patches(edit_session_id)
+            if expected != str(len(patches)):
+                return jsonify({'error': "The document changed in another tab. Reload the editor.",
+                                'revision': len(patches)}), 412
+            try:
+                # Replay on a throwaway tree first, so a failing patch is never recorded
+                edited_tree(zip_filename, fname, uid, patches + [patch])
+            except JsonPatchError as e:
+                return jsonify({'error': str(e), 'revision': len(patches)}), 409
+            patches.append(patch)
+            save_edit_patches(edit_session_id, patches)
+        return jsonify({'revision': len(patches)})
+
+    pointer = request.args.get('pointer', '')
+    try:
+        tokens = pointer_tokens(pointer)
+        node = resolve_pointer(edited_tree(zip_filename, fname, uid, patches), pointer)
+    except JsonPatchError as e:
+        return jsonify({'error': str(e)}), 404
+    was_string, plan = plan_at_pointer(load_stringify_plan(zip_filename, fname, uid=uid), tokens)
+
+    if request.args.get('full'):
+        # The whole subtree as text, so member order survives (jsonify sorts keys)
+        with timed('json_dumps'):
+            text = json.dumps(node, indent=2)
+        if len(text) > EDITOR_NODE_MAX_BYTES:
+            return jsonify({'error': "This node is too large to edit in the browser. Expand it and edit its children instead."}), 413
+        result = {'type': json_type_name(node), 'text': text}
+    else:
+        offset = max(request.args.get('offset', 0, type=int), 0)
+        limit = min(max(request.args.get('limit', EDITOR_PAGE_SIZE, type=int), 1), 1000)
+        result = describe_json_node(node, plan, offset, limit)
+    result.update(pointer=pointer, stringified=was_string and isinstance(node, (dict, list)),
+                  revision=len(patches))
+    return jsonify(result)
 
-@app.route('/download-zip')
-def download_zip():
-    downloadable_zip_path = session.get('downloadable_zip_path')
+@app.route('/metrics')
+def prometheus_metrics():
+    """Request, job and stage metrics of every worker in Prometheus text format."""
+    if not METRICS_ENABLED:
+        return "Metrics are disabled.", 404
+    metrics.flush()
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
-    if not downloadable_zip_path or not os.path.exists(downloadable_zip_path):
-        flash("No download file found or it has expired. Please try again.")
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = owned_job(job_id)
+    if job is None:
+        flash("This job could not be found or it has expired.")
         return redirect(url_for('options'))
+    return render_template('job_status.html', job=job, stages=JOB_STAGES)
 
-    # This decorator tells Flask to delete the file AFTER the user has
-    # received it, cleaning up our temp files.
-    @after_this_request
-    def remove_file(response):
-        try:
-            os.remove(downloadable_zip_path)
-            session.pop('downloadable_zip_path', None)
-        except Exception as error:
-            app.logger.error("Error removing or cleaning up file: %s", error)
-        return response
+@app.route('/jobs/<job_id>/progress')
+def job_progress(job_id):
+    job = owned_job(job_id)
+    if job is None:
+        return jsonify({'state': 'missing'}), 404
+    return jsonify({
+        'state': job['state'],
+        'stage': job['stage'],
+        'stage_index': JOB_STAGES.index(job['stage']) if job['stage'] in JOB_STAGES else None,
+        'messages': job.get('messages', []),
+        'error': job.get('error'),
+    })
 
-    # Use send_file to send the file that's already on disk.
-    # This is extremely efficient.
-    return send_file(
-        downloadable_zip_path,
-        as_attachment=True,
-        download_name="SaveData.zip"
-    )
+@app.route('/download_save')
+def download_save():
+    """Build the session's working copy into a SaveData.zip; the only time a ZIP gets written."""
+    zip_filename = session.get('zip_filename')
+    if not zip_filename or not os.path.isfile(zip_filename):
+        flash("Could not find uploaded ZIP—please start again!")
+        return redirect(url_for('index'))
+
+    new_zip_path = new_download_path()
+    with export_rss_logging('download'):
+        build_working_zip(zip_filename, session.get('uid'), new_zip_path)
+    return send_and_remove(new_zip_path, "SaveData.zip")
+
+@app.route('/workspace/<action>', methods=['POST'])
+def workspace_history(action):
+    if action not in ('undo', 'redo') or not session.get('uid'):
+        return redirect(url_for('options'))
+    version = move_head(session['uid'], -1 if action == 'undo' else 1)
+    if version is None:
+        flash(f"Nothing to {action}.", "warning")
+    elif action == 'undo':
+        flash(f"Undone. Your working copy is back at: {version['label']}.", "info")
+    else:
+        flash(f"Redone: {version['label']}.", "info")
+    return redirect(url_for('options'))
 
 # Add this new route for downloading JSON files
 @app.route('/download_json/<path:fname>')
@@ -448,19 +3525,18 @@ def download_json(fname):
         flash("Could not find uploaded ZIP!")
         return redirect(url_for('index'))
     
-    with zipfile.ZipFile(zip_filename) as zf:
-        raw_json = zf.read(fname).decode('utf-8')
-    
-    json_data = json.loads(raw_json)
-    editable_data = deep_unstringify(json_data)
-    editable_data = strip_is_duplicate(editable_data)
-    formatted_json = json.dumps(editable_data, indent=2)
-    
-    return send_file(
-        io.BytesIO(formatted_json.encode('utf-8')),
-        mimetype='application/json',
-        as_attachment=True,
-        download_name=f"edited_{fname}"
+    uid = session.get('uid')
+    ref = member_ref(zip_filename, fname, uid)
+
+    def build():
+        editable_data = load_save_member(zip_filename, fname, uid=uid, mutable=True, ref=ref)
+        editable_data = strip_is_duplicate(editable_data)
+        with timed('json_dumps'):
+            return json.dumps(editable_data, indent=2).encode('utf-8')
+
+    return cached_response(
+        ('download_json', session.get('save_digest') or zip_filename, fname, ref[0], 'indent2'),
+        build, 'application/json', download_name=f"edited_{os.path.basename(fname)}"
     )
 
 @app.route('/filelist', methods=['GET'])
@@ -478,7 +3554,8 @@ def options():
     if not zip_filename or not os.path.isfile(zip_filename):
         flash("No uploaded save file found.")
         return redirect(url_for('index'))
-    return render_template('options.html')
+    return render_template('options.html', history=read_history(session.get('uid')),
+                           index=read_save_index(zip_filename))
 
 @app.route('/import_base_choose', methods=['GET', 'POST'])
 def import_base_choose():
@@ -490,19 +3567,35 @@ def import_base_choose():
         flash("No base file was selected. Please choose a file.", "warning")
         return redirect(url_for('import_base_choose'))
 
+    base_temp_id = str(uuid.uuid4())
+    base_digest = None
     try:
-        # Read the file content into a string to be safe
-        basefile_content = basefile.read().decode('utf-8')
-        if not basefile_content:
-            flash("The uploaded file is empty.", "error")
-            return redirect(url_for('import_base_choose'))
-        
-        base_json = json.loads(basefile_content)
-        
-        # Use helper to extract structures list and meta
-        structure_candidates, base_meta = extract_structures_from_any(base_json)
+        # Identical base files are stored once and only parsed and extracted the first time
+        base_digest, base_path = content_store.ingest(basefile.stream, 'base.json', base_temp_id)
+        structs_path = base_structs_path(base_digest)
+        meta_path = base_meta_path(base_digest)
+        if not (os.path.exists(structs_path) and os.path.exists(meta_path)):
+            with open(base_path, 'r', encoding='utf-8') as f:
+                basefile_content = f.read()
+            if not basefile_content:
+                content_store.release(base_digest, base_temp_id)
+                flash("The uploaded file is empty.", "error")
+                return redirect(url_for('import_base_choose'))
+
+            with timed('json_loads'):
+                base_json = json.loads(basefile_content)
 
-        # Check for duplicates: build set of existing structure positions/typeIDs in user save
+            # Use helper to extract structures list and meta
+            with timed('unstringify'):
+                structure_candidates, base_meta = extract_structures_from_any(base_json)
+            with timed('store_write'):
+                StructureStore.write(structs_path, [strip_is_duplicate(s) for s in structure_candidates])
+            tmp_path = f"{meta_path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(base_meta, f)
+            os.replace(tmp_path, meta_path)
+
+        # Check for duplicates against the structures already in the user save
         zip_filename = session.get('zip_filename')
         constructions_fname = None
         for f in session.get('json_files', []):
@@ -510,51 +3603,36 @@ def import_base_choose():
                 constructions_fname = f
                 break
         
-        existing_struct_positions = set()
+        existing_structures = []
         if constructions_fname and os.path.exists(zip_filename):
-            with zipfile.ZipFile(zip_filename) as zf:
-                try:
-                    data = json.loads(zf.read(constructions_fname).decode('utf-8'))
-                    data = deep_unstringify(data)
+            try:
+                uid = session.get('uid')
+                ref = member_ref(zip_filename, constructions_fname, uid)
+                # The upload index has the TypeIDs and positions unless the structures were edited since
+                columns = indexed_structure_columns(zip_filename, constructions_fname, ref)
+                if columns is not None:
+                    existing_structures = (columns['type_id'], columns['position'])
+                else:
+                    data = load_save_member(zip_filename, constructions_fname, uid=uid, ref=ref)
                     structs = data['Data']['Constructions']['Structures']
-                    for tid, bucket in enumerate(structs):
-                        if not isinstance(bucket, list):
-                            continue
-                        for s in bucket:
-                            if not isinstance(s, dict):
-                                continue
-                            pos = s.get('Position')
-                            struct_key = (
-                                s.get('TypeID'),
-                                round(float(pos.get('x', 0)), 2) if pos else None,
-                                round(float(pos.get('y', 0)), 2) if pos else None,
-                                round(float(pos.get('z', 0)), 2) if pos else None
-                            )
-                            existing_struct_positions.add(struct_key)
-                except Exception as e:
-                    print(f"[DEBUG] Could not read user save structures for dupe check: {e}")
-
-        # Tag imported structures as duplicates or not
-        for s in structure_candidates:
-            pos = s.get('Position')
-            struct_key = (
-                s.get('TypeID'),
-                round(float(pos.get('x', 0)), 2) if pos else None,
-                round(float(pos.get('y', 0)), 2) if pos else None,
-                round(float(pos.get('z', 0)), 2) if pos else None
-            )
-            s['is_duplicate'] = (struct_key in existing_struct_positions)
-
-        # Store to temp and session
-        base_temp_id = str(uuid.uuid4())
-        structs_path = os.path.join(UPLOAD_DIR, f"{base_temp_id}_structs.json")
-        meta_path = os.path.join(UPLOAD_DIR, f"{base_temp_id}_meta.json")
-        with open(structs_path, "w", encoding="utf-8") as f:
-            json.dump(structure_candidates, f)
-        with open(meta_path, "w", encoding="utf-8") as f:
-            json.dump(base_meta, f)
-        
+                    for bucket in structs:
+                        if isinstance(bucket, list):
+                            existing_structures.extend(bucket)
+            except Exception as e:
+                app.logger.warning("Could not read user save structures for the duplicate check: %s", e)
+
+        # Flag imported structures that duplicate the save's; the flags belong to this import only
+        with StructureStore(structs_path) as store:
+            structure_candidates = store.summaries()
+        with timed('duplicates'):
+            duplicate_flags = find_duplicate_structures(existing_structures, structure_candidates)
+        np.save(base_duplicates_path(base_temp_id), np.array(duplicate_flags, dtype=bool), allow_pickle=False)
+
+        # A new base replaces the session's previous one
+        if session.get('base_temp_id') and session.get('base_digest'):
+            content_store.release(session['base_digest'], session['base_temp_id'])
         session['base_temp_id'] = base_temp_id
+        session['base_digest'] = base_digest
         
         # Redirect to the correct page based on the button clicked
         if 'edit_and_import' in request.form:
@@ -563,9 +3641,12 @@ def import_base_choose():
             return redirect(url_for('import_base_select'))
             
     except json.JSONDecodeError as e:
+        content_store.release(base_digest, base_temp_id)
         flash(f"Invalid JSON format. The file could not be parsed. Error: {e}", "error")
         return redirect(url_for('import_base_choose'))
     except Exception as e:
+        if base_digest:
+            content_store.release(base_digest, base_temp_id)
         flash(f"An unexpected error occurred: {e}", "error")
         return redirect(url_for('import_base_choose'))
 
@@ -573,64 +3654,80 @@ def import_base_choose():
 @app.route('/import_base_select', methods=['GET', 'POST'])
 def import_base_select():
     base_temp_id = session.get('base_temp_id')
-    if not base_temp_id:
+    base_digest = session.get('base_digest')
+    if not base_temp_id or not base_digest:
         return redirect(url_for('options'))
-    structs_path = os.path.join(UPLOAD_DIR, f"{base_temp_id}_structs.json")
-    meta_path = os.path.join(UPLOAD_DIR, f"{base_temp_id}_meta.json")
+    structs_path = base_structs_path(base_digest)
+    meta_path = base_meta_path(base_digest)
     # Check if files exist
     if not os.path.exists(structs_path) or not os.path.exists(meta_path):
         flash("Structure data files not found. Please upload your base file again.")
         return redirect(url_for('import_base_choose'))
 
-    with open(meta_path, "r", encoding="utf-8") as f:
-        base_meta = json.load(f)
+    # Group once per base file; members are paged in from the listing by structure_members
+    listing = load_listing('import')
+    if listing is None:
+        # Grouping only needs TypeIDs and positions, which come straight from the store's columns
+        with StructureStore(structs_path) as store:
+            structure_candidates = store.summaries(load_base_duplicates(base_temp_id, len(store)))
 
-    with open(structs_path, "r", encoding="utf-8") as f:
-        structure_candidates = json.load(f)
+        #structure_candidates = annotate_nearby(structure_candidates, threshold=0.28)  # tweak threshold here!
+        with timed('group'):
+            structure_candidates = structure_groups(structure_candidates, nearby_threshold=5.00)
+        count_structures('listed', len(structure_candidates))
+        write_listing(listing_path('import'), build_structure_listing(structure_candidates))
+        listing = load_listing('import')
 
-    #structure_candidates = annotate_nearby(structure_candidates, threshold=0.28)  # tweak threshold here!
-    structure_candidates = structure_groups(structure_candidates, nearby_threshold=5.00)
+    def build():
+        with open(meta_path, "r", encoding="utf-8") as f:
+            base_meta = json.load(f)
+        groups = listing_summaries(listing)
+        # Where the base sits, as a starting point for the placement fields
+        with StructureStore(structs_path) as store:
+            positions = store.rows['position']
+            positions = positions[~np.isnan(positions).any(axis=1)]
+            base_extent = None
+            if len(positions):
+                lo, hi = positions.min(axis=0), positions.max(axis=0)
+                base_extent = {'center_x': (lo[0] + hi[0]) / 2, 'center_z': (lo[2] + hi[2]) / 2, 'floor_y': lo[1]}
+        return render_template(
+            "import_base_select.html",
+            base_extent=base_extent,
+            groups=groups,
+            structure_count=listing['count'],
+            available_count=listing['count'] - sum(g['duplicates'] for g in groups),
+            base_meta=base_meta,
+            group_count=len(groups),
+        ).encode('utf-8')
 
-    # Group structures by their group_id:
-    grouped_structures = defaultdict(list)
-    for idx, s in enumerate(structure_candidates):
-        group_label = s.get('group_label', f"Group {s.get('group_id', '?')}")
-        grouped_structures[group_label].append((idx, s))
-    
-    return render_template(
-        "import_base_select.html",
-        grouped_structures=grouped_structures,
-        structures=structure_candidates,  # in case your template needs it elsewhere
-        base_meta=base_meta,
-        group_count=len(grouped_structures),
-    )
+    return cached_response(('import_base_select', base_digest, base_temp_id, listing['count']), build, 'text/html')
 
 @app.route('/import_base_finish', methods=['POST'])
 def import_base_finish():
     base_temp_id = session.get('base_temp_id')
-    if not base_temp_id:
+    base_digest = session.get('base_digest')
+    if not base_temp_id or not base_digest:
         return redirect(url_for('options'))
     
-    structs_path = os.path.join(UPLOAD_DIR, f"{base_temp_id}_structs.json")
+    structs_path = base_structs_path(base_digest)
     if not os.path.exists(structs_path):
         flash("Structure data not found. Please start over.")
         return redirect(url_for('import_base_choose'))
-    with open(structs_path, "r", encoding="utf-8") as f:
-        structure_candidates = json.load(f)
     
-    to_import_indices = request.form.getlist('import_ids')
+    listing = load_listing('import')
+    if listing is None:
+        flash("Structure data not found. Please start over.")
+        return redirect(url_for('import_base_choose'))
+    try:
+        relocation = parse_relocation(request.form)
+    except ValueError:
+        flash("Placement values must be numbers.", "error")
+        return redirect(url_for('import_base_select'))
+    # The duplicate flags are about where the base was built; a placed import may take them all
+    to_import_indices = select_listing_indices(request.form, listing, 'import_ids',
+                                               skip_duplicates=relocation is None)
     if not to_import_indices:
         return "No structures selected.", 400
-    
-    selected_structures = [structure_candidates[int(i)] for i in to_import_indices]
-
-    # Handle duplicates
-    count_dupe = sum(1 for s in selected_structures if s.get("is_duplicate"))
-    if count_dupe:
-        flash(f"{count_dupe} selected structure(s) look like duplicates. Test in-game for stability!", "warning")
-
-    # Strip 'is_duplicate'
-    selected_structures = [strip_is_duplicate(s) for s in selected_structures]
 
     # Find constructions file in save ZIP
     zip_filename = session.get('zip_filename')
@@ -641,91 +3738,62 @@ def import_base_finish():
             break
     if not constructions_fname:
         return "No constructions file found in save!", 500
-    diag_dir = os.path.join(UPLOAD_DIR, f"diag_{base_temp_id}")
-    os.makedirs(diag_dir, exist_ok=True)
-    # Read and parse the constructions file from ZIP
-    with zipfile.ZipFile(zip_filename) as zf:
-        raw_constructions = zf.read(constructions_fname).decode('utf-8')
-        constructions_data = json.loads(raw_constructions)
-        constructions_template = constructions_data.copy()
-    # Fully unstringify for manipulation
-    editable_cdata = deep_unstringify(constructions_data)
-    cstructs = editable_cdata['Data']['Constructions']['Structures']
 
-    # --- Group selected imported structures by TypeID ---
-    import_groups = {}
-    for s in selected_structures:
-        tid = s.get("TypeID")
-        if tid is not None:
-            import_groups.setdefault(tid, []).append(s)
+    job_id = submit_job('import', _import_job, zip_filename, session.get('uid'),
+                        constructions_fname, base_temp_id, base_digest, to_import_indices, relocation,
+                        member_digests(session.get('uid'), [constructions_fname]))
+    return redirect(url_for('job_status', job_id=job_id))
 
-    # --- For each TypeID bucket, append batch and remap LinkedStructures ---
-    for tid, structures in import_groups.items():
-        # Ensure bucket exists in save
-        while len(cstructs) <= tid:
-            cstructs.append(None)
-        if cstructs[tid] is None:
-            cstructs[tid] = []
-        elif not isinstance(cstructs[tid], list):
-            cstructs[tid] = []    
-        
-        existing_len = len(cstructs[tid])
-        import_count = len(structures)
+def _import_job(progress, zip_filename, uid, constructions_fname, base_temp_id, base_digest, to_import_indices,
+                relocation=None, base=None):
+    progress('parse')
+    # Only the selected rows are read back from the store
+    with StructureStore(base_structs_path(base_digest)) as store:
+        selected_structures = store.get_many(to_import_indices)
+        count_dupe = int(load_base_duplicates(base_temp_id, len(store))[to_import_indices].sum())
 
-        # Map original import indices to their new location in the save's structures array
-        import_to_final_index = {i: existing_len + i for i in range(import_count)}
-        
-        remapped_structures = []
-        for i, s in enumerate(structures):
-            new_struct = normalize_imported_structure(s, keep_linked=True)
-            # Remap links within imported batch. Out-of-batch links = None
-            if "LinkedStructures" in new_struct and isinstance(new_struct["LinkedStructures"], list):
-                new_links = []
-                for link in new_struct["LinkedStructures"]:
-                    if link is None:
-                        new_links.append(None)
-                    elif isinstance(link, int) and 0 <= link < import_count:
-                        new_links.append(import_to_final_index[link])
-                    elif isinstance(link, dict):
-                        new_links.append(link)
-                    else:
-                        new_links.append(None)
-                new_struct["LinkedStructures"] = new_links
-            remapped_structures.append(new_struct)
-        
-        # Now add all newly-linked structures in batch
-        cstructs[tid].extend(remapped_structures)
+    messages = []
+
+    # Strip 'is_duplicate'
+    selected_structures = [strip_is_duplicate(s) for s in selected_structures]
+
+    diag_dir = os.path.join(UPLOAD_DIR, f"diag_{base_temp_id}")
+    os.makedirs(diag_dir, exist_ok=True)
+    # The merge only appends to the buckets, so the shared tree is copied just down to them
+    cdata = load_save_member(zip_filename, constructions_fname, uid=uid)
+    cstructs = [list(b) if isinstance(b, list) else b for b in cdata['Data']['Constructions']['Structures']]
+
+    progress('merge')
+    if relocation:
+        with timed('relocate'):
+            relocate_structures(selected_structures, **relocation)
+        # The upload-time flags describe the original spot; check the new one instead
+        existing, _ = flatten_structure_buckets(cstructs)
+        with timed('duplicates'):
+            count_dupe = sum(find_duplicate_structures(existing, selected_structures))
+    with timed('merge'):
+        merge_imported_structures(cstructs, selected_structures)
+    count_structures('imported', len(selected_structures))
 
     # --- Write debug diagnostics ---
     with open(os.path.join(diag_dir, "original_structures.json"), "w", encoding="utf-8") as f:
-        json.dump(editable_cdata['Data']['Constructions']['Structures'], f, indent=2)
+        json.dump(cstructs, f, indent=2)
     with open(os.path.join(diag_dir, "imported_structures.json"), "w", encoding="utf-8") as f:
         json.dump(selected_structures, f, indent=2)
 
-    # --- Stringify, format numbers and output ---
-    editable_cdata['Data']['Constructions']['Structures'] = cstructs
-    new_cdata = deep_restringify(editable_cdata, constructions_template)
-    new_cdata_str = json.dumps(new_cdata, separators=(',', ':'))
-    
-    new_cdata_str = re.sub(r'(\d+\.\d+)e(-?\d+)', r'\1E\2', new_cdata_str)
+    # --- Splice the merged structures into the original text, format numbers and output ---
+    progress('serialize')
+    new_cdata_str = serialize_member_with(zip_filename, constructions_fname, STRUCTURES_PATH,
+                                          cstructs, uid=uid, postprocess=uppercase_exponents)
     with open(os.path.join(diag_dir, "final_constructions_raw.json"), "w", encoding="utf-8") as f:
         f.write(new_cdata_str)
-    # --- Output new zip
-    tmp_zip_io = io.BytesIO()
-    with zipfile.ZipFile(zip_filename, 'r') as orig_zip, \
-         zipfile.ZipFile(tmp_zip_io, 'w') as new_zip:
-        for item in orig_zip.infolist():
-            if item.filename == constructions_fname:
-                new_zip.writestr(constructions_fname, new_cdata_str)
-            else:
-                new_zip.writestr(item, orig_zip.read(item.filename))
-    tmp_zip_io.seek(0)
-    return send_file(
-        tmp_zip_io,
-        mimetype='application/zip',
-        as_attachment=True,
-        download_name="SaveData.zip"
-    )
+    if count_dupe:
+        messages.append(["warning", f"{count_dupe} selected structure(s) look like duplicates. Test in-game for stability!"])
+    # --- Output new zip to disk
+    progress('save')
+    commit_version(uid, f"Imported {len(selected_structures)} structures", {constructions_fname: new_cdata_str},
+                   base=base)
+    return {'messages': messages}
 
 @app.route('/debug_files')
 def debug_files():
@@ -754,13 +3822,13 @@ def debug_files():
     # Look for base import files
     base_temp_id = session.get('base_temp_id')
     if base_temp_id:
-        # Structure files
-        structs_path = os.path.join(UPLOAD_DIR, f"{base_temp_id}_structs.json")
-        if os.path.exists(structs_path):
+        # Structure listing (the structure store itself is binary)
+        listing_file = listing_path('import')
+        if listing_file and os.path.exists(listing_file):
             debug_files.append({
-                'name': f"{base_temp_id}_structs.json",
-                'path': structs_path,
-                'size': os.path.getsize(structs_path),
+                'name': os.path.relpath(listing_file, UPLOAD_DIR),
+                'path': listing_file,
+                'size': os.path.getsize(listing_file),
                 'type': 'Import Structures'
             })
         
@@ -775,37 +3843,149 @@ def debug_files():
                         'size': os.path.getsize(os.path.join(diag_dir, file)),
                         'type': 'Diagnostics'
                     })
+
+    # Request profiles (?profile=1)
+    profile_dir = session_diag_dir(uid)
+    if os.path.exists(profile_dir):
+        for file in sorted(os.listdir(profile_dir)):
+            if file.startswith('profile_') and (file.endswith('.txt') or file.endswith('.prof')):
+                debug_files.append({
+                    'name': f"diag_{uid}/{file}",
+                    'path': os.path.join(profile_dir, file),
+                    'size': os.path.getsize(os.path.join(profile_dir, file)),
+                    'type': 'Profile'
+                })
     
     return render_template('debug_files.html', debug_files=debug_files)
 
+def debug_file_path(filename):
+    """filename resolved inside the uploads directory, or None if it is missing or points outside it."""
+    root = os.path.realpath(UPLOAD_DIR)
+    path = os.path.realpath(os.path.join(root, filename))
+    if os.path.commonpath([root, path]) != root or not os.path.isfile(path):
+        return None
+    return path
+
 @app.route('/view_debug_file/<path:filename>')
 def view_debug_file(filename):
-    """View a debug file"""
-    # Security: only allow files in our upload directory
-    file_path = os.path.join(UPLOAD_DIR, filename)
-    if not os.path.exists(file_path) or not file_path.startswith(UPLOAD_DIR):
+    """View a debug file; its pages are loaded by debug_file_page as the viewer scrolls"""
+    file_path = debug_file_path(filename)
+    if file_path is None:
         flash("File not found or access denied.")
         return redirect(url_for('debug_files'))
-    
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        # Try to pretty-print JSON
-        try:
-            json_data = json.loads(content)
-            content = json.dumps(json_data, indent=2)
-            file_type = "JSON"
-        except:
-            file_type = "Text"
-        
-        return render_template('view_debug_file.html', 
-                               filename=filename, 
-                               content=content, 
-                               file_type=file_type)
-    except Exception as e:
-        flash(f"Error reading file: {e}")
-        return redirect(url_for('debug_files'))
+    if filename.endswith('.prof'):
+        # Binary cProfile output; open it with pstats or snakeviz
+        return send_file(file_path, mimetype='application/octet-stream', as_attachment=True,
+                         download_name=os.path.basename(file_path))
+
+    st = os.stat(file_path)
+
+    def build():
+        return render_template('view_debug_file.html',
+                               filename=filename,
+                               size=st.st_size,
+                               file_type="JSON" if filename.endswith('.json') else "Text").encode('utf-8')
+
+    return cached_response(('view_debug_file', file_path, st.st_mtime_ns, st.st_size), build, 'text/html')
+
+@app.route('/debug_file_page/<path:filename>')
+def debug_file_page(filename):
+    """One page of a debug file: forward from offset, back from before, or around a search hit.
+
+    With mode=pretty the page is re-indented on its own, starting from the JSON nesting
+    state at its first byte, so the file is never parsed as a whole.
+    """
+    file_path = debug_file_path(filename)
+    if file_path is None:
+        return jsonify({'error': "File not found or access denied."}), 404
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    before = request.args.get('before', type=int)
+    around = request.args.get('around', type=int)
+    pretty = request.args.get('mode') == 'pretty'
+    st = os.stat(file_path)
+
+    def build():
+        start, end, size, data = read_file_page(file_path, offset, before, around)
+        text = data.decode('utf-8', errors='replace')
+        join = ''
+        if pretty:
+            key = ('json_checkpoints', file_path, st.st_size, st.st_mtime_ns)
+            checkpoints = list(save_cache.get(key) or [(0, 0, False)])
+            known = len(checkpoints)
+            with timed('debug_scan'), open(file_path, 'rb') as f:
+                depth, in_string = json_state_at(f, start, checkpoints)
+                fresh_line = not in_string and json_cut_is_clean(f, start)
+            if len(checkpoints) > known:
+                save_cache.put(key, checkpoints, 64 * len(checkpoints))
+            with timed('debug_pretty'):
+                text = pretty_json_page(text, depth, in_string, fresh_line=fresh_line)
+            # Pages cut after a comma or bracket continue on a new line of the pretty output;
+            # ones cut inside a string or a token carry on where the previous page stopped
+            join = '\n' if fresh_line else ''
+        return json.dumps({'start': start, 'end': end, 'size': size, 'text': text, 'join': join},
+                          separators=(',', ':')).encode('utf-8')
+
+    return cached_response(('debug_file_page', file_path, st.st_mtime_ns, st.st_size,
+                            offset, before, around, pretty), build, 'application/json')
+
+@app.route('/debug_file_search/<path:filename>')
+def debug_file_search(filename):
+    """Byte offsets and excerpts of a search term in a debug file, scanning from offset."""
+    file_path = debug_file_path(filename)
+    if file_path is None:
+        return jsonify({'error': "File not found or access denied."}), 404
+    query = request.args.get('q', '')
+    if not query:
+        return jsonify({'error': "Enter something to search for."}), 400
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    with timed('debug_search'):
+        hits, resume = search_file(file_path, query.encode('utf-8'), offset)
+    results = []
+    with open(file_path, 'rb') as f:
+        for hit in hits:
+            start = max(hit - 60, 0)
+            f.seek(start)
+            excerpt = f.read(hit - start + len(query.encode('utf-8')) + 60)
+            results.append({'offset': hit, 'excerpt': excerpt.decode('utf-8', errors='replace')})
+    return jsonify({'hits': results, 'next_offset': resume, 'size': os.path.getsize(file_path)})
+
+def manage_store_current(manage_id, fname, ref):
+    """Whether the session's manage store and listing were built from the member's current content."""
+    if not manage_id or session.get('manage_fname') != fname:
+        return False
+    structs_path = os.path.join(UPLOAD_DIR, f"manage_{manage_id}_structs.bin")
+    if not os.path.exists(structs_path) or not os.path.exists(listing_path('manage')):
+        return False
+    with StructureStore(structs_path) as store:
+        # The meta went through JSON, so a ('blob', digest) token reads back as a list
+        return store.meta.get('source') == json.loads(json.dumps(ref[0]))
+
+def build_manage_store(zip_filename, fname, uid, ref):
+    """Group the save's structures into a new manage store and listing; returns its manage_id."""
+    json_data = load_save_member(zip_filename, fname, uid=uid, ref=ref)
+
+    # Flatten the buckets, remembering where each structure came from. Grouping only
+    # adds top-level keys, so shallow copies keep the cached tree untouched.
+    structures, sources = flatten_structure_buckets(json_data['Data']['Constructions']['Structures'])
+    columns = indexed_structure_columns(zip_filename, fname, ref)
+    if columns is not None and len(columns) == len(structures):
+        # Grouped at upload and the structures haven't changed since
+        structures_grouped = [dict(s, group_id=g, group_label=f"Structure Group {g + 1}")
+                              for s, g in zip(structures, columns['group_id'].tolist())]
+    else:
+        with timed('group'):
+            structures_grouped = structure_groups([dict(s) for s in structures], nearby_threshold=5.00)
+    count_structures('listed', len(structures_grouped))
+
+    # Store the flattened, grouped list for the deletion step
+    manage_id = str(uuid.uuid4())
+    structs_path = os.path.join(UPLOAD_DIR, f"manage_{manage_id}_structs.bin")
+    with timed('store_write'):
+        StructureStore.write(structs_path, structures_grouped, sources=sources,
+                             meta={'source': ref[0]})
+    write_listing(os.path.join(UPLOAD_DIR, f"manage_{manage_id}_listing.json"),
+                  build_structure_listing(structures_grouped))
+    return manage_id
 
 @app.route('/manage_structures')
 def manage_structures():
@@ -826,40 +4006,102 @@ def manage_structures():
         return redirect(url_for('options'))
 
     try:
-        with zipfile.ZipFile(zip_filename) as zf:
-            raw_json = zf.read(constructions_fname).decode('utf-8')
-            json_data = json.loads(raw_json)
-
-        # Use the helper to get a flat list of structures and group them
-        structures, _ = extract_structures_from_any(json_data)
-        structures_grouped = structure_groups(structures, nearby_threshold=5.00)
-
-        # Store the flattened, grouped list for the deletion step
-        manage_id = str(uuid.uuid4())
-        structs_path = os.path.join(UPLOAD_DIR, f"manage_{manage_id}_structs.json")
-        with open(structs_path, "w", encoding="utf-8") as f:
-            json.dump(structures_grouped, f)
-            
-        session['manage_id'] = manage_id
-        session['manage_fname'] = constructions_fname
-        
-        # Further group for the template
-        grouped_for_template = defaultdict(list)
-        for idx, s in enumerate(structures_grouped):
-            group_label = s.get('group_label', f"Group {s.get('group_id', '?')}")
-            grouped_for_template[group_label].append((idx, s))
+        uid = session.get('uid')
+        ref = member_ref(zip_filename, constructions_fname, uid)
+        manage_id = session.get('manage_id')
+        if not manage_store_current(manage_id, constructions_fname, ref):
+            manage_id = build_manage_store(zip_filename, constructions_fname, uid, ref)
+            session['manage_id'] = manage_id
+            session['manage_fname'] = constructions_fname
 
-        return render_template(
-            'manage_structures.html', 
-            grouped_structures=grouped_for_template,
-            structure_count=len(structures_grouped)
-        )
+        # Only group summaries go into the page; members are paged in from the listing
+        def build():
+            listing = load_listing('manage')
+            return render_template(
+                'manage_structures.html',
+                groups=listing_summaries(listing),
+                structure_count=listing['count']
+            ).encode('utf-8')
+
+        return cached_response(('manage_structures', session.get('save_digest') or zip_filename,
+                                constructions_fname, ref[0], manage_id), build, 'text/html')
 
     except Exception as e:
         flash(f"Error reading your constructions file: {e}", "error")
         return redirect(url_for('options'))
 
 
+@app.route('/structure_members/<kind>/<int:group_id>')
+def structure_members(kind, group_id):
+    """One page of a group's members for the import/manage pickers."""
+    listing = load_listing(kind) if kind in ('import', 'manage') else None
+    if listing is None or group_id >= len(listing['groups']):
+        return jsonify({'error': "Structure data not found. Please start over."}), 404
+    members = listing['groups'][group_id]['members']
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', LISTING_PAGE_SIZE, type=int), 1), 1000)
+
+    def build():
+        return json.dumps({
+            'group_id': group_id,
+            'offset': offset,
+            'total': len(members),
+            'members': members[offset:offset + limit],
+        }, separators=(',', ':')).encode('utf-8')
+
+    return cached_response(('structure_members', listing_path(kind), group_id, offset, limit),
+                           build, 'application/json')
+
+@app.route('/structure_map/<kind>')
+def structure_map(kind):
+    """Map extent and tile addressing for the import/manage map preview."""
+    data = load_structure_map(kind)
+    if data is None:
+        return jsonify({'error': "Structure data not found. Please start over."}), 404
+    return jsonify({
+        'bounds': data['bounds'],
+        'tile_px': MAP_TILE_PX,
+        'max_zoom': MAP_MAX_ZOOM,
+        # Tile URLs don't name the save, so this busts browser caches once it changes
+        'version': hashlib.sha1(repr(data['key']).encode('utf-8')).hexdigest()[:12],
+    })
+
+@app.route('/structure_map/<kind>/<int:zoom>/<int:tx>/<int:ty>.<fmt>')
+def structure_map_tile(kind, zoom, tx, ty, fmt):
+    """One top-down tile of structure positions, coloured by group, as PNG or SVG."""
+    if fmt not in ('png', 'svg') or zoom > MAP_MAX_ZOOM or tx >= 1 << zoom or ty >= 1 << zoom:
+        return "Unknown map tile.", 404
+    data = load_structure_map(kind)
+    if data is None:
+        return "Structure data not found. Please start over.", 404
+    key = data['key'] + (zoom, tx, ty, fmt)
+    tile = save_cache.get(key)
+    if tile is None:
+        with timed('map_render'):
+            marks = map_tile_marks(data['positions'], data['group_ids'], data['duplicates'],
+                                   data['bounds'], zoom, tx, ty)
+            tile = render_map_png(marks) if fmt == 'png' else render_map_svg(marks)
+        save_cache.put(key, tile, len(tile))
+    response = Response(tile, mimetype='image/png' if fmt == 'png' else 'image/svg+xml')
+    response.headers['Cache-Control'] = 'private, max-age=3600'
+    return response
+
+@app.route('/structure_map/<kind>/select')
+def structure_map_select(kind):
+    """Structures inside a box drawn on the map, for the pickers to tick or untick."""
+    data = load_structure_map(kind)
+    if data is None:
+        return jsonify({'error': "Structure data not found. Please start over."}), 404
+    try:
+        box = [float(request.args[name]) for name in ('x0', 'z0', 'x1', 'z1')]
+    except (KeyError, ValueError):
+        return jsonify({'error': "x0, z0, x1 and z1 must be numbers."}), 400
+    if kind == 'import' and request.args.get('duplicates'):
+        # A placed import may take the duplicates too
+        return jsonify(box_selection(data['positions'], data['group_ids'], data['group_ids'] >= 0, *box,
+                                     flagged=data['duplicates']))
+    return jsonify(box_selection(data['positions'], data['group_ids'], data['selectable'], *box))
+
 @app.route('/delete_structures', methods=['POST'])
 def delete_structures():
     zip_filename = session.get('zip_filename')
@@ -870,60 +4112,53 @@ def delete_structures():
         flash("Your session has expired or is invalid. Please start over.", "error")
         return redirect(url_for('index'))
 
-    structs_path = os.path.join(UPLOAD_DIR, f"manage_{manage_id}_structs.json")
+    structs_path = os.path.join(UPLOAD_DIR, f"manage_{manage_id}_structs.bin")
     if not os.path.exists(structs_path):
         flash("Could not find the original structure data. Please start over.", "error")
         return redirect(url_for('manage_structures'))
 
-    with open(structs_path, "r", encoding="utf-8") as f:
-        original_structures = json.load(f) # This is the flat list
+    listing = load_listing('manage')
+    if listing is None:
+        flash("Could not find the original structure data. Please start over.", "error")
+        return redirect(url_for('manage_structures'))
 
     # Get the indices to DELETE from the form
-    indices_to_delete = {int(i) for i in request.form.getlist('delete_ids')}
-    
-    # Create a new list containing only the structures we want to KEEP
-    structures_to_keep = [s for i, s in enumerate(original_structures) if i not in indices_to_delete]
-
-    # Re-bucket the KEPT structures by TypeID
-    buckets = defaultdict(list)
-    for s in structures_to_keep:
-        # We don't need the grouping keys anymore, remove them
-        s.pop('group_id', None)
-        s.pop('group_label', None)
-        buckets[s['TypeID']].append(s)
-    
-    max_tid = max(buckets.keys()) if buckets else -1
-    new_structure_list = [buckets.get(i) for i in range(max_tid + 1)]
-    
-    # Read the original constructions file to get the template
-    with zipfile.ZipFile(zip_filename) as zf:
-        raw_constructions = zf.read(constructions_fname).decode('utf-8')
-        constructions_template = json.loads(raw_constructions)
-    
-    # Deep unstringify, replace structures, and deep restringify
-    editable_cdata = deep_unstringify(constructions_template)
-    editable_cdata['Data']['Constructions']['Structures'] = new_structure_list
-    final_data = deep_restringify(editable_cdata, constructions_template)
-    final_json_str = json.dumps(final_data, separators=(',', ':'))
-
-    # --- Output new zip ---
-    tmp_zip_io = io.BytesIO()
-    with zipfile.ZipFile(zip_filename, 'r') as orig_zip, \
-         zipfile.ZipFile(tmp_zip_io, 'w') as new_zip:
-        for item in orig_zip.infolist():
-            if item.filename == constructions_fname:
-                new_zip.writestr(constructions_fname, final_json_str)
-            else:
-                new_zip.writestr(item, orig_zip.read(item.filename))
-    tmp_zip_io.seek(0)
+    indices_to_delete = set(select_listing_indices(request.form, listing, 'delete_ids'))
+
+    job_id = submit_job('delete', _delete_job, zip_filename, session.get('uid'),
+                        constructions_fname, manage_id, indices_to_delete,
+                        member_digests(session.get('uid'), [constructions_fname]))
+    return redirect(url_for('job_status', job_id=job_id))
+
+def _delete_job(progress, zip_filename, uid, constructions_fname, manage_id, indices_to_delete, base):
+    progress('parse')
+    ref = member_ref(zip_filename, constructions_fname, uid)
+    structs_path = os.path.join(UPLOAD_DIR, f"manage_{manage_id}_structs.bin")
+    # Only the source columns are needed; the structures themselves stay in the save
+    doomed = defaultdict(set)
+    with StructureStore(structs_path) as store:
+        if store.meta.get('source') != json.loads(json.dumps(ref[0])):
+            raise ValueError("Your save changed since this list was built. Open Manage Structures again.")
+        rows = store.rows[sorted(indices_to_delete)]
+        for bucket, index in zip(rows['source_bucket'].tolist(), rows['source_index'].tolist()):
+            doomed[bucket].add(index)
+    structures = load_save_member(zip_filename, constructions_fname, uid=uid, ref=ref)['Data']['Constructions']['Structures']
+
+    progress('merge')
+    new_structure_list = drop_structures(structures, doomed)
+    count_structures('deleted', len(indices_to_delete))
     
-    flash(f"{len(indices_to_delete)} structures have been successfully deleted!", "success")
-    return send_file(
-        tmp_zip_io,
-        mimetype='application/zip',
-        as_attachment=True,
-        download_name="SaveData_Modified.zip"
-    )
+    # Splice the new structures into the original text; nothing else gets re-serialized
+    progress('serialize')
+    final_json_str = serialize_member_with(zip_filename, constructions_fname, STRUCTURES_PATH,
+                                           new_structure_list, uid=uid)
+
+    # --- Output new zip to disk ---
+    progress('save')
+    commit_version(uid, f"Deleted {len(indices_to_delete)} structures", {constructions_fname: final_json_str},
+                   base=base)
+    messages = [["success", f"{len(indices_to_delete)} structures have been successfully deleted!"]]
+    return {'messages': messages}
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=False)
\ No newline at end of file
@@ -0,0 +1,71 @@
+"""Compare the rounded-key duplicate check against the bucketed NumPy finder.
+
+Usage: python benchmarks/bench_duplicates.py [--existing 30000] [--imported 10000]
+
+A synthetic save and community base are generated; a share of the base is copied from the
+save with sub-EPS jitter, so the rounded-key check misses some of them.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# app.py refuses to start without a secret key; the benchmark never serves requests
+os.environ.setdefault('SOTFSE_SECRET_KEY', 'benchmark')
+# No sweeper thread or metrics snapshots running alongside the timings
+os.environ.setdefault('SOTFSE_SWEEP_INTERVAL', '0')
+os.environ.setdefault('SOTFSE_METRICS', '0')
+from app import DUPLICATE_EPS, find_duplicate_structures
+
+
+def random_structure(rng):
+    return {
+        "TypeID": rng.randrange(300),
+        "Position": {"x": rng.uniform(-1500, 1500), "y": rng.uniform(0, 300), "z": rng.uniform(-1500, 1500)},
+    }
+
+
+def synthetic(existing_count, imported_count, overlap=0.3, seed=1):
+    rng = random.Random(seed)
+    existing = [random_structure(rng) for _ in range(existing_count)]
+    imported = []
+    for s in rng.sample(existing, int(imported_count * overlap)):
+        jitter = DUPLICATE_EPS * 0.9
+        pos = {k: v + rng.uniform(-jitter, jitter) for k, v in s["Position"].items()}
+        imported.append({"TypeID": s["TypeID"], "Position": pos})
+    while len(imported) < imported_count:
+        imported.append(random_structure(rng))
+    return existing, imported
+
+
+def rounded_keys(existing, imported):
+    def key(s):
+        pos = s.get('Position')
+        return (s.get('TypeID'),) + tuple(round(float(pos.get(a, 0)), 2) for a in 'xyz')
+    seen = {key(s) for s in existing}
+    return [key(s) in seen for s in imported]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--existing', type=int, default=30000)
+    parser.add_argument('--imported', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    existing, imported = synthetic(args.existing, args.imported)
+    print(f"{len(imported)} imported structures against {len(existing)} existing")
+    for label, fn in (("rounded keys (old)", rounded_keys),
+                      ("bucketed within EPS (find_duplicate_structures)", find_duplicate_structures)):
+        times = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            flags = fn(existing, imported)
+            times.append(time.perf_counter() - start)
+        print(f"{label:50s} {min(times):8.3f} s   {sum(flags):6d} duplicates")
+
+
+if __name__ == '__main__':
+    main()
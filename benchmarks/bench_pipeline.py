@@ -0,0 +1,159 @@
+"""Time each stage of the save pipeline on synthetic saves and check for regressions.
+
+Usage: python benchmarks/bench_pipeline.py [--sizes 1000,10000,100000] [--save-baseline | --check]
+
+Saves are built by synthetic_save.py. --save-baseline records the timings in
+benchmarks/baselines/pipeline.json; --check compares against it and exits non-zero when a
+stage got slower than --threshold (a fraction of the baseline).
+"""
+import argparse
+import gc
+import io
+import json
+import marshal
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# app.py refuses to start without a secret key; the benchmark never serves requests
+os.environ.setdefault('SOTFSE_SECRET_KEY', 'benchmark')
+# No sweeper thread or metrics snapshots running alongside the timings
+os.environ.setdefault('SOTFSE_SWEEP_INTERVAL', '0')
+os.environ.setdefault('SOTFSE_METRICS', '0')
+from app import (decode_unstringified, apply_stringify_plan, structure_groups, find_duplicate_structures,
+                 flatten_structure_buckets, merge_imported_structures, drop_structures, rebuild_save_zip,
+                 relocate_structures)
+from synthetic_save import write_save, base_document
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines', 'pipeline.json')
+CONSTRUCTIONS = 'ConstructionsSaveData.json'
+
+
+def prepare(count, workdir):
+    """Build a synthetic save of count structures and the inputs every stage needs."""
+    path = os.path.join(workdir, f'save_{count}.zip')
+    write_save(path, count)
+    with zipfile.ZipFile(path) as zf:
+        fname = next(n for n in zf.namelist() if n.endswith(CONSTRUCTIONS))
+        text = zf.read(fname).decode('utf-8')
+    tree, plan = decode_unstringified(text)
+    structures = tree['Data']['Constructions']['Structures']
+    flat, sources = flatten_structure_buckets(structures)
+
+    # A tenth of the save's size gets imported; a third of it overlaps the save
+    rng = random.Random(count)
+    imported = base_document(max(count // 10, 1), layout='list')
+    for i in range(len(imported) // 3):
+        imported[i] = dict(rng.choice(flat))
+    doomed = {}
+    for bucket, index in rng.sample(sources, len(sources) // 10):
+        doomed.setdefault(bucket, set()).add(index)
+    return {'path': path, 'fname': fname, 'text': text, 'tree': tree, 'plan': plan,
+            'structures': structures, 'flat': flat, 'imported': imported, 'doomed': doomed}
+
+
+# name -> (setup(inputs) -> arg, run(inputs, arg)); only run() is timed.
+# unstringify/restringify time what the routes call: parsing the member text, and the compiled plan.
+STAGES = {
+    'unstringify': (None, lambda d, _: decode_unstringified(d['text'])),
+    'restringify': (None, lambda d, _: apply_stringify_plan(d['tree'], d['plan'])),
+    'structure_groups': (lambda d: [dict(s) for s in d['flat']],
+                         lambda d, copies: structure_groups(copies, nearby_threshold=5.00)),
+    'duplicates': (None, lambda d, _: find_duplicate_structures(d['flat'], d['imported'])),
+    'import_merge': (lambda d: marshal.loads(marshal.dumps(d['structures'])),
+                     lambda d, cstructs: merge_imported_structures(cstructs, d['imported'])),
+    'relocate': (lambda d: marshal.loads(marshal.dumps(d['imported'])),
+                 lambda d, imported: relocate_structures(imported, offset=(250.0, 0.0, -120.0), yaw_degrees=35.0)),
+    'delete': (None, lambda d, _: drop_structures(d['structures'], d['doomed'])),
+    'zip_rebuild': (None, lambda d, _: rebuild_save_zip(d['path'], io.BytesIO(), {d['fname']: d['text']})),
+}
+
+
+def time_stage(inputs, setup, run, repeat):
+    times = []
+    for _ in range(repeat):
+        arg = setup(inputs) if setup else None
+        gc.collect()
+        start = time.perf_counter()
+        run(inputs, arg)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def run_suite(sizes, repeat, stages):
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for count in sizes:
+            inputs = prepare(count, workdir)
+            print(f"{count} structures ({len(inputs['text']) / 1024 / 1024:.1f} MB constructions)")
+            results[str(count)] = {}
+            for name in stages:
+                seconds = time_stage(inputs, *STAGES[name], repeat)
+                results[str(count)][name] = seconds
+                print(f"  {name:20s} {seconds:8.3f} s")
+    return results
+
+
+def find_regressions(baseline, results, threshold, min_delta):
+    """(size, stage, baseline, current) for every stage slower than allowed."""
+    slower = []
+    for size, stages in results.items():
+        for name, seconds in stages.items():
+            before = baseline.get(size, {}).get(name)
+            if before is None:
+                continue
+            if seconds > before * (1 + threshold) and seconds - before > min_delta:
+                slower.append((size, name, before, seconds))
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='1000,10000,100000')
+    parser.add_argument('--stages', default=','.join(STAGES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--check', action='store_true')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help="allowed slowdown as a fraction of the baseline (default 0.25)")
+    parser.add_argument('--min-delta', type=float, default=0.02,
+                        help="ignore slowdowns smaller than this many seconds (timer noise)")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(',') if s]
+    stages = [s for s in args.stages.split(',') if s]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+
+    results = run_suite(sizes, args.repeat, stages)
+    report = {'python': platform.python_version(), 'machine': platform.platform(), 'results': results}
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+            f.write('\n')
+        print(f"Baseline written to {args.baseline}")
+
+    if args.check:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('machine') != report['machine']:
+            print(f"Note: baseline was recorded on {baseline.get('machine')}")
+        slower = find_regressions(baseline['results'], results, args.threshold, args.min_delta)
+        for size, name, before, seconds in slower:
+            print(f"REGRESSION {name} at {size} structures: {before:.3f} s -> {seconds:.3f} s")
+        if slower:
+            sys.exit(1)
+        print("No regressions.")
+
+
+if __name__ == '__main__':
+    main()
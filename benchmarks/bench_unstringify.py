@@ -0,0 +1,96 @@
+"""Compare the two-pass unstringify against the single-pass decoder.
+
+Usage: python benchmarks/bench_unstringify.py [ConstructionsSaveData.json | SaveData.zip] [--size-mb 20]
+
+Without a file, a synthetic Constructions document of --size-mb is generated.
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# app.py refuses to start without a secret key; the benchmark never serves requests
+os.environ.setdefault('SOTFSE_SECRET_KEY', 'benchmark')
+# No sweeper thread or metrics snapshots running alongside the timings
+os.environ.setdefault('SOTFSE_SWEEP_INTERVAL', '0')
+os.environ.setdefault('SOTFSE_METRICS', '0')
+from app import deep_unstringify, compile_stringify_plan, decode_unstringified
+
+
+def synthetic_constructions(size_mb, seed=1):
+    rng = random.Random(seed)
+    buckets = [[] for _ in range(40)]
+    size = 0
+    while size < size_mb * 1024 * 1024:
+        tid = rng.randrange(len(buckets))
+        s = {
+            "TypeID": tid,
+            "Position": {"x": rng.uniform(-1500, 1500), "y": rng.uniform(0, 300), "z": rng.uniform(-1500, 1500)},
+            "Rotation": {"x": 0.0, "y": rng.random(), "z": 0.0, "w": rng.random()},
+            "LinkedStructures": [rng.randrange(50) for _ in range(rng.randrange(4))],
+            "Storages": [],
+            "Data": json.dumps({"Health": rng.random() * 100, "Pieces": [rng.randrange(9) for _ in range(6)]}),
+        }
+        buckets[tid].append(s)
+        size += len(json.dumps(s)) + 24
+    return json.dumps({"Version": "0.0.0", "Data": {"Constructions": json.dumps({"Structures": buckets})}})
+
+
+def read_input(path):
+    if path.endswith('.zip'):
+        with zipfile.ZipFile(path) as zf:
+            name = next(n for n in zf.namelist() if 'constructions' in n.lower())
+            return zf.read(name).decode('utf-8')
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+def two_pass(text):
+    raw = json.loads(text)
+    return deep_unstringify(raw), compile_stringify_plan(raw)
+
+
+def single_pass(text):
+    return decode_unstringified(text)
+
+
+def measure(fn, text, repeat):
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        fn(text)
+        times.append(time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    fn(text)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(times), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('path', nargs='?')
+    parser.add_argument('--size-mb', type=float, default=20)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    text = read_input(args.path) if args.path else synthetic_constructions(args.size_mb)
+    print(f"Input: {len(text) / 1024 / 1024:.1f} MB")
+    assert two_pass(text) == single_pass(text)
+
+    for label, fn in (("two-pass (json.loads + deep_unstringify + plan)", two_pass),
+                      ("single-pass (decode_unstringified)", single_pass)):
+        best, peak = measure(fn, text, args.repeat)
+        print(f"{label:50s} {best:8.3f} s   peak {peak / 1024 / 1024:8.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
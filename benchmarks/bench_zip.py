@@ -0,0 +1,91 @@
+"""Time the save ZIP writer's parallel deflate against zipfile's single-threaded one.
+
+Usage: python benchmarks/bench_zip.py [--megabytes 30] [--threads 1,2,4,8] [--levels 1,6,9]
+
+A synthetic save of about --megabytes of uncompressed JSON is re-encoded in full (every
+member replaced, like the first re-encode of a save), once with zipfile and then with
+rebuild_save_zip() for each level and thread count. Speedups are against one thread at the
+same level; they need as many cores as threads.
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# app.py refuses to start without a secret key; the benchmark never serves requests
+os.environ.setdefault('SOTFSE_SECRET_KEY', 'benchmark')
+# No sweeper thread or metrics snapshots running alongside the timings
+os.environ.setdefault('SOTFSE_SWEEP_INTERVAL', '0')
+os.environ.setdefault('SOTFSE_METRICS', '0')
+from app import rebuild_save_zip
+from synthetic_save import write_save
+
+# Structures per MB of uncompressed save JSON, measured on synthetic_save.py output
+STRUCTURES_PER_MB = 2130
+
+
+def best_of(repeat, fn):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def zipfile_rewrite(members, level):
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, 'w', zipfile.ZIP_DEFLATED, compresslevel=level) as zf:
+        for name, data in members.items():
+            zf.writestr(name, data)
+    return out.getvalue()
+
+
+def pool_rewrite(path, members, level, threads):
+    out = io.BytesIO()
+    rebuild_save_zip(path, out, members, level=level, threads=threads)
+    return out.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--megabytes', type=float, default=30)
+    parser.add_argument('--threads', default='1,2,4,8')
+    parser.add_argument('--levels', default='1,6,9')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    thread_counts = [int(t) for t in args.threads.split(',') if t]
+    levels = [int(level) for level in args.levels.split(',') if level]
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, 'SaveData.zip')
+        write_save(path, int(args.megabytes * STRUCTURES_PER_MB))
+        with zipfile.ZipFile(path) as zf:
+            members = {name: zf.read(name) for name in zf.namelist()}
+        total = sum(len(data) for data in members.values())
+        print(f"{total / 1024 / 1024:.1f} MB in {len(members)} members, {os.cpu_count()} CPUs")
+        print(f"{'writer':10s} {'level':>5s} {'threads':>7s} {'seconds':>8s} {'MB/s':>7s} {'speedup':>7s} {'size MB':>8s}")
+
+        for level in levels:
+            seconds, data = best_of(args.repeat, lambda: zipfile_rewrite(members, level))
+            print(f"{'zipfile':10s} {level:5d} {1:7d} {seconds:8.3f} {total / 1024 / 1024 / seconds:7.1f} "
+                  f"{'':>7s} {len(data) / 1024 / 1024:8.2f}")
+            single = None
+            for threads in thread_counts:
+                seconds, data = best_of(args.repeat, lambda: pool_rewrite(path, members, level, threads))
+                with zipfile.ZipFile(io.BytesIO(data)) as zf:
+                    if zf.testzip() is not None:
+                        sys.exit(f"Corrupt output at level {level} with {threads} threads")
+                single = single or (seconds if threads == 1 else None)
+                speedup = f"{single / seconds:6.2f}x" if single else ''
+                print(f"{'pool':10s} {level:5d} {threads:7d} {seconds:8.3f} {total / 1024 / 1024 / seconds:7.1f} "
+                      f"{speedup:>7s} {len(data) / 1024 / 1024:8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""Generate realistic synthetic SaveData.zip files and community base files.
+
+Usage: python benchmarks/synthetic_save.py SaveData.zip [--structures 10000]
+       python benchmarks/synthetic_save.py base.json --base [--layout export] [--structures 2000]
+
+Structures are clustered around a few base sites, bucketed by TypeID, linked to their
+neighbours and carry Storages and per-structure Data that is itself stringified JSON
+holding another stringified layer, like the game writes them.
+"""
+import argparse
+import itertools
+import json
+import random
+import zipfile
+
+SAVE_FOLDER = "76561190000000000/1234567890"
+# Layouts extract_structures_from_any understands
+BASE_LAYOUTS = ('save', 'export', 'root', 'list')
+
+
+def synthetic_structure(rng, tid, site, bucket_len):
+    links = [rng.randrange(bucket_len) if bucket_len and rng.random() < 0.8 else None
+             for _ in range(rng.choice((0, 0, 1, 2, 3)))]
+    storages = []
+    if rng.random() < 0.15:
+        storages.append({
+            "Id": rng.randrange(1000),
+            "Items": [{"ItemId": rng.randrange(700), "Count": rng.randrange(1, 20)} for _ in range(rng.randrange(1, 5))],
+        })
+    state = {
+        "Health": round(rng.uniform(0, 100), 3),
+        "Pieces": [rng.randrange(9) for _ in range(rng.randrange(2, 8))],
+        "Stored": json.dumps({"Owner": rng.randrange(4), "Flags": [rng.random() < 0.5 for _ in range(3)]}),
+    }
+    return {
+        "TypeID": tid,
+        "Position": {"x": site[0] + rng.gauss(0, 25), "y": site[1] + rng.uniform(0, 15), "z": site[2] + rng.gauss(0, 25)},
+        "Rotation": {"x": 0.0, "y": rng.uniform(-1, 1), "z": 0.0, "w": rng.uniform(-1, 1)},
+        "Scale": {"x": 1.0, "y": 1.0, "z": 1.0},
+        "LinkedStructures": links,
+        "Storages": storages,
+        "Data": json.dumps(state),
+    }
+
+
+def synthetic_buckets(count, type_count=120, sites=12, seed=1):
+    """Structures list as the save stores it: one bucket per TypeID, None for unused TypeIDs."""
+    rng = random.Random(seed)
+    site_list = [(rng.uniform(-1500, 1500), rng.uniform(0, 120), rng.uniform(-1500, 1500)) for _ in range(sites)]
+    # A few TypeIDs (walls, floors, logs) hold most of the structures
+    cum_weights = list(itertools.accumulate(1.0 / (i + 1) for i in range(type_count)))
+    used = [None] * type_count
+    for _ in range(count):
+        tid = rng.choices(range(type_count), cum_weights=cum_weights)[0]
+        bucket = used[tid]
+        if bucket is None:
+            bucket = used[tid] = []
+        bucket.append(synthetic_structure(rng, tid, rng.choice(site_list), len(bucket)))
+    while used and used[-1] is None:
+        used.pop()
+    return used
+
+
+def constructions_document(buckets):
+    constructions = {"Structures": buckets, "Foundations": json.dumps({"Count": 0, "Scale": 1.5e-07})}
+    return {"Version": "0.0.0", "Data": {"Constructions": json.dumps(constructions)}}
+
+
+def write_save(path, count, seed=1):
+    """Write a SaveData.zip with a Constructions member of count structures."""
+    rng = random.Random(seed)
+    game_state = {"GameDays": rng.randrange(1, 200), "GameHours": rng.randrange(24),
+                  "GameType": "Normal", "CrashSite": "tree"}
+    inventory = {"ItemInstanceManagerData": json.dumps({"Items": [{"Id": i, "Count": rng.randrange(50)} for i in range(400)]})}
+    members = {
+        "ConstructionsSaveData.json": constructions_document(synthetic_buckets(count, seed=seed)),
+        "GameStateSaveData.json": {"Version": "0.0.0", "Data": {"GameState": json.dumps(game_state)}},
+        "PlayerInventorySaveData.json": {"Version": "0.0.0", "Data": {"PlayerInventory": json.dumps(inventory)}},
+    }
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for name, doc in members.items():
+            zf.writestr(f"{SAVE_FOLDER}/{name}", json.dumps(doc, separators=(',', ':')))
+
+
+def base_document(count, layout='export', seed=2):
+    """A community base file with count structures in one of BASE_LAYOUTS."""
+    buckets = synthetic_buckets(count, sites=1, seed=seed)
+    info = {"Name": "Synthetic base", "Author": "benchmarks", "Description": f"{count} generated structures",
+            "NumberOfElements": count}
+    if layout == 'save':
+        return dict(info, **constructions_document(buckets))
+    if layout == 'export':
+        return dict(info, Data={"Structures": buckets})
+    if layout == 'root':
+        return dict(info, Structures=buckets)
+    if layout == 'list':
+        return [s for bucket in buckets if bucket for s in bucket]
+    raise ValueError(f"Unknown layout {layout!r}; expected one of {', '.join(BASE_LAYOUTS)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('path')
+    parser.add_argument('--structures', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--base', action='store_true', help="write a community base file instead of a save")
+    parser.add_argument('--layout', choices=BASE_LAYOUTS, default='export')
+    args = parser.parse_args()
+
+    if args.base:
+        with open(args.path, 'w', encoding='utf-8') as f:
+            json.dump(base_document(args.structures, args.layout, args.seed), f)
+    else:
+        write_save(args.path, args.structures, args.seed)
+    print(f"Wrote {args.path}")
+
+
+if __name__ == '__main__':
+    main()
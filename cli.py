@@ -0,0 +1,318 @@
+"""Headless batch tool: run the editor's save operations on many SaveData.zip files at once.
+
+Usage:
+  python cli.py stats SAVES...
+  python cli.py import-base BASE.json SAVES... --out DIR [--skip-duplicates] [--move X Y Z] [--rotate DEG]
+  python cli.py delete SAVES... --out DIR [--type-id 12 ...] [--group 3 ...]
+  python cli.py patch PATCH.json SAVES... --out DIR [--member ConstructionsSaveData.json]
+
+SAVES are SaveData.zip files or directories searched for .zip files. Saves are processed on
+a pool of --jobs processes; a line is printed as each one finishes, followed by a per-file
+timing report. Edited saves go to --out (mirroring the input folders) or, with --in-place,
+replace the originals.
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# app.py refuses to start without a secret key; the CLI never serves requests
+os.environ.setdefault('SOTFSE_SECRET_KEY', 'cli')
+os.environ.setdefault('SOTFSE_SWEEP_INTERVAL', '0')
+os.environ.setdefault('SOTFSE_METRICS', '0')
+from app import (STRUCTURES_PATH, extract_structures_from_any, decode_unstringified, flatten_structure_buckets,
+                 structure_groups, find_duplicate_structures, merge_imported_structures, drop_structures,
+                 apply_json_patch, locate_splice_span, rewrite_member_text, uppercase_exponents,
+                 rebuild_save_zip, relocate_structures, read_game_state)
+
+CONSTRUCTIONS = 'constructionssavedata.json'
+GAME_STATE = 'gamestatesavedata.json'
+REPORT_STAGES = ('inflate', 'unstringify', 'duplicates', 'group', 'merge', 'delete', 'patch', 'serialize', 'zip_write')
+
+# Set in each pool process by _init_worker
+_options = None
+
+
+def _init_worker(options):
+    global _options
+    _options = options
+
+
+def find_saves(paths):
+    saves = []
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, _, filenames in os.walk(path):
+                saves.extend(os.path.join(dirpath, n) for n in sorted(filenames) if n.lower().endswith('.zip'))
+        elif os.path.isfile(path):
+            saves.append(path)
+        else:
+            raise SystemExit(f"No such file or directory: {path}")
+    return saves
+
+
+class SaveJob:
+    """One save being processed: its parsed members and how long each stage took."""
+
+    def __init__(self, path):
+        self.path = path
+        self.stages = {}
+        with zipfile.ZipFile(path) as zf:
+            self.names = zf.namelist()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def member_name(self, suffix):
+        suffix = suffix.lower()
+        for name in self.names:
+            if name.lower().endswith(suffix):
+                return name
+        raise ValueError(f"No {suffix} in {self.path}")
+
+    def load(self, fname):
+        """(text, tree, plan) of a member."""
+        with self.stage('inflate'), zipfile.ZipFile(self.path) as zf:
+            text = zf.read(fname).decode('utf-8')
+        with self.stage('unstringify'):
+            tree, plan = decode_unstringified(text)
+        return text, tree, plan
+
+    def rewrite_structures(self, text, tree, plan, structures, postprocess=None):
+        with self.stage('serialize'):
+            try:
+                location = locate_splice_span(text, STRUCTURES_PATH, plan)
+            except (ValueError, KeyError):
+                location = False
+            return rewrite_member_text(text, tree, plan, STRUCTURES_PATH, structures, location, postprocess)
+
+    def write(self, dst, replacements):
+        with self.stage('zip_write'):
+            os.makedirs(os.path.dirname(os.path.abspath(dst)), exist_ok=True)
+            tmp_path = f"{dst}.tmp"
+            rebuild_save_zip(self.path, tmp_path, replacements)
+            os.replace(tmp_path, dst)
+
+
+def op_stats(job, options):
+    text, tree, plan = job.load(job.member_name(CONSTRUCTIONS))
+    flat, _ = flatten_structure_buckets(tree['Data']['Constructions']['Structures'])
+    stats = {'structures': len(flat), 'type_ids': len({s.get('TypeID') for s in flat})}
+    try:
+        with job.stage('inflate'), zipfile.ZipFile(job.path) as zf:
+            text = zf.read(job.member_name(GAME_STATE)).decode('utf-8')
+        state = read_game_state(text)
+        stats.update(days=state.get('GameDays'), game_type=state.get('GameType'))
+    except (ValueError, KeyError, AttributeError):
+        pass
+    return f"{stats['structures']} structures, {stats['type_ids']} TypeIDs", stats, None
+
+
+def op_import_base(job, options):
+    fname = job.member_name(CONSTRUCTIONS)
+    text, tree, plan = job.load(fname)
+    buckets = tree['Data']['Constructions']['Structures']
+    candidates = options['candidates']
+    skipped = 0
+    if options['skip_duplicates']:
+        with job.stage('duplicates'):
+            existing, _ = flatten_structure_buckets(buckets)
+            flags = find_duplicate_structures(existing, candidates)
+        skipped = sum(flags)
+        candidates = [s for s, is_duplicate in zip(candidates, flags) if not is_duplicate]
+    with job.stage('merge'):
+        # Own copies of the bucket lists; the parsed tree stays the original to splice against
+        cstructs = [list(b) if isinstance(b, list) else b for b in buckets]
+        merge_imported_structures(cstructs, candidates)
+    new_text = job.rewrite_structures(text, tree, plan, cstructs, postprocess=uppercase_exponents)
+    summary = f"imported {len(candidates)} structures" + (f", skipped {skipped} duplicates" if skipped else "")
+    return summary, {'imported': len(candidates), 'skipped_duplicates': skipped}, {fname: new_text}
+
+
+def op_delete(job, options):
+    fname = job.member_name(CONSTRUCTIONS)
+    text, tree, plan = job.load(fname)
+    buckets = tree['Data']['Constructions']['Structures']
+    flat, sources = flatten_structure_buckets(buckets)
+    doomed_indices = set()
+    if options['type_ids']:
+        doomed_indices.update(i for i, s in enumerate(flat) if s.get('TypeID') in options['type_ids'])
+    if options['groups']:
+        with job.stage('group'):
+            grouped = structure_groups([dict(s) for s in flat], nearby_threshold=5.00)
+        doomed_indices.update(i for i, s in enumerate(grouped) if s.get('group_id') in options['groups'])
+    with job.stage('delete'):
+        doomed = {}
+        for i in doomed_indices:
+            bucket, index = sources[i]
+            doomed.setdefault(bucket, set()).add(index)
+        new_structures = drop_structures(buckets, doomed)
+    new_text = job.rewrite_structures(text, tree, plan, new_structures)
+    return f"deleted {len(doomed_indices)} of {len(flat)} structures", {'deleted': len(doomed_indices)}, {fname: new_text}
+
+
+def op_patch(job, options):
+    fname = job.member_name(options['member'])
+    text, tree, plan = job.load(fname)
+    with job.stage('patch'):
+        patched = apply_json_patch(tree, options['patch'])
+    with job.stage('serialize'):
+        new_text = rewrite_member_text(text, tree, plan, (), patched, False)
+    return f"applied {len(options['patch'])} operations to {os.path.basename(fname)}", {}, {fname: new_text}
+
+
+OPERATIONS = {'stats': op_stats, 'import-base': op_import_base, 'delete': op_delete, 'patch': op_patch}
+
+
+def process_save(src, dst):
+    """Run the configured operation on one save; never raises, so one bad save doesn't stop the batch."""
+    start = time.perf_counter()
+    result = {'path': src, 'output': dst}
+    try:
+        job = SaveJob(src)
+        summary, stats, replacements = OPERATIONS[_options['command']](job, _options)
+        if replacements and dst:
+            job.write(dst, replacements)
+        result.update(ok=True, summary=summary, stats=stats, stages=job.stages)
+    except Exception as e:
+        result.update(ok=False, summary=f"{type(e).__name__}: {e}", stats={}, stages={})
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def run_batch(tasks, options, jobs):
+    """Yield results as saves finish."""
+    if jobs <= 1:
+        _init_worker(options)
+        for src, dst in tasks:
+            yield process_save(src, dst)
+        return
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(options,)) as pool:
+        futures = [pool.submit(process_save, src, dst) for src, dst in tasks]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def print_report(results, root):
+    stages = [s for s in REPORT_STAGES if any(s in r['stages'] for r in results)]
+    print()
+    print("Per-file timings (seconds), slowest first")
+    header = f"{'save':40s} {'total':>8s}" + ''.join(f" {s:>11s}" for s in stages)
+    print(header)
+    print('-' * len(header))
+    for r in sorted(results, key=lambda r: r['seconds'], reverse=True):
+        name = os.path.relpath(r['path'], root)
+        if len(name) > 40:
+            name = '…' + name[-39:]
+        print(f"{name:40s} {r['seconds']:8.2f}" + ''.join(f" {r['stages'].get(s, 0):11.2f}" for s in stages))
+    total = sum(r['seconds'] for r in results)
+    print('-' * len(header))
+    print(f"{'all (CPU time across workers)':40s} {total:8.2f}"
+          + ''.join(f" {sum(r['stages'].get(s, 0) for r in results):11.2f}" for s in stages))
+
+
+def build_options(args):
+    options = {'command': args.command}
+    if args.command == 'import-base':
+        with open(args.base, encoding='utf-8') as f:
+            candidates, meta = extract_structures_from_any(json.load(f))
+        if not candidates:
+            raise SystemExit(f"No structures found in {args.base}")
+        print(f"Base {meta.get('Name') or os.path.basename(args.base)}: {len(candidates)} structures")
+        if any(args.move) or args.rotate or args.floor_y is not None:
+            # Same spot in every save, so the base is moved once up front
+            relocate_structures(candidates, offset=tuple(args.move), yaw_degrees=args.rotate % 360,
+                                pivot=tuple(args.pivot) if args.pivot else None, floor_y=args.floor_y)
+        options.update(candidates=candidates, skip_duplicates=args.skip_duplicates)
+    elif args.command == 'delete':
+        if not args.type_id and not args.group:
+            raise SystemExit("Pick what to delete with --type-id and/or --group")
+        options.update(type_ids=set(args.type_id), groups=set(args.group))
+    elif args.command == 'patch':
+        with open(args.patch, encoding='utf-8') as f:
+            patch = json.load(f)
+        if not isinstance(patch, list):
+            raise SystemExit(f"{args.patch} is not a JSON Patch array")
+        options.update(patch=patch, member=args.member)
+    return options
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help="worker processes")
+    common.add_argument('--report', help="also write every file's result and timings to this JSON file")
+    writes = argparse.ArgumentParser(add_help=False)
+    target = writes.add_mutually_exclusive_group(required=True)
+    target.add_argument('--out', help="write edited saves under this directory")
+    target.add_argument('--in-place', action='store_true', help="replace the original saves")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    p = commands.add_parser('stats', parents=[common], help="structure counts and game state")
+    p.add_argument('saves', nargs='+')
+    p = commands.add_parser('import-base', parents=[common, writes], help="merge a community base into every save")
+    p.add_argument('base')
+    p.add_argument('saves', nargs='+')
+    p.add_argument('--skip-duplicates', action='store_true', help="leave out structures the save already has")
+    p.add_argument('--move', type=float, nargs=3, default=[0.0, 0.0, 0.0], metavar=('X', 'Y', 'Z'),
+                   help="shift the base by this much")
+    p.add_argument('--rotate', type=float, default=0.0, metavar='DEG', help="turn the base clockwise seen from above")
+    p.add_argument('--pivot', type=float, nargs=2, metavar=('X', 'Z'), help="turn around this point (default: the base centre)")
+    p.add_argument('--floor-y', type=float, help="put the lowest structure at this height before --move")
+    p = commands.add_parser('delete', parents=[common, writes], help="delete structures by TypeID or group")
+    p.add_argument('saves', nargs='+')
+    p.add_argument('--type-id', type=int, action='append', default=[])
+    p.add_argument('--group', type=int, action='append', default=[],
+                   help="group number as shown by Manage Structures (0-based)")
+    p = commands.add_parser('patch', parents=[common, writes], help="apply an RFC 6902 JSON Patch to a save file")
+    p.add_argument('patch')
+    p.add_argument('saves', nargs='+')
+    p.add_argument('--member', default='ConstructionsSaveData.json',
+                   help="save file the patch applies to (paths are in its unstringified form)")
+    args = parser.parse_args(argv)
+
+    saves = find_saves(args.saves)
+    if not saves:
+        raise SystemExit("No saves found")
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(s)) for s in saves])
+    options = build_options(args)
+
+    tasks = []
+    for src in saves:
+        if args.command == 'stats':
+            dst = None
+        elif getattr(args, 'in_place', False):
+            dst = src
+        else:
+            dst = os.path.join(args.out, os.path.relpath(os.path.abspath(src), root))
+        tasks.append((src, dst))
+
+    results = []
+    started = time.perf_counter()
+    for result in run_batch(tasks, options, max(args.jobs, 1)):
+        results.append(result)
+        status = 'ok ' if result['ok'] else 'ERR'
+        print(f"[{len(results)}/{len(tasks)}] {status} {os.path.relpath(result['path'], root)} "
+              f"{result['seconds']:.2f}s  {result['summary']}", flush=True)
+    elapsed = time.perf_counter() - started
+
+    print_report(results, root)
+    failed = sum(1 for r in results if not r['ok'])
+    print(f"\n{len(results) - failed} of {len(results)} saves done in {elapsed:.2f} s wall time")
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump({'command': args.command, 'seconds': elapsed, 'results': results}, f, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
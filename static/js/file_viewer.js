@@ -0,0 +1,126 @@
+// Paged viewer for debug and diagnostic files.
+//
+// The server sends the file a page of bytes at a time (pretty-printed on its own when the
+// view mode is 'pretty'), so only the pages that were scrolled to are ever loaded. Search
+// also runs on the server; picking a hit reloads the view around its byte offset.
+function initFileViewer(options) {
+    const root = options.root;
+    const content = root.querySelector('.file-viewer-content');
+    const previous = root.querySelector('.file-viewer-previous');
+    const next = root.querySelector('.file-viewer-next');
+    const status = root.querySelector('.file-viewer-status');
+    const searchForm = root.querySelector('.file-viewer-search');
+    const searchStatus = root.querySelector('.file-viewer-search-status');
+    const hitList = root.querySelector('.file-viewer-hits');
+    const moreHits = root.querySelector('.file-viewer-more-hits');
+    // Loaded byte range, and how the first page joins onto one loaded before it
+    let view = {start: 0, end: 0, size: 0, join: ''};
+    let search = {query: '', next: null};
+    let busy = false;
+
+    function mode() {
+        const checked = root.querySelector('input[name="viewMode"]:checked');
+        return checked ? checked.value : 'raw';
+    }
+
+    function formatBytes(n) {
+        return n.toLocaleString();
+    }
+
+    function update() {
+        previous.style.display = view.start > 0 ? '' : 'none';
+        next.style.display = view.end < view.size ? '' : 'none';
+        status.textContent = `Showing bytes ${formatBytes(view.start)}–${formatBytes(view.end)} of ${formatBytes(view.size)}.`;
+    }
+
+    function load(params, place) {
+        if (busy) return;
+        busy = true;
+        status.textContent = 'Loading…';
+        params.set('mode', mode());
+        fetch(`${options.pageUrl}?${params}`)
+            .then(r => r.json())
+            .then(page => {
+                if (page.error) throw new Error(page.error);
+                if (place === 'replace') {
+                    content.textContent = page.text;
+                    content.scrollTop = 0;
+                    view = {start: page.start, end: page.end, size: page.size, join: page.join};
+                } else if (place === 'append') {
+                    content.append(page.join + page.text);
+                    view.end = page.end;
+                } else {
+                    // Keep what was on screen in place while the page above it grows
+                    const height = content.scrollHeight;
+                    content.prepend(page.text + view.join);
+                    content.scrollTop += content.scrollHeight - height;
+                    view.start = page.start;
+                    view.join = page.join;
+                }
+                view.size = page.size;
+                update();
+            })
+            .catch(err => {
+                status.textContent = 'Could not load this part of the file.';
+                console.error(err);
+            })
+            .finally(() => { busy = false; });
+    }
+
+    function showHits(result, append) {
+        if (!append) hitList.innerHTML = '';
+        result.hits.forEach(hit => {
+            const item = document.createElement('button');
+            item.type = 'button';
+            item.className = 'list-group-item list-group-item-action';
+            item.textContent = hit.excerpt;
+            item.title = `Byte ${formatBytes(hit.offset)}`;
+            item.addEventListener('click', () => load(new URLSearchParams({around: hit.offset}), 'replace'));
+            hitList.append(item);
+        });
+        search.next = result.next_offset;
+        moreHits.style.display = search.next === null ? 'none' : '';
+        const found = hitList.children.length;
+        if (search.next === null) {
+            searchStatus.textContent = `${found} match(es).`;
+        } else {
+            searchStatus.textContent = `${found} match(es) up to byte ${formatBytes(search.next)} of ${formatBytes(result.size)}.`;
+        }
+    }
+
+    function runSearch(append) {
+        const params = new URLSearchParams({q: search.query, offset: append ? search.next : 0});
+        searchStatus.textContent = 'Searching…';
+        fetch(`${options.searchUrl}?${params}`)
+            .then(r => r.json())
+            .then(result => {
+                if (result.error) throw new Error(result.error);
+                showHits(result, append);
+            })
+            .catch(err => {
+                searchStatus.textContent = err.message || 'Search failed.';
+                console.error(err);
+            });
+    }
+
+    next.addEventListener('click', () => load(new URLSearchParams({offset: view.end}), 'append'));
+    previous.addEventListener('click', () => load(new URLSearchParams({before: view.start}), 'prepend'));
+    content.addEventListener('scroll', function() {
+        if (view.end < view.size && content.scrollTop + content.clientHeight >= content.scrollHeight - 200) {
+            load(new URLSearchParams({offset: view.end}), 'append');
+        }
+    });
+
+    root.querySelectorAll('input[name="viewMode"]').forEach(radio => {
+        radio.addEventListener('change', () => load(new URLSearchParams({around: view.start}), 'replace'));
+    });
+
+    searchForm.addEventListener('submit', function(event) {
+        event.preventDefault();
+        search.query = searchForm.elements.q.value;
+        if (search.query) runSearch(false);
+    });
+    moreHits.addEventListener('click', () => runSearch(true));
+
+    load(new URLSearchParams({offset: 0}), 'replace');
+}
@@ -0,0 +1,204 @@
+// Lazily expanding JSON tree editor for the raw file editor.
+//
+// Subtrees are read by JSON Pointer from the edit API and every change is sent back as a
+// small RFC 6902 JSON Patch, so the browser never holds or posts the whole document.
+function initJsonEditor(options) {
+    const apiUrl = options.apiUrl;
+    const pageSize = options.pageSize || 200;
+    const tree = options.tree;
+    const panel = options.panel;
+    const pointerLabel = panel.querySelector('.node-pointer');
+    const text = panel.querySelector('.node-text');
+    const status = panel.querySelector('.node-status');
+    const applyBtn = panel.querySelector('.node-apply');
+    const deleteBtn = panel.querySelector('.node-delete');
+    const addRow = panel.querySelector('.node-add');
+    const lists = new Map();  // pointer -> <ul> of a loaded container
+    let revision = options.revision || 0;
+    let selected = null;
+
+    function childPointer(pointer, key) {
+        return `${pointer}/${String(key).replace(/~/g, '~0').replace(/\//g, '~1')}`;
+    }
+
+    function parentPointer(pointer) {
+        return pointer.slice(0, pointer.lastIndexOf('/'));
+    }
+
+    function showStatus(message, kind) {
+        status.className = `node-status small mt-2 text-${kind || 'muted'}`;
+        status.textContent = message;
+    }
+
+    function setRevision(value) {
+        revision = value;
+        if (options.onRevision) options.onRevision(revision);
+    }
+
+    function fetchNode(pointer, params) {
+        const query = new URLSearchParams(Object.assign({ pointer: pointer }, params || {}));
+        return fetch(`${apiUrl}?${query}`, { cache: 'no-store' }).then(r => r.json().then(body => {
+            if (!r.ok) throw new Error(body.error || `Request failed (${r.status})`);
+            return body;
+        }));
+    }
+
+    function sendPatch(patch) {
+        return fetch(apiUrl, {
+            method: 'PATCH',
+            headers: { 'Content-Type': 'application/json-patch+json', 'If-Match': `"${revision}"` },
+            body: JSON.stringify(patch),
+        }).then(r => r.json().then(body => {
+            if (body.revision !== undefined && r.ok) setRevision(body.revision);
+            if (!r.ok) throw new Error(body.error || `Request failed (${r.status})`);
+            return body;
+        }));
+    }
+
+    function describe(child) {
+        if (child.type === 'object') return `{ ${child.size} }`;
+        if (child.type === 'array') return `[ ${child.size} ]`;
+        if (child.preview !== undefined) return `${JSON.stringify(child.preview)}… (${child.length} chars)`;
+        return JSON.stringify(child.value);
+    }
+
+    function renderChild(ul, pointer, child) {
+        const li = document.createElement('li');
+        const ptr = childPointer(pointer, child.key);
+        const container = child.type === 'object' || child.type === 'array';
+        li.innerHTML = `
+            <span class="json-toggle me-1" role="button"></span>
+            <span class="json-key fw-bold" role="button"></span>:
+            <span class="json-summary text-muted"></span>`;
+        li.querySelector('.json-toggle').innerHTML = container ? '<i class="bi bi-caret-right-fill"></i>' : '<i class="bi bi-dot"></i>';
+        li.querySelector('.json-key').textContent = child.key;
+        li.querySelector('.json-summary').textContent = describe(child);
+        if (child.stringified) {
+            li.querySelector('.json-summary').insertAdjacentHTML('afterend', ' <span class="badge bg-info text-dark">stringified</span>');
+        }
+        li.querySelector('.json-key').addEventListener('click', () => select(ptr, child.type));
+        if (container) {
+            const toggle = li.querySelector('.json-toggle');
+            toggle.addEventListener('click', () => {
+                let sub = lists.get(ptr);
+                if (sub) {
+                    sub.remove();
+                    lists.delete(ptr);
+                    toggle.innerHTML = '<i class="bi bi-caret-right-fill"></i>';
+                    return;
+                }
+                sub = document.createElement('ul');
+                sub.className = 'list-unstyled ms-3';
+                li.appendChild(sub);
+                lists.set(ptr, sub);
+                toggle.innerHTML = '<i class="bi bi-caret-down-fill"></i>';
+                loadChildren(ptr, 0);
+            });
+        }
+        ul.appendChild(li);
+    }
+
+    function loadChildren(pointer, offset) {
+        const ul = lists.get(pointer);
+        return fetchNode(pointer, { offset: offset, limit: pageSize }).then(node => {
+            if (offset === 0) ul.innerHTML = '';
+            ul.querySelectorAll(':scope > .json-more').forEach(el => el.remove());
+            node.children.forEach(child => renderChild(ul, pointer, child));
+            const loaded = offset + node.children.length;
+            if (loaded < node.size) {
+                const more = document.createElement('li');
+                more.className = 'json-more';
+                more.innerHTML = '<button type="button" class="btn btn-sm btn-link p-0"></button>';
+                more.firstChild.textContent = `Load more (${node.size - loaded} remaining)`;
+                more.firstChild.addEventListener('click', () => loadChildren(pointer, loaded));
+                ul.appendChild(more);
+            }
+        }).catch(err => {
+            ul.insertAdjacentHTML('beforeend', '<li class="text-danger small">Could not load this node.</li>');
+            console.error(err);
+        });
+    }
+
+    function refresh(pointer) {
+        // Reload the closest expanded container at or above pointer
+        while (!lists.has(pointer) && pointer !== '') pointer = parentPointer(pointer);
+        if (lists.has(pointer)) loadChildren(pointer, 0);
+    }
+
+    function select(pointer, type) {
+        selected = { pointer: pointer, type: type };
+        pointerLabel.textContent = pointer || '/ (whole document)';
+        text.value = '';
+        text.disabled = true;
+        applyBtn.disabled = true;
+        deleteBtn.disabled = pointer === '';
+        addRow.style.display = type === 'object' || type === 'array' ? 'flex' : 'none';
+        showStatus('Loading…');
+        fetchNode(pointer, { full: 1 }).then(node => {
+            text.value = node.text;
+            text.disabled = false;
+            applyBtn.disabled = false;
+            showStatus(node.stringified ? 'Stored as a JSON string in the save; it is re-stringified on export.' : '');
+        }).catch(err => showStatus(err.message, 'danger'));
+    }
+
+    function parseText(value) {
+        try {
+            return { value: JSON.parse(value) };
+        } catch (e) {
+            showStatus(`Invalid JSON: ${e.message}`, 'danger');
+            return null;
+        }
+    }
+
+    applyBtn.addEventListener('click', () => {
+        const parsed = parseText(text.value);
+        if (!parsed || !selected) return;
+        sendPatch([{ op: 'replace', path: selected.pointer, value: parsed.value }])
+            .then(() => {
+                showStatus('Change applied.', 'success');
+                refresh(selected.pointer === '' ? '' : parentPointer(selected.pointer));
+            })
+            .catch(err => showStatus(err.message, 'danger'));
+    });
+
+    deleteBtn.addEventListener('click', () => {
+        if (!selected || !confirm(`Delete ${selected.pointer}?`)) return;
+        const removed = selected.pointer;
+        sendPatch([{ op: 'remove', path: removed }])
+            .then(() => {
+                refresh(parentPointer(removed));
+                selected = null;
+                text.value = '';
+                text.disabled = true;
+                applyBtn.disabled = true;
+                deleteBtn.disabled = true;
+                pointerLabel.textContent = '';
+                showStatus('Removed.', 'success');
+            })
+            .catch(err => showStatus(err.message, 'danger'));
+    });
+
+    addRow.querySelector('.node-add-button').addEventListener('click', () => {
+        if (!selected) return;
+        const keyInput = addRow.querySelector('.node-add-key');
+        const parsed = parseText(addRow.querySelector('.node-add-value').value);
+        if (!parsed) return;
+        const key = keyInput.value || (selected.type === 'array' ? '-' : '');
+        if (!key) {
+            showStatus('Enter a name for the new member.', 'danger');
+            return;
+        }
+        sendPatch([{ op: 'add', path: childPointer(selected.pointer, key), value: parsed.value }])
+            .then(() => {
+                showStatus('Added.', 'success');
+                refresh(selected.pointer);
+                select(selected.pointer, selected.type);
+            })
+            .catch(err => showStatus(err.message, 'danger'));
+    });
+
+    lists.set('', tree);
+    loadChildren('', 0);
+    setRevision(revision);
+}
@@ -0,0 +1,114 @@
+// Top-down map preview for the Import and Manage pages.
+//
+// The server renders one tile at a time (zoom/x/y, tile 0/0/0 covers every structure).
+// A click zooms into that quarter of the tile, and dragging a box asks the server which
+// structures are inside it and hands them to the structure picker to tick or untick.
+function initStructureMap(options) {
+    const root = options.root;
+    const img = root.querySelector('.structure-map-image');
+    const box = root.querySelector('.structure-map-box');
+    const status = root.querySelector('.structure-map-status');
+    const zoomOut = root.querySelector('.structure-map-zoom-out');
+    const reset = root.querySelector('.structure-map-reset');
+    let info = null;
+    let view = {zoom: 0, tx: 0, ty: 0};
+    let drag = null;
+
+    function show() {
+        img.src = `${options.baseUrl}/${view.zoom}/${view.tx}/${view.ty}.png?v=${info.version}`;
+        zoomOut.disabled = view.zoom === 0;
+        reset.disabled = view.zoom === 0;
+    }
+
+    function pointAt(event) {
+        const rect = img.getBoundingClientRect();
+        return {
+            x: Math.min(Math.max(event.clientX - rect.left, 0), rect.width) / rect.width,
+            y: Math.min(Math.max(event.clientY - rect.top, 0), rect.height) / rect.height,
+        };
+    }
+
+    function toWorld(p) {
+        const size = info.bounds.span / (1 << view.zoom);
+        return {
+            x: info.bounds.min_x + (view.tx + p.x) * size,
+            z: info.bounds.max_z - (view.ty + p.y) * size,
+        };
+    }
+
+    function selectBox(a, b) {
+        const from = toWorld(a);
+        const to = toWorld(b);
+        const checked = root.querySelector('input[name="mapMode"]:checked').value === 'add';
+        status.textContent = 'Looking up structures…';
+        const duplicates = options.picker.duplicatesSelectable && options.picker.duplicatesSelectable() ? '&duplicates=1' : '';
+        fetch(`${options.baseUrl}/select?x0=${from.x}&z0=${from.z}&x1=${to.x}&z1=${to.z}${duplicates}`)
+            .then(r => r.json())
+            .then(selection => {
+                if (selection.error) throw new Error(selection.error);
+                options.picker.applySelection(selection, checked);
+                status.textContent = `${selection.count} structure(s) ${checked ? 'selected' : 'deselected'}.`;
+            })
+            .catch(err => {
+                status.textContent = 'Could not select structures.';
+                console.error(err);
+            });
+    }
+
+    img.addEventListener('mousedown', function(event) {
+        event.preventDefault();
+        if (!info) return;
+        drag = {start: pointAt(event), end: pointAt(event)};
+    });
+
+    window.addEventListener('mousemove', function(event) {
+        if (!drag) return;
+        drag.end = pointAt(event);
+        const rect = img.getBoundingClientRect();
+        box.style.display = 'block';
+        box.style.left = `${Math.min(drag.start.x, drag.end.x) * rect.width}px`;
+        box.style.top = `${Math.min(drag.start.y, drag.end.y) * rect.height}px`;
+        box.style.width = `${Math.abs(drag.end.x - drag.start.x) * rect.width}px`;
+        box.style.height = `${Math.abs(drag.end.y - drag.start.y) * rect.height}px`;
+    });
+
+    window.addEventListener('mouseup', function() {
+        if (!drag) return;
+        const {start, end} = drag;
+        drag = null;
+        box.style.display = 'none';
+        if (Math.abs(end.x - start.x) > 0.01 || Math.abs(end.y - start.y) > 0.01) {
+            selectBox(start, end);
+        } else if (view.zoom < info.max_zoom) {
+            // A plain click zooms into the clicked quarter
+            view = {
+                zoom: view.zoom + 1,
+                tx: view.tx * 2 + (start.x >= 0.5 ? 1 : 0),
+                ty: view.ty * 2 + (start.y >= 0.5 ? 1 : 0),
+            };
+            show();
+        }
+    });
+
+    zoomOut.addEventListener('click', function() {
+        view = {zoom: view.zoom - 1, tx: view.tx >> 1, ty: view.ty >> 1};
+        show();
+    });
+
+    reset.addEventListener('click', function() {
+        view = {zoom: 0, tx: 0, ty: 0};
+        show();
+    });
+
+    fetch(options.baseUrl)
+        .then(r => r.json())
+        .then(data => {
+            if (data.error) throw new Error(data.error);
+            info = data;
+            show();
+        })
+        .catch(err => {
+            status.textContent = 'Could not load the map.';
+            console.error(err);
+        });
+}
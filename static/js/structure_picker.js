@@ -0,0 +1,301 @@
+// Shared structure picker for the Import and Manage pages.
+//
+// The page only embeds group summaries, and their accordion items are rendered a page of
+// groups at a time. Members are fetched a page at a time when a group is opened, and the
+// selection is kept per group as a mode ('all' / 'none') plus the indices toggled away from
+// it, so it can be posted as a handful of compact ranges and covers groups not shown yet.
+function initStructurePicker(options) {
+    const form = options.form;
+    const globalMaster = options.globalMaster;
+    const container = options.container;
+    const moreGroups = options.moreGroups;
+    const pageSize = options.pageSize || 200;
+    const groupPageSize = options.groupPageSize || 100;
+    const groups = new Map();
+    let rendered = 0;
+    // Duplicates can't be ticked while locked; setDuplicatesSelectable() lifts that
+    let lockDuplicates = !!options.disableDuplicates;
+
+    options.groups.forEach(summary => {
+        const count = summary.count || 0;
+        const duplicates = summary.duplicates || 0;
+        groups.set(String(summary.id), {
+            el: null,
+            summary: summary,
+            duplicates: duplicates,
+            // Indices seen to be duplicates, so their picks can be dropped when they lock again
+            duplicateIdx: new Set(),
+            selectable: lockDuplicates ? count - duplicates : count,
+            mode: options.defaultMode || 'none',
+            toggled: new Set(),
+            loaded: 0,
+            total: count,
+        });
+    });
+
+    function selectedIn(group) {
+        return group.mode === 'all' ? group.selectable - group.toggled.size : group.toggled.size;
+    }
+
+    function isChecked(group, idx) {
+        return (group.mode === 'all') !== group.toggled.has(idx);
+    }
+
+    function formatPosition(v) {
+        const n = Number(v);
+        return v === null || v === undefined || Number.isNaN(n) ? '?' : n.toFixed(2);
+    }
+
+    function toRanges(indices) {
+        const sorted = [...indices].map(Number).sort((a, b) => a - b);
+        const parts = [];
+        let i = 0;
+        while (i < sorted.length) {
+            let j = i;
+            while (j + 1 < sorted.length && sorted[j + 1] === sorted[j] + 1) j++;
+            parts.push(i === j ? `${sorted[i]}` : `${sorted[i]}-${sorted[j]}`);
+            i = j + 1;
+        }
+        return parts.join(',');
+    }
+
+    function renderMember(groupId, group, member) {
+        const [idx, typeId, x, y, z, isDuplicate] = member;
+        const disabled = lockDuplicates && isDuplicate;
+        if (isDuplicate) group.duplicateIdx.add(idx);
+        const wrapper = document.createElement('div');
+        wrapper.className = `form-check mb-1 p-2 rounded structure-item-wrapper${disabled ? ' bg-light' : ''}`;
+        wrapper.innerHTML = `
+            <input class="form-check-input structure-checkbox" type="checkbox" id="struct${idx}">
+            <label class="form-check-label w-100 d-flex align-items-center${disabled ? ' text-muted' : ''}" for="struct${idx}">
+                <div class="me-auto">
+                    <strong class="me-2">#${idx}</strong>
+                    <span class="badge badge-sotf-danger"></span>
+                    ${isDuplicate ? '<span class="badge bg-warning text-dark ms-2"><i class="bi bi-exclamation-circle"></i> Duplicate</span>' : ''}
+                </div>
+                <div class="ms-2 text-nowrap">
+                    <span class="text-muted small">
+                        <i class="bi bi-geo-alt-fill"></i>
+                        (${formatPosition(x)}, ${formatPosition(y)}, ${formatPosition(z)})
+                    </span>
+                </div>
+            </label>`;
+        wrapper.querySelector('.badge-sotf-danger').textContent = `TypeID: ${typeId}`;
+        const cb = wrapper.querySelector('input');
+        cb.dataset.index = idx;
+        cb.dataset.groupId = groupId;
+        cb.dataset.duplicate = isDuplicate ? '1' : '';
+        cb.disabled = disabled;
+        cb.checked = !disabled && isChecked(group, idx);
+        cb.addEventListener('change', function() {
+            setChecked(group, idx, this.checked);
+            updateUI();
+        });
+        return wrapper;
+    }
+
+    function setChecked(group, idx, checked) {
+        if (checked === (group.mode === 'all')) {
+            group.toggled.delete(idx);
+        } else {
+            group.toggled.add(idx);
+        }
+        // Collapse a fully toggled group back into a plain mode
+        if (group.toggled.size === group.selectable && group.selectable > 0) {
+            group.mode = group.mode === 'all' ? 'none' : 'all';
+            group.toggled.clear();
+        }
+    }
+
+    function loadPage(groupId) {
+        const group = groups.get(groupId);
+        const list = group.el.querySelector('.structure-members');
+        const more = group.el.querySelector('.load-more');
+        more.disabled = true;
+        const url = `${options.membersUrl.replace('__GROUP__', groupId)}?offset=${group.loaded}&limit=${pageSize}`;
+        return fetch(url)
+            .then(r => r.json())
+            .then(page => {
+                if (page.error) throw new Error(page.error);
+                page.members.forEach(m => list.appendChild(renderMember(groupId, group, m)));
+                group.loaded += page.members.length;
+                more.style.display = group.loaded < page.total ? 'inline-block' : 'none';
+                more.textContent = `Load more (${page.total - group.loaded} remaining)`;
+                more.disabled = false;
+            })
+            .catch(err => {
+                list.insertAdjacentHTML('beforeend', '<div class="alert alert-danger small">Could not load structures.</div>');
+                console.error(err);
+            });
+    }
+
+    function renderGroup(groupId, group) {
+        const summary = group.summary;
+        const pos = summary.first_pos;
+        const el = document.createElement('div');
+        el.className = 'accordion-item structure-group';
+        el.dataset.groupId = groupId;
+        el.innerHTML = `
+            <h2 class="accordion-header" id="heading${groupId}">
+                <button class="accordion-button collapsed" type="button" data-bs-toggle="collapse" data-bs-target="#collapse${groupId}" aria-expanded="false" aria-controls="collapse${groupId}">
+                    <div class="d-flex justify-content-between w-100 align-items-center pe-3">
+                        <div class="flex-grow-1 text-truncate">
+                            <span class="group-label"></span>
+                            ${options.duplicateGroupBadge && group.duplicates === group.total ? '<span class="badge bg-warning text-dark ms-2"><i class="bi bi-exclamation-circle"></i> Duplicate Group</span>' : ''}
+                            ${pos ? `<span class="text-muted small ms-2 d-none d-md-inline"><i class="bi bi-geo-alt-fill"></i> (${formatPosition(pos.x)}, ${formatPosition(pos.y)}, ${formatPosition(pos.z)})</span>` : ''}
+                        </div>
+                        <div class="ms-2 text-nowrap">
+                            <span class="badge bg-secondary">${group.total} total</span>
+                            <span class="badge ${options.selectionBadgeClass || 'bg-primary'} group-selection-badge" style="display: none;"></span>
+                        </div>
+                    </div>
+                </button>
+            </h2>
+            <div id="collapse${groupId}" class="accordion-collapse collapse" aria-labelledby="heading${groupId}" data-bs-parent="#${container.id}">
+                <div class="accordion-body">
+                    <div class="form-check border-bottom pb-2 mb-2">
+                        <input class="form-check-input group-master-checkbox" type="checkbox" id="groupMaster${groupId}">
+                        <label class="form-check-label" for="groupMaster${groupId}">
+                            Select / Deselect All in this Group
+                        </label>
+                    </div>
+                    <div class="structure-members"></div>
+                    <button type="button" class="btn btn-sm btn-outline-secondary load-more mt-2" style="display: none;"></button>
+                </div>
+            </div>`;
+        el.querySelector('.group-label').textContent = summary.label;
+        el.querySelector('.accordion-collapse').addEventListener('show.bs.collapse', function() {
+            if (group.loaded === 0) loadPage(groupId);
+        });
+        el.querySelector('.load-more').addEventListener('click', () => loadPage(groupId));
+        el.querySelector('.group-master-checkbox').addEventListener('click', function() {
+            group.mode = this.checked ? 'all' : 'none';
+            group.toggled.clear();
+            refreshRows(groupId);
+            updateUI();
+        });
+        group.el = el;
+        return el;
+    }
+
+    function showMoreGroups() {
+        const fragment = document.createDocumentFragment();
+        [...groups.entries()].slice(rendered, rendered + groupPageSize).forEach(([groupId, group]) => {
+            fragment.appendChild(renderGroup(groupId, group));
+        });
+        container.appendChild(fragment);
+        rendered = Math.min(rendered + groupPageSize, groups.size);
+        if (moreGroups) {
+            moreGroups.style.display = rendered < groups.size ? '' : 'none';
+            moreGroups.textContent = `Show more groups (${groups.size - rendered} remaining)`;
+        }
+        updateUI();
+    }
+
+    function refreshRows(groupId) {
+        const group = groups.get(groupId);
+        if (!group.el) return;
+        group.el.querySelectorAll('.structure-checkbox').forEach(cb => {
+            const disabled = lockDuplicates && cb.dataset.duplicate === '1';
+            cb.disabled = disabled;
+            cb.checked = !disabled && isChecked(group, Number(cb.dataset.index));
+            cb.closest('.structure-item-wrapper').classList.toggle('bg-light', disabled);
+            cb.nextElementSibling.classList.toggle('text-muted', disabled);
+        });
+    }
+
+    function setMaster(master, checked, total) {
+        master.disabled = total === 0;
+        master.checked = total > 0 && checked === total;
+        master.indeterminate = checked > 0 && checked < total;
+    }
+
+    function updateUI() {
+        let selected = 0;
+        let selectable = 0;
+        groups.forEach((group, groupId) => {
+            const count = selectedIn(group);
+            selected += count;
+            selectable += group.selectable;
+            if (!group.el) return;
+            const badge = group.el.querySelector('.group-selection-badge');
+            if (badge) {
+                badge.textContent = `${count} selected`;
+                badge.style.display = count > 0 ? 'inline-block' : 'none';
+            }
+            setMaster(group.el.querySelector('.group-master-checkbox'), count, group.selectable);
+        });
+        if (globalMaster) setMaster(globalMaster, selected, selectable);
+        if (options.onUpdate) options.onUpdate(selected);
+    }
+
+    if (moreGroups) moreGroups.addEventListener('click', showMoreGroups);
+
+    if (globalMaster) {
+        globalMaster.addEventListener('click', function() {
+            groups.forEach((group, groupId) => {
+                group.mode = this.checked ? 'all' : 'none';
+                group.toggled.clear();
+                refreshRows(groupId);
+            });
+            updateUI();
+        });
+    }
+
+    form.addEventListener('submit', function() {
+        const selectGroups = [];
+        const exclude = [];
+        const include = [];
+        groups.forEach((group, groupId) => {
+            if (group.mode === 'all') {
+                selectGroups.push(groupId);
+                group.toggled.forEach(i => exclude.push(i));
+            } else {
+                group.toggled.forEach(i => include.push(i));
+            }
+        });
+        form.querySelector('input[name="select_groups"]').value = toRanges(selectGroups);
+        form.querySelector('input[name="exclude_ranges"]').value = toRanges(exclude);
+        form.querySelector('input[name="select_ranges"]').value = toRanges(include);
+    });
+
+    showMoreGroups();
+
+    return {
+        selectedCount: () => [...groups.values()].reduce((sum, g) => sum + selectedIn(g), 0),
+        // Tick or untick a map box selection: {whole_groups: [id], members: {id: [index]}}
+        applySelection: function(selection, checked) {
+            selection.whole_groups.forEach(id => {
+                const group = groups.get(String(id));
+                if (!group) return;
+                group.mode = checked ? 'all' : 'none';
+                group.toggled.clear();
+                refreshRows(String(id));
+            });
+            const flagged = new Set(selection.flagged || []);
+            Object.entries(selection.members).forEach(([id, indices]) => {
+                const group = groups.get(id);
+                if (!group) return;
+                indices.forEach(idx => {
+                    if (flagged.has(idx)) group.duplicateIdx.add(idx);
+                    setChecked(group, idx, checked);
+                });
+                refreshRows(id);
+            });
+            updateUI();
+        },
+        // Let duplicates be ticked (an import placed somewhere else) or lock them again
+        setDuplicatesSelectable: function(selectable) {
+            const lock = !!options.disableDuplicates && !selectable;
+            if (lock === lockDuplicates) return;
+            lockDuplicates = lock;
+            groups.forEach((group, groupId) => {
+                group.selectable = lock ? group.total - group.duplicates : group.total;
+                if (lock) group.duplicateIdx.forEach(idx => group.toggled.delete(idx));
+                refreshRows(groupId);
+            });
+            updateUI();
+        },
+        duplicatesSelectable: () => !lockDuplicates,
+    };
+}
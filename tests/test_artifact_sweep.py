@@ -0,0 +1,67 @@
+"""Sweeping expired content-store objects."""
+import io
+import os
+import threading
+
+import app
+from app import ArtifactManager, ContentStore, MetricsRegistry
+
+TTL = 3600
+
+
+def make_store(tmp_path):
+    store = ContentStore(str(tmp_path / 'objects'))
+    manager = ArtifactManager([store.root], ttl=TTL, quota=1 << 40, min_age=60,
+                              keep=[store.lock_path], content_store=store)
+    return store, manager
+
+
+def age(path, seconds):
+    """Backdate every file under path by seconds."""
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames + ['.']:
+            target = os.path.join(dirpath, name)
+            st = os.stat(target)
+            os.utime(target, (st.st_atime - seconds, st.st_mtime - seconds))
+
+
+def test_sweep_removes_idle_objects(tmp_path):
+    store, manager = make_store(tmp_path)
+    digest, _ = store.ingest(io.BytesIO(b'save'), 'save.zip', 'owner')
+    age(store.object_dir(digest), 2 * TTL)
+    assert manager.sweep()[0] == 1
+    assert not os.path.exists(store.object_dir(digest))
+
+
+def test_sweep_keeps_objects_referenced_after_scan(tmp_path):
+    store, manager = make_store(tmp_path)
+    digest, _ = store.ingest(io.BytesIO(b'save'), 'save.zip', 'owner')
+    age(store.object_dir(digest), 2 * TTL)
+    scan = manager.scan
+
+    def scan_then_reupload():
+        # Another worker ingests the same upload between the sweep's scan and its removal
+        artifacts = scan()
+        thread = threading.Thread(target=store.ingest, args=(io.BytesIO(b'save'), 'save.zip', 'other'))
+        thread.start()
+        thread.join()
+        return artifacts
+
+    manager.scan = scan_then_reupload
+    assert manager.sweep()[0] == 0
+    assert os.path.exists(os.path.join(store.object_dir(digest), 'save.zip'))
+    assert store.refcount(digest) == 2
+
+
+def test_sweep_counts_removals_in_metrics(tmp_path, monkeypatch):
+    registry = MetricsRegistry(str(tmp_path / 'metrics'))
+    monkeypatch.setattr(app, 'metrics', registry)
+    monkeypatch.setattr(app, 'METRICS_ENABLED', True)
+    store, manager = make_store(tmp_path)
+    digest, _ = store.ingest(io.BytesIO(b'save'), 'save.zip', 'owner')
+    age(store.object_dir(digest), 2 * TTL)
+    manager.sweep()
+    counters, _ = registry.collect()
+    assert counters[('sotfse_artifact_sweeps_total', ())] == 1
+    assert counters[('sotfse_artifacts_removed_total', ())] == 1
+    assert counters[('sotfse_artifact_bytes_reclaimed_total', ())] == len(b'save')
@@ -0,0 +1,62 @@
+"""Paged reading and pretty-printing of large debug files."""
+import json
+import time
+
+from app import read_file_page, json_state_at, json_cut_is_clean, pretty_json_page, search_file
+from synthetic_save import constructions_document, synthetic_buckets
+
+
+def stringified_dump(count):
+    """A raw Constructions member, like final_constructions_raw.json: one huge escaped string."""
+    doc = constructions_document(synthetic_buckets(count))
+    return json.dumps(doc, separators=(',', ':')).encode('utf-8')
+
+
+def pretty_pages(path, page_bytes):
+    """Pages joined the way the viewer joins them."""
+    out, offset, checkpoints = [], 0, [(0, 0, False)]
+    with open(path, 'rb') as f:
+        while True:
+            start, end, size, data = read_file_page(path, offset, page_bytes=page_bytes)
+            depth, in_string = json_state_at(f, start, checkpoints)
+            fresh_line = not in_string and json_cut_is_clean(f, start)
+            text = pretty_json_page(data.decode('utf-8'), depth, in_string, fresh_line=fresh_line)
+            out.append(('\n' if fresh_line else '') + text if out else text)
+            offset = end
+            if end >= size:
+                return ''.join(out)
+
+
+def test_state_scan_is_linear_on_stringified_dump(tmp_path):
+    data = stringified_dump(3000)
+    path = tmp_path / 'final_constructions_raw.json'
+    path.write_bytes(data)
+    start = time.perf_counter()
+    with open(path, 'rb') as f:
+        for offset in (64 * 1024, 256 * 1024, len(data) - 10):
+            depth, in_string = json_state_at(f, offset, [(0, 0, False)])
+    # Used to retry from every escaped quote: minutes for a 1.4 MB member
+    assert time.perf_counter() - start < 2
+    assert (depth, in_string) == (2, True)
+
+
+def test_pretty_pages_match_whole_document(tmp_path):
+    for name, data in (('raw.json', stringified_dump(300)),
+                       ('indented.json', json.dumps(json.loads(stringified_dump(50)), indent=2).encode('utf-8')),
+                       ('list.json', json.dumps([{"a": [i, {}, []], "b": f"x,\"{i}\""} for i in range(2000)]).encode('utf-8'))):
+        path = tmp_path / name
+        path.write_bytes(data)
+        assert pretty_pages(path, 4096) == pretty_json_page(data.decode('utf-8')), name
+
+
+def test_pretty_json_page_matches_json_dumps():
+    doc = {"a": [1, 2, {"b": "x,\"y\"\\", "c": []}], "d": {}, "e": "{\"z\":[1,2]}"}
+    assert pretty_json_page(json.dumps(doc)) == json.dumps(doc, indent=2)
+
+
+def test_search_finds_matches_across_chunks(tmp_path):
+    path = tmp_path / 'big.txt'
+    path.write_bytes(b'x' * (1024 * 1024 - 2) + b'NEEDLE' + b'y' * 100 + b'needle')
+    hits, resume = search_file(path, b'needle')
+    assert hits == [1024 * 1024 - 2, 1024 * 1024 + 104]
+    assert resume is None
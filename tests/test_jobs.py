@@ -0,0 +1,49 @@
+"""Scheduling background jobs per session."""
+import threading
+import time
+
+import app
+from app import _jobs_lock, _schedule_job
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_waiting_jobs_leave_pool_threads_to_other_sessions(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, 'UPLOAD_DIR', str(tmp_path))
+    order = []
+    release = threading.Event()
+
+    def job(name, block=False):
+        def run():
+            order.append(f"{name} start")
+            if block:
+                release.wait(10)
+            order.append(f"{name} end")
+        return run
+
+    # Two workers; a's second job must not take the other one while a's first runs
+    _schedule_job('a', job('a1', block=True))
+    _schedule_job('a', job('a2'))
+    _schedule_job('b', job('b1'))
+    wait_for(lambda: 'b1 end' in order)
+    assert 'a2 start' not in order
+    release.set()
+    wait_for(lambda: 'a2 end' in order)
+    assert order.index('a1 end') < order.index('a2 start')
+
+
+def test_job_waits_for_session_lock_held_elsewhere(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, 'UPLOAD_DIR', str(tmp_path))
+    monkeypatch.setattr(app, 'JOB_RETRY_SECONDS', 0.05)
+    ran = threading.Event()
+    # Another worker process running one of the session's jobs
+    with _jobs_lock('c'):
+        _schedule_job('c', ran.set)
+        time.sleep(0.2)
+        assert not ran.is_set()
+    assert ran.wait(5)
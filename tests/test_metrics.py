@@ -0,0 +1,54 @@
+"""Metrics snapshots shared between workers."""
+import json
+import os
+import subprocess
+import sys
+
+from app import MetricsRegistry, RETIRED_METRICS_SNAPSHOT
+
+
+def exited_pid():
+    proc = subprocess.Popen([sys.executable, '-c', 'pass'])
+    proc.wait()
+    return proc.pid
+
+
+def write_snapshot(directory, pid, jobs):
+    path = os.path.join(directory, f"{pid}-deadbeef.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'counters': [['sotfse_jobs_total', [['kind', 'edit'], ['state', 'done']], jobs]],
+                   'histograms': [['sotfse_job_seconds', [['kind', 'edit']], [1] + [0] * 13, 0.5, 1]]}, f)
+    return path
+
+
+def totals(registry):
+    counters, histograms = registry.collect()
+    jobs = counters.get(('sotfse_jobs_total', (('kind', 'edit'), ('state', 'done'))), 0)
+    job_count = histograms.get(('sotfse_job_seconds', (('kind', 'edit'),)), [None, 0, 0])[2]
+    return jobs, job_count
+
+
+def test_exited_workers_are_folded_into_retired_snapshot(tmp_path):
+    directory = str(tmp_path)
+    registry = MetricsRegistry(directory)
+    registry.inc('sotfse_jobs_total', kind='edit', state='done')
+    registry.flush()
+    dead = [write_snapshot(directory, exited_pid(), 2), write_snapshot(directory, exited_pid(), 3)]
+
+    assert totals(registry) == (6, 2)
+    assert not any(os.path.exists(path) for path in dead)
+    assert os.path.exists(os.path.join(directory, RETIRED_METRICS_SNAPSHOT))
+
+    # Later workers exiting add to the retired totals instead of replacing them
+    write_snapshot(directory, exited_pid(), 4)
+    assert totals(registry) == (10, 3)
+    assert sorted(n for n in os.listdir(directory) if n.endswith('.json')) == sorted(
+        [RETIRED_METRICS_SNAPSHOT, os.path.basename(registry._path)])
+
+
+def test_running_workers_are_kept(tmp_path):
+    directory = str(tmp_path)
+    registry = MetricsRegistry(directory)
+    live = write_snapshot(directory, os.getppid(), 2)
+    assert totals(registry) == (2, 1)
+    assert os.path.exists(live)
@@ -0,0 +1,29 @@
+"""Unstringifying save members and serializing them back."""
+import json
+
+from app import decode_unstringified, apply_stringify_plan
+
+MIXED = json.dumps({'S': [
+    {'Data': json.dumps({'a': 1})},
+    {'Data': None},
+    {'Data': 3},
+    {'Data': 'text'},
+    {'Data': json.dumps([1, {'b': json.dumps({'c': True})}])},
+]})
+
+
+def test_round_trip_keeps_scalars_next_to_stringified_items():
+    tree, plan = decode_unstringified(MIXED)
+    assert tree['S'][0]['Data'] == {'a': 1}
+    out = apply_stringify_plan(tree, plan)
+    assert out == json.loads(MIXED)
+    assert [item['Data'] for item in out['S'][1:4]] == [None, 3, 'text']
+
+
+def test_edited_items_are_serialized_by_their_own_type():
+    tree, plan = decode_unstringified(MIXED)
+    tree['S'][1]['Data'] = {'now': 'an object'}
+    tree['S'][0]['Data'] = 7
+    out = apply_stringify_plan(tree, plan)
+    assert out['S'][0]['Data'] == 7
+    assert json.loads(out['S'][1]['Data']) == {'now': 'an object'}
@@ -0,0 +1,90 @@
+"""structure_groups against the original all-pairs grouping."""
+import math
+import random
+
+import pytest
+
+from app import structure_groups
+
+
+def reference_groups(structures, nearby_threshold):
+    """The O(n^2) adjacency + DFS grouping structure_groups replaced; returns group ids."""
+    def distance(pos1, pos2):
+        if not pos1 or not pos2:
+            return float('inf')
+        try:
+            return math.sqrt(
+                (float(pos1.get('x', 0)) - float(pos2.get('x', 0)))**2 +
+                (float(pos1.get('y', 0)) - float(pos2.get('y', 0)))**2 +
+                (float(pos1.get('z', 0)) - float(pos2.get('z', 0)))**2
+            )
+        except Exception:
+            return float('inf')
+    n = len(structures)
+    adj = [[] for _ in range(n)]
+    for i in range(n):
+        pi = structures[i].get('Position')
+        for j in range(i + 1, n):
+            if distance(pi, structures[j].get('Position')) < nearby_threshold:
+                adj[i].append(j)
+                adj[j].append(i)
+    group = [None] * n
+    group_counter = 0
+    for i in range(n):
+        if group[i] is not None:
+            continue
+        stack = [i]
+        group[i] = group_counter
+        while stack:
+            node = stack.pop()
+            for neighbor in adj[node]:
+                if group[neighbor] is None:
+                    group[neighbor] = group_counter
+                    stack.append(neighbor)
+        group_counter += 1
+    return group
+
+
+def random_structures(rng, count, threshold):
+    """Clusters of structures around a few centres, chains across cell borders, and odd positions."""
+    centres = [(rng.uniform(-50, 50), rng.uniform(-5, 5), rng.uniform(-50, 50)) for _ in range(max(count // 8, 1))]
+    structures = []
+    for _ in range(count):
+        roll = rng.random()
+        if roll < 0.05:
+            structures.append({'Position': rng.choice([None, {}, {'x': 'a', 'y': 0, 'z': 0},
+                                                       {'x': float('nan'), 'y': 0, 'z': 0},
+                                                       {'x': float('inf'), 'y': 0, 'z': 0}])})
+            continue
+        cx, cy, cz = rng.choice(centres)
+        spread = threshold * rng.choice([0.3, 1, 3])
+        structures.append({'Position': {'x': cx + rng.gauss(0, spread), 'y': cy + rng.gauss(0, spread),
+                                        'z': cz + rng.gauss(0, spread)}})
+    # Points exactly on the threshold and on cell boundaries
+    base = rng.randint(-20, 20) * threshold
+    structures.append({'Position': {'x': base, 'y': 0.0, 'z': 0.0}})
+    structures.append({'Position': {'x': base + threshold, 'y': 0.0, 'z': 0.0}})
+    structures.append({'Position': {'x': base, 'y': threshold * 0.999, 'z': 0.0}})
+    structures.append({'Position': {'x': base, 'y': 0.0}})
+    rng.shuffle(structures)
+    return structures
+
+
+@pytest.mark.parametrize('seed', range(20))
+@pytest.mark.parametrize('threshold', [0.28, 1.0, 5.0])
+def test_groups_match_all_pairs_reference(seed, threshold):
+    rng = random.Random(seed)
+    structures = random_structures(rng, rng.randint(1, 300), threshold)
+    expected = reference_groups(structures, threshold)
+    grouped = structure_groups([dict(s) for s in structures], nearby_threshold=threshold)
+    assert [s['group_id'] for s in grouped] == expected
+    assert [s['group_label'] for s in grouped] == [f"Structure Group {g + 1}" for g in expected]
+
+
+def test_zero_threshold_groups_nothing():
+    structures = [{'Position': {'x': 0, 'y': 0, 'z': 0}} for _ in range(3)]
+    assert [s['group_id'] for s in structure_groups(structures, nearby_threshold=0)] == [0, 1, 2]
+
+
+def test_empty():
+    assert structure_groups([]) == []